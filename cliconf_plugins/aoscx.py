@@ -12,10 +12,12 @@ __metaclass__ = type
 
 import json
 import re
+import socket
+import time
 from itertools import chain
 
 from ansible.errors import AnsibleConnectionFailure
-from ansible.module_utils._text import to_text
+from ansible.module_utils._text import to_bytes, to_text
 from ansible.module_utils.common._collections_compat import Mapping
 try:
     from ansible.module_utils.network.common.utils import to_list, ComplexList
@@ -23,6 +25,33 @@ except ImportError:
     from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import to_list, ComplexList
 from ansible.plugins.cliconf import CliconfBase, enable_mode
 
+# Number of config lines written to the switch before checking their output
+CONFIG_BLOCK_SIZE = 50
+
+# Number of read-only commands written to the switch at once when pipelined
+COMMAND_BLOCK_SIZE = 20
+
+# Number of calls kept by the trace of the persistent connection
+MAX_TRACE_RECORDS = 10000
+
+# Commands that don't change the switch and never ask for input
+_READ_ONLY_RE = re.compile(r'^\s*show\s')
+
+# Error messages of the AOS-CX CLI, a line whose output matches one of them
+# wasn't applied
+_CLI_ERROR_RE = re.compile(
+    br'^\s*(% .*|Invalid input.*|Unknown command.*|Incomplete command.*|'
+    br'Ambiguous command.*|Command incomplete.*|Error:.*)$', re.M | re.I)
+
+# Questions asked by commands before doing their change, the line following
+# such a command in a block is taken as its answer
+_CLI_CONFIRM_RE = re.compile(br'\((y/n|yes/no)\)\?? *$', re.M | re.I)
+
+_ANSI_RE = re.compile(br'\x1b\[[0-9;?]*[A-Za-z]|\x08')
+
+# Host name part of the prompt of the switch
+_PROMPT_HOST_RE = re.compile(br'^[\r\n]*([^\s\(#>]+)')
+
 
 class Cliconf(CliconfBase):
     '''
@@ -36,6 +65,10 @@ class Cliconf(CliconfBase):
         init function
         '''
         super(Cliconf, self).__init__(*args, **kwargs)
+        self._ztp_status = None
+        self._tracing = False
+        self._trace_base = 0
+        self._trace = []
 
     @enable_mode
     def get_config(self, source='running', format='text', flags=None):
@@ -59,6 +92,346 @@ class Cliconf(CliconfBase):
         for cmd in chain(['configure terminal'], to_list(command), ['end']):
             self.send_command(cmd)
 
+    def _get_prompt_re(self):
+        '''
+        Returns a regex matching the prompts of the switch in any context at
+        the start of a line
+        '''
+        prompt = getattr(self._connection, '_matched_prompt', None) or b''
+        match = _PROMPT_HOST_RE.match(prompt)
+        if match is not None:
+            host = re.escape(match.group(1))
+        else:
+            host = br'[\w\+\-\.:\/\[\]]+'
+        return re.compile(br'^' + host + br'(?:\([^\)\r\n]+\)){0,3}[>#] ?',
+                          re.M)
+
+    def _get_command_timeout(self):
+        try:
+            return self._connection.get_option('persistent_command_timeout')
+        except (AttributeError, KeyError):
+            return 30
+
+    @staticmethod
+    def _read_prompts(shell, buffer, start, prompt_re, count, timeout):
+        '''
+        Reads the channel until count more prompts were received, each one
+        within timeout seconds of the previous one
+        :return: list with the output before each prompt received in time,
+            the buffer, the offset following the last prompt and the last
+            prompt
+        '''
+        outputs = []
+        prompt = None
+        deadline = time.time() + timeout
+        while len(outputs) < count:
+            match = prompt_re.search(buffer, start)
+            if match is not None:
+                outputs.append(buffer[start:match.start()])
+                prompt = match.group(0)
+                start = match.end()
+                # Each command gets the whole timeout for its own output
+                deadline = time.time() + timeout
+                continue
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            shell.settimeout(remaining)
+            try:
+                chunk = shell.recv(4096)
+            except socket.timeout:
+                break
+            if not chunk:
+                raise AnsibleConnectionFailure(
+                    "The connection to the switch was closed")
+            buffer += _ANSI_RE.sub(b'', chunk)
+        return outputs, buffer, start, prompt
+
+    def _get_shell(self):
+        '''
+        Returns the paramiko channel of the network_cli connection, written
+        to and read directly by the blocks of commands. None when the
+        connection isn't open or uses another SSH library, such as libssh,
+        the commands are then sent one by one.
+        '''
+        ssh_type = getattr(self._connection, 'ssh_type', None)
+        if ssh_type is None:
+            try:
+                ssh_type = self._connection.get_option('ssh_type')
+            except (AttributeError, KeyError):
+                # Connections predating the option always use paramiko
+                ssh_type = 'paramiko'
+        shell = getattr(self._connection, '_ssh_shell', None)
+        if ssh_type != 'paramiko' or shell is None or \
+                not all(hasattr(shell, name) for name in
+                        ('sendall', 'recv', 'recv_ready', 'settimeout')):
+            return None
+        return shell
+
+    @staticmethod
+    def _is_echo(command, output):
+        '''
+        Checks that the output of a command starts with its echo. A line of
+        the output of the previous command looking like a prompt would have
+        split the output stream at the wrong place.
+        '''
+        command = to_bytes(command, errors='surrogate_or_strict')
+        # The echo of a long command may be wrapped
+        head = output[:2 * len(command) + 64]
+        return re.sub(br'\s+', b'', head).startswith(
+            re.sub(br'\s+', b'', command))
+
+    def _send_block(self, commands, prompt_re, timeout):
+        '''
+        Writes several commands to the switch at once and splits the output
+        back by command, each one ends with the following prompt and starts
+        with the echo of the command. When a command times out, the prompts
+        of the commands already written are read and dropped so the channel
+        is left at the last prompt. If they don't come either, or the output
+        can't be split by command, the connection is closed, the next
+        command opens a new session.
+        :return: list with the output of each command that got its prompt
+            before the timeout, without the echo of the command, whether a
+            command timed out and whether the channel was left at the last
+            prompt
+        '''
+        shell = self._get_shell()
+        data = b''.join(b'%s\r' % to_bytes(cmd, errors='surrogate_or_strict')
+                        for cmd in commands)
+        shell.sendall(data)
+
+        outputs, buffer, start, prompt = self._read_prompts(
+            shell, b'', 0, prompt_re, len(commands), timeout)
+        timed_out = len(outputs) < len(commands)
+        synced = True
+        if timed_out:
+            drained, buffer, start, prompt = self._read_prompts(
+                shell, buffer, start, prompt_re,
+                len(commands) - len(outputs), timeout)
+            synced = len(outputs) + len(drained) == len(commands)
+
+        for position, (cmd, output) in enumerate(zip(commands, outputs)):
+            if not self._is_echo(cmd, output):
+                # The output of the previous command was cut at a line
+                # looking like a prompt, it can't be trusted either
+                outputs = outputs[:max(position - 1, 0)]
+                synced = False
+                break
+        else:
+            if synced and (buffer[start:].strip() or shell.recv_ready()):
+                # The last prompt was a line of the output
+                outputs = outputs[:-1]
+                synced = False
+
+        if synced:
+            # Keep the bookkeeping of network_cli as if the commands were
+            # sent one by one
+            self._connection._matched_prompt = prompt.strip()
+            if outputs:
+                self._connection._last_response = outputs[-1]
+        else:
+            self._connection.close()
+
+        responses = []
+        for output in outputs:
+            lines = output.replace(b'\r', b'').split(b'\n', 1)
+            responses.append(lines[1] if len(lines) > 1 else b'')
+        return responses, timed_out, synced
+
+    @staticmethod
+    def _find_error(output):
+        for regex in (_CLI_ERROR_RE, _CLI_CONFIRM_RE):
+            match = regex.search(output)
+            if match is not None:
+                return to_text(match.group(0).strip(),
+                               errors='surrogate_or_strict')
+        return None
+
+    @staticmethod
+    def _split_blocks(commands, block_size, contexts=()):
+        '''
+        Splits the commands into blocks of at most block_size lines. A line
+        followed by indented lines enters a context, such as interface 1/1/1,
+        it ends its block so that its children are only sent once it was
+        applied, unless it is one of the existing top-level contexts, which
+        can't fail to be entered. Banners are sent line by line, their lines
+        don't get a prompt.
+        '''
+        def indent(cmd):
+            return len(cmd) - len(cmd.lstrip())
+
+        block = []
+        delimiter = None
+        for index, cmd in enumerate(commands):
+            if delimiter is not None:
+                yield False, [(index, cmd)]
+                if delimiter in cmd:
+                    delimiter = None
+                continue
+            if cmd.strip().startswith('banner '):
+                if block:
+                    yield True, block
+                    block = []
+                yield False, [(index, cmd)]
+                text = cmd.strip().split(None, 2)
+                if len(text) == 3 and text[2]:
+                    # The banner ends at the next occurrence of its first
+                    # character
+                    banner = text[2]
+                    if banner[0] not in banner[1:]:
+                        delimiter = banner[0]
+                continue
+            block.append((index, cmd))
+            enters_context = index + 1 < len(commands) and \
+                indent(commands[index + 1]) > indent(cmd) and \
+                not (indent(cmd) == 0 and cmd.strip() in contexts)
+            if enters_context or len(block) >= block_size:
+                yield True, block
+                block = []
+        if block:
+            yield True, block
+
+    @enable_mode
+    def edit_config_batched(self, command, block_size=CONFIG_BLOCK_SIZE,
+                            contexts=None):
+        '''
+        Edit the switch config writing the commands in blocks of at most
+        block_size lines, without waiting for the prompt after each line.
+        The switch runs every line of a block, the output of the block is
+        checked before sending the next one. The lines of the block following
+        a failed line were run too, possibly in the wrong context, their
+        outcome is unknown. A line entering a new context ends its block, so
+        the lines of a context aren't run when entering it failed.
+        Connections whose channel can't be read directly send the lines one
+        by one.
+        :param command: config lines, the lines of a context are indented
+            under the line entering it
+        :param contexts: optional top-level lines entering a context the
+            switch already has, such as the interfaces of its running-config,
+            they share their block with the following lines
+        :return: dict with the number of lines applied, the error, if any,
+            with the index and text of the failed line, the lines sent
+            after it whose outcome is unknown, and the number of round trips
+            to the switch
+        '''
+        commands = [cmd for cmd in to_list(command) if cmd.strip() != 'end']
+        result = dict(applied=0, error=None, unknown=[], round_trips=0)
+
+        self.send_command('configure terminal')
+        synced = True
+        try:
+            prompt_re = self._get_prompt_re()
+            timeout = self._get_command_timeout()
+            if self._get_shell() is None:
+                block_size = 1
+            for batched, block in self._split_blocks(
+                    commands, max(1, block_size), frozenset(contexts or ())):
+                start = time.time()
+                result['round_trips'] += 1
+                timed_out = False
+                if batched and self._get_shell() is not None:
+                    responses, timed_out, synced = self._send_block(
+                        [cmd.strip() for dummy, cmd in block], prompt_re,
+                        timeout)
+                else:
+                    # Banner lines are sent as they are
+                    line = block[0][1].strip() if batched else block[0][1]
+                    try:
+                        responses = [to_bytes(self.send_command(line),
+                                              errors='surrogate_or_strict')]
+                    except AnsibleConnectionFailure as exc:
+                        responses = [to_bytes(getattr(exc, 'err', exc),
+                                              errors='surrogate_or_strict')]
+                        responses[0] = responses[0] or b'Error: failed'
+                # The lines of a block are traced together, their outputs
+                # arrive together
+                self._add_trace(
+                    'config block',
+                    len(responses) < len(block) or
+                    any(self._find_error(response) is not None
+                        for response in responses),
+                    b''.join(responses), start,
+                    sent='\n'.join(cmd.strip() for dummy, cmd in block))
+
+                for position, ((index, cmd), response) in enumerate(
+                        zip(block, responses)):
+                    error = self._find_error(response)
+                    if error is not None:
+                        result['error'] = dict(line=index + 1,
+                                               command=cmd.strip(),
+                                               msg=error)
+                        break
+                    result['applied'] += 1
+                else:
+                    position = len(responses)
+                    if position < len(block):
+                        index, cmd = block[position]
+                        if timed_out:
+                            msg = "No prompt from the switch after {0} " \
+                                  "seconds".format(timeout)
+                        else:
+                            msg = "The output of the switch couldn't be " \
+                                  "split by line"
+                        if not synced:
+                            msg += ", the connection was closed"
+                        result['error'] = dict(line=index + 1,
+                                               command=cmd.strip(), msg=msg)
+
+                if result['error'] is not None:
+                    result['unknown'] = [
+                        dict(line=index + 1, command=cmd.strip())
+                        for index, cmd in block[position + 1:]]
+                    return result
+            return result
+        finally:
+            # A closed connection starts its next session out of the config
+            # context
+            if synced:
+                self.send_command('end')
+
+    def get_ztp_status(self):
+        '''
+        Returns the result of the zero-touch provisioning probe already done
+        for the switch of this connection, None if it wasn't done
+        '''
+        return self._ztp_status
+
+    def set_ztp_status(self, status):
+        '''
+        Keeps the result of the zero-touch provisioning probe for the next
+        modules using this connection
+        '''
+        self._ztp_status = status
+
+    def get_trace(self, offset=None):
+        '''
+        Returns the commands run by run_commands and the config blocks sent
+        by edit_config_batched since offset. Commands are only recorded once
+        a module asked for the trace.
+        :param offset: offset returned by a previous call, None to only get
+            the current offset
+        :return: dict with the offset of the next command and the records
+        '''
+        self._tracing = True
+        end = self._trace_base + len(self._trace)
+        if offset is None:
+            return dict(offset=end, records=[])
+        return dict(offset=end,
+                    records=self._trace[max(offset - self._trace_base, 0):])
+
+    def _add_trace(self, command, failed, output, start, sent=None):
+        if not self._tracing:
+            return
+        self._trace.append(dict(
+            kind='cli', method='CLI', path=command, status=int(failed),
+            bytes_out=len(to_bytes(command if sent is None else sent)),
+            bytes_in=len(to_bytes(output or '')),
+            total=time.time() - start, start=start))
+        if len(self._trace) > MAX_TRACE_RECORDS:
+            dropped = len(self._trace) - MAX_TRACE_RECORDS
+            del self._trace[:dropped]
+            self._trace_base += dropped
+
     def get(self, command, prompt=None, answer=None, sendonly=False,
             newline=True, check_all=False):
         '''
@@ -102,29 +475,111 @@ class Cliconf(CliconfBase):
         result = super(Cliconf, self).get_capabilities()
         return json.dumps(result)
 
-    def run_commands(self, commands=None, check_rc=False):
+    @staticmethod
+    def _is_pipelined(cmd):
+        '''
+        Checks that a command can be sent without waiting for the output of
+        the previous one: a plain read-only command, without prompts to
+        answer
+        '''
+        return (not cmd.get('prompt') and not cmd.get('answer') and
+                not cmd.get('sendonly') and cmd.get('newline', True) and
+                bool(_READ_ONLY_RE.match(cmd['command'])))
+
+    def _run_command(self, cmd, check_rc):
+        '''
+        Runs a command through network_cli, waiting for its prompt
+        '''
+        start = time.time()
+        try:
+            out = self.send_command(**cmd)
+        except AnsibleConnectionFailure as exception:
+            self._add_trace(cmd['command'], True, None, start)
+
+            if check_rc:
+                raise
+            out = getattr(exception, 'err', exception)
+        else:
+            self._add_trace(cmd['command'], False, out, start)
+
+        return to_text(out, errors='surrogate_or_strict')
+
+    def _check_output(self, output, check_rc):
+        '''
+        Checks the output of a pipelined command against the errors of the
+        terminal plugin, as network_cli does for the commands it sends
+        '''
+        text = to_text(output.strip(), errors='surrogate_or_strict')
+        terminal = getattr(self._connection, '_terminal', None)
+        stderr_re = getattr(terminal, 'terminal_stderr_re', None) or []
+        if check_rc and any(regex.search(output) for regex in stderr_re):
+            raise AnsibleConnectionFailure(text)
+        return text
+
+    def _run_pipelined(self, commands, check_rc=False):
+        '''
+        Sends read-only commands in blocks and splits the output stream back
+        into the response of each command at the prompts that follow them.
+        The commands whose output can't be split by command, or all of them
+        when the channel can't be read directly, are run one by one.
+        '''
+        timeout = self._get_command_timeout()
+        responses = []
+        for start in range(0, len(commands), COMMAND_BLOCK_SIZE):
+            block = commands[start:start + COMMAND_BLOCK_SIZE]
+            if self._get_shell() is None:
+                responses.extend(self._run_command(dict(command=command),
+                                                   check_rc)
+                                 for command in block)
+                continue
+            block_start = time.time()
+            outputs, timed_out = self._send_block(
+                block, self._get_prompt_re(), timeout)[:2]
+            # The outputs of a block arrive together, it is traced as a
+            # single call
+            self._add_trace('pipeline', len(outputs) < len(block),
+                            b''.join(outputs), block_start,
+                            sent='\n'.join(block))
+            if timed_out:
+                raise AnsibleConnectionFailure(
+                    "command timeout triggered, timeout value is {0} secs "
+                    "while running {1}".format(timeout,
+                                               block[len(outputs)]))
+            responses.extend(self._check_output(output, check_rc)
+                             for output in outputs)
+            # A line of the output looked like a prompt, the connection was
+            # closed and the commands are read again one by one
+            responses.extend(self._run_command(dict(command=command),
+                                               check_rc)
+                             for command in block[len(outputs):])
+        return responses
+
+    def run_commands(self, commands=None, check_rc=False, pipeline=False):
         '''
         Run commands on the switch
+        :param pipeline: send consecutive read-only commands without waiting
+            for the prompt after each of them
         '''
         if commands is None:
             raise ValueError("'commands' value is required")
         responses = list()
+        pending = list()
         for cmd in to_list(commands):
 
             if not isinstance(cmd, Mapping):
                 cmd = {'command': cmd}
 
-            try:
-                out = self.send_command(**cmd)
-            except AnsibleConnectionFailure as exception:
-
-                if check_rc:
-                    raise
-                out = getattr(exception, 'err', exception)
+            if pipeline and self._is_pipelined(cmd):
+                pending.append(cmd['command'])
+                continue
+            if pending:
+                responses.extend(self._run_pipelined(pending, check_rc))
+                pending = list()
 
-            out = to_text(out, errors='surrogate_or_strict')
+            responses.append(self._run_command(cmd, check_rc))
 
-            responses.append(out)
+        if pending:
+            responses.extend(self._run_pipelined(pending, check_rc))
 
         return responses
 
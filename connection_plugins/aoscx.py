@@ -69,6 +69,112 @@ options:
     default: true
     vars:
     - name: ansible_aoscx_use_proxy
+  proxy_requests:
+    type: boolean
+    description:
+    - Whether the modules send their REST requests through this connection
+      instead of opening their own connections to the switch. The requests
+      reuse the keep-alive connections of the persistent connection, which
+      saves a TLS handshake per module, but requests from concurrent threads
+      of a module are sent one after another.
+    default: false
+    vars:
+    - name: ansible_aoscx_proxy_requests
+  pool_maxsize:
+    type: int
+    description:
+    - Maximum number of keep-alive connections to the switch held by the
+      persistent connection.
+    default: 10
+    vars:
+    - name: ansible_aoscx_pool_maxsize
+  max_inflight:
+    type: int
+    description:
+    - Maximum number of REST requests a module sends to the switch at the
+      same time. The limit is halved whenever the switch throttles a request
+      and raised back one request at a time as requests succeed.
+    - With I(proxy_requests), the persistent connection sends the requests
+      of every module one at a time, only the uploads and downloads it
+      can't proxy are limited per module.
+    default: 8
+    vars:
+    - name: ansible_aoscx_max_inflight
+  rate_limit:
+    type: float
+    description:
+    - Maximum number of REST requests a module starts per second, 0 for no
+      limit.
+    - The limit applies to each module on its own, so modules running at the
+      same time on a host may exceed it together. With I(proxy_requests), it
+      holds for the whole host since the requests of every module are paced
+      by the persistent connection.
+    default: 0
+    vars:
+    - name: ansible_aoscx_rate_limit
+  retries:
+    type: int
+    description:
+    - Number of times a REST request is sent again when the switch throttles
+      it with a 429 or 503 response. GET, PUT and DELETE requests are also
+      sent again after a timeout, a connection error or a 502 or 504
+      response, POST requests aren't since the switch may have processed
+      them.
+    default: 3
+    vars:
+    - name: ansible_aoscx_retries
+  retry_backoff:
+    type: float
+    description:
+    - Seconds waited at most before the first retry, doubled at each retry.
+      The wait is picked at random up to that value, and is at least the
+      Retry-After of the switch.
+    default: 0.5
+    vars:
+    - name: ansible_aoscx_retry_backoff
+  api_version:
+    type: str
+    description:
+    - Version of the REST API used by the modules, such as 10.04.
+    - With auto, the highest version supported by both the switch and
+      pyaoscx is used, falling back to 10.04 when the switch doesn't list
+      its versions. Only set it when the modules are known to work with the
+      newer versions, their resources and attributes differ from 10.04.
+    default: "10.04"
+    vars:
+    - name: ansible_aoscx_api_version
+  session_cache:
+    type: boolean
+    description:
+    - Whether to keep the REST session open when the connection is closed
+      and store its cookie on disk, so that the following connections to the
+      same switch with the same user reuse it instead of logging in again.
+    default: false
+    env:
+    - name: ANSIBLE_AOSCX_SESSION_CACHE
+    vars:
+    - name: ansible_aoscx_session_cache
+  session_cache_dir:
+    type: path
+    description:
+    - Directory holding the cached sessions, it is created readable only by
+      the current user and isn't used if other users have access to it.
+    default: ~/.ansible/aoscx_sessions
+    env:
+    - name: ANSIBLE_AOSCX_SESSION_CACHE_DIR
+    vars:
+    - name: ansible_aoscx_session_cache_dir
+  session_cache_ttl:
+    type: int
+    description:
+    - Time in seconds after its last use during which a cached session is
+      reused. It should be lower than the REST session idle timeout of the
+      switch.
+    default: 600
+    env:
+    - name: ANSIBLE_AOSCX_SESSION_CACHE_TTL
+    vars:
+    - name: ansible_aoscx_session_cache_ttl
   persistent_connect_timeout:
     type: int
     description:
@@ -115,7 +221,14 @@ options:
     vars:
     - name: ansible_persistent_log_messages
 """
+import base64
+import hashlib
 import json
+import os
+import random
+import re
+import stat
+import time
 from ansible.errors import AnsibleConnectionFailure, AnsibleError
 from ansible.plugins.connection import ConnectionBase, NetworkConnectionBase, ensure_connect
 from ansible.module_utils.six import PY3
@@ -131,11 +244,292 @@ except ImportError:
     HAS_PYAOSCX = False
 
 try:
-    from requests.utils import dict_from_cookiejar
+    from pyaoscx.api import API as PyaoscxApi
+except ImportError:
+    PyaoscxApi = None
+
+try:
+    from requests import Session as RequestsSession
+    from requests.adapters import HTTPAdapter
+    from requests.exceptions import RequestException
+    from requests.utils import add_dict_to_cookiejar, dict_from_cookiejar
     HAS_REQUESTS = True
 except ImportError:
     HAS_REQUESTS = False
 
+# Headers of proxied requests that are set by the persistent connection
+# itself, the session cookies in particular are kept by the connection
+_PROXY_SKIP_HEADERS = frozenset([
+    "connection", "content-length", "cookie", "host", "keep-alive",
+    "transfer-encoding"
+])
+
+# The retry policy below and RestGovernor copy module_utils/aoscx_governor.py,
+# like httpapi_plugins/aoscx.py. Connection plugins run in the persistent
+# connection process, which can't import the module_utils of this role, so
+# keep the copies in sync.
+
+# Number of times a request is sent again after being throttled or failing
+MAX_RETRIES = 3
+
+# Seconds waited before the first retry, doubled at each retry
+RETRY_BACKOFF = 0.5
+
+# Longest wait before a retry, in seconds
+MAX_RETRY_BACKOFF = 30
+
+# Responses of a switch refusing a request before processing it
+THROTTLE_CODES = (429, 503)
+
+# Responses of a gateway that may or may not have forwarded the request
+GATEWAY_CODES = (502, 504)
+
+# Methods sending the same request twice has the same effect as sending it
+# once. A POST is only sent again when the switch refused it.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+# Resource used to check that a cached session is still logged in
+_SESSION_CHECK_PATH = "system?attributes=platform_name"
+
+# The REST API version helpers and _FEATURE_PROBES below are copied in
+# httpapi_plugins/aoscx.py, plugins can't import each other, so keep both
+# copies in sync.
+
+# Version of the REST API used by default, and with auto when the switch
+# doesn't list its versions
+DEFAULT_API_VERSION = "v10.04"
+
+_API_VERSION_RE = re.compile(r"^v\d+(\.\d+)?$")
+
+# Requests checking the query parameters understood by a version of the REST
+# API. Parameters unknown to the switch are either refused or ignored, the
+# check of the response tells the latter apart.
+_FEATURE_PROBES = (
+    ("attributes", "system?attributes=platform_name",
+     lambda data: isinstance(data, dict) and list(data) == ["platform_name"]),
+    ("selector", "system/vrfs?selector=configuration",
+     lambda data: isinstance(data, (dict, list))),
+    ("filter", "system/vrfs?depth=1&filter=name:default",
+     lambda data: isinstance(data, dict) and list(data) == ["default"]),
+)
+
+
+def _api_version_key(version):
+    return tuple(int(part) for part in version[1:].split("."))
+
+
+def _parse_api_versions(data):
+    """
+    Returns the versions listed by the /rest resource of a switch, oldest
+    first
+    """
+    if not isinstance(data, dict):
+        return []
+    versions = [key for key in data if _API_VERSION_RE.match(key)]
+    return sorted(versions, key=_api_version_key)
+
+
+def _normalize_api_version(version):
+    return version if version.startswith("v") else "v" + version
+
+
+def _pyaoscx_supports(version):
+    """
+    Checks that the installed pyaoscx implements a version of the REST API
+    """
+    if PyaoscxApi is None:
+        return version == DEFAULT_API_VERSION
+    try:
+        PyaoscxApi.create(version[1:])
+    except Exception:
+        return False
+    return True
+
+
+# The session cache helpers below are copied in httpapi_plugins/aoscx.py,
+# which stores the auth headers of its session instead of cookies. Plugins
+# can't import each other, so keep both copies in sync.
+
+
+def _get_session_cache_path(cache_dir, host, username):
+    """
+    Returns the file caching the session of a user on a switch, or None if
+    the cache directory can't be used safely
+    """
+    cache_dir = os.path.expanduser(cache_dir)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        dir_stat = os.stat(cache_dir)
+    except OSError:
+        return None
+    # The cookies give access to the switch, don't use a directory other
+    # users can read or write
+    if dir_stat.st_uid != os.getuid() or \
+            stat.S_IMODE(dir_stat.st_mode) & 0o077:
+        return None
+    key = "{0}\n{1}".format(host, username).encode("utf-8")
+    return os.path.join(
+        cache_dir, "aoscx-{0}.json".format(hashlib.sha256(key).hexdigest()))
+
+
+def _read_session_cache(path, ttl):
+    """
+    Returns the cookies of a cached session, or None if there is no session
+    used in the last ttl seconds
+    """
+    try:
+        with open(path) as cache_file:
+            cached = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or \
+            time.time() - cached.get("last_used", 0) > ttl:
+        return None
+    return cached.get("cookies")
+
+
+def _write_session_cache(path, cookies):
+    """
+    Stores the cookies of a session, the file is only readable by the
+    current user
+    """
+    tmp_path = "{0}.{1}".format(path, os.getpid())
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(dict(cookies=cookies, last_used=time.time()),
+                      cache_file)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        _remove_session_cache(tmp_path)
+
+
+def _remove_session_cache(path):
+    """
+    Removes a cached session
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _get_retry_after(value):
+    """
+    Returns the seconds of a Retry-After header, None unless it holds a
+    number of seconds
+    """
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RestGovernor(object):
+    """
+    Paces the requests proxied by the persistent connection, which sends one
+    request at a time, a copy of the RestGovernor of
+    module_utils/aoscx_governor.py without its limit of requests in flight
+
+    At most rate requests are started per second. Throttled requests are
+    sent again after a jittered exponential backoff, and only idempotent
+    requests are sent again after a timeout or a connection error, since
+    the switch may have processed them.
+    """
+
+    def __init__(self, rate=None, retries=MAX_RETRIES, backoff=RETRY_BACKOFF,
+                 max_backoff=MAX_RETRY_BACKOFF):
+        self._interval = 1.0 / rate if rate else 0.0
+        self._next_start = 0.0
+        self._retries = max(retries or 0, 0)
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self.stats = dict(requests=0, retries=0, throttled=0, errors=0,
+                          gave_up=0, rate_waits=0, wait_seconds=0.0,
+                          backoff_seconds=0.0)
+
+    def _wait_turn(self):
+        now = time.time()
+        if now < self._next_start:
+            self.stats["rate_waits"] += 1
+            self.stats["wait_seconds"] += self._next_start - now
+            time.sleep(self._next_start - now)
+            now = self._next_start
+        self._next_start = now + self._interval
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        Returns the seconds to wait before a retry, picked at random up to
+        the exponential backoff of the attempt, and at least the Retry-After
+        of the switch
+        """
+        ceiling = min(self._max_backoff, self._backoff * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self._max_backoff))
+        return delay
+
+    def call(self, method, send):
+        """
+        Sends a request, again while it is throttled or fails and retries
+        are left
+        :param method: HTTP method of the request
+        :param send: callable returning the requests response
+        :return: the last response, the last exception is raised instead
+            when the request didn't get a response
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self._wait_turn()
+            self.stats["requests"] += 1
+            try:
+                response = send()
+            except RequestException:
+                self.stats["errors"] += 1
+                if not idempotent or attempt >= self._retries:
+                    if idempotent:
+                        self.stats["gave_up"] += 1
+                    raise
+                retry_after = None
+            else:
+                throttled = response.status_code in THROTTLE_CODES
+                if throttled:
+                    self.stats["throttled"] += 1
+                if not throttled and not (
+                        idempotent and response.status_code in GATEWAY_CODES):
+                    return response
+                if attempt >= self._retries:
+                    self.stats["gave_up"] += 1
+                    return response
+                retry_after = _get_retry_after(
+                    response.headers.get("Retry-After"))
+                response.close()
+
+            delay = self.get_delay(attempt, retry_after)
+            self.stats["retries"] += 1
+            self.stats["backoff_seconds"] += delay
+            time.sleep(delay)
+            attempt += 1
+
+    def to_dict(self):
+        stats = dict(self.stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["backoff_seconds"] = round(stats["backoff_seconds"], 3)
+        return stats
+
+
+def _get_wire_bytes(response):
+    """
+    Returns the number of bytes of a response body read from the network,
+    before requests undid its Content-Encoding
+    """
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
 
 class Connection(NetworkConnectionBase):
     """PYAOSCX connections"""
@@ -148,6 +542,14 @@ class Connection(NetworkConnectionBase):
         self.session = None
         self.base_url = None
         self.use_proxy = True
+        self.validate_certs = True
+        self.proxy_requests = False
+        self._proxied_requests = 0
+        self._governor = None
+        self._session_cache_path = None
+        self.api_version = None
+        self._api_versions = None
+        self._api_features = {}
         self.__username = None
         self.__password = None
 
@@ -179,36 +581,300 @@ class Connection(NetworkConnectionBase):
             username = self.get_option("remote_user")
             password = self.get_option("password")
             self.use_proxy = self.get_option("use_proxy")
-            self.base_url = "https://{0}/rest/v10.04/".format(switchip)
+            self.validate_certs = self.get_option("validate_certs")
+            self.proxy_requests = self.get_option("proxy_requests")
+            # Every module proxying its requests shares the limits of this
+            # governor, one per host
+            self._governor = RestGovernor(
+                rate=self.get_option("rate_limit"),
+                retries=self.get_option("retries"),
+                backoff=self.get_option("retry_backoff"))
+            self.api_version = self._get_api_version(switchip)
+            self.base_url = "https://{0}/rest/{1}/".format(
+                switchip, self.api_version)
             # Set Credentials
             self.__username = username
             self.__password = password
 
-            try:
-                self.session = Session.login(self.base_url, username, password, self.use_proxy, True)
-            except LoginError as err:
-                raise AnsibleConnectionFailure(
-                    err.message
-                )
+            if self.get_option("session_cache"):
+                self._session_cache_path = _get_session_cache_path(
+                    self.get_option("session_cache_dir"), switchip, username)
+                if self._session_cache_path is None:
+                    self.queue_message(
+                        "warning",
+                        "Unable to use the session cache directory %s, it "
+                        "must be only accessible by the current user"
+                        % self.get_option("session_cache_dir"))
+
+            self.session = self._get_cached_session()
+            if self.session is None:
+                self._login()
             self.queue_message(
                 "vvvv",
                 "created pyaoscx connection for network_os %s" % self._network_os,
             )
             self._connected = True
 
+    def _discover_api_versions(self, switchip):
+        """
+        Returns the versions of the REST API listed by the switch, oldest
+        first, or None if it doesn't list them
+        """
+        if self._api_versions is None:
+            proxies = None
+            if self.use_proxy is False:
+                proxies = {"http": None, "https": None}
+            try:
+                response = RequestsSession().get(
+                    "https://{0}/rest".format(switchip),
+                    verify=self.validate_certs,
+                    timeout=10, proxies=proxies)
+                versions = _parse_api_versions(response.json()) \
+                    if response.status_code == 200 else []
+            except (RequestException, ValueError):
+                versions = []
+            self._api_versions = versions
+            self.queue_message(
+                "vvvv", "REST API versions: %s" % (", ".join(versions) or
+                                                   "unknown"))
+        return self._api_versions or None
+
+    def _get_api_version(self, switchip):
+        """
+        Returns the version of the REST API used by this connection
+        """
+        version = self.get_option("api_version") or DEFAULT_API_VERSION
+        if version != "auto":
+            return _normalize_api_version(version)
+        versions = [v for v in self._discover_api_versions(switchip) or []
+                    if v != "v1" and _pyaoscx_supports(v)]
+        if not versions:
+            return DEFAULT_API_VERSION
+        return versions[-1]
+
+    def _probe_api_features(self, version):
+        """
+        Returns the query parameters supported by a version of the REST API
+        """
+        base_url = "https://{0}/rest/{1}/".format(self.get_option("host"),
+                                                  version)
+        features = []
+        for feature, path, check in _FEATURE_PROBES:
+            try:
+                response = self.session.get(
+                    base_url + path, verify=self.validate_certs, timeout=10)
+                if response.status_code == 200 and check(response.json()):
+                    features.append(feature)
+            except (RequestException, ValueError):
+                pass
+        return features
+
+    @ensure_connect
+    def get_api_capabilities(self, versions=None):
+        """
+        Returns the REST API versions listed by the switch and the query
+        parameters supported by one of them, discovered once per connection
+        :param versions: versions understood by the caller, in order of
+            preference, defaults to the version of this connection
+        :return: dict with versions, None if the switch doesn't list them,
+            the chosen version and its features
+        """
+        listed = self._discover_api_versions(self.get_option("host"))
+        version = self.api_version
+        if versions:
+            versions = [_normalize_api_version(v) for v in versions]
+            supported = [v for v in versions if listed is None or v in listed]
+            version = supported[0] if supported else versions[0]
+        if version not in self._api_features:
+            self._api_features[version] = self._probe_api_features(version)
+        return dict(versions=listed, version=version,
+                    features=self._api_features[version])
+
+    def _mount_pool(self, session):
+        """
+        Mounts the keep-alive connections to the switch shared by every
+        request sent through this connection
+        """
+        session.mount("https://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.get_option("pool_maxsize")))
+
+    def _login(self):
+        """
+        Logs in to the switch, storing the session in the session cache
+        when it is enabled
+        """
+        try:
+            login_session = Session.login(
+                self.base_url, self.__username, self.__password,
+                self.use_proxy, True)
+        except LoginError as err:
+            raise AnsibleConnectionFailure(
+                err.message
+            )
+        if self.session is None:
+            self._mount_pool(login_session)
+            self.session = login_session
+        else:
+            # Keep the connections of the current session, only its cookies
+            # are replaced
+            self.session.cookies.clear()
+            self.session.cookies.update(login_session.cookies)
+            login_session.close()
+        if self._session_cache_path is not None:
+            _write_session_cache(self._session_cache_path,
+                                 dict_from_cookiejar(self.session.cookies))
+
+    def _get_cached_session(self):
+        """
+        Returns a session with the cached cookies if they are still logged
+        in, None otherwise
+        """
+        if self._session_cache_path is None:
+            return None
+        cookies = _read_session_cache(self._session_cache_path,
+                                      self.get_option("session_cache_ttl"))
+        if not cookies:
+            return None
+
+        session = RequestsSession()
+        self._mount_pool(session)
+        add_dict_to_cookiejar(session.cookies, cookies)
+        if self.use_proxy is False:
+            session.proxies = {"http": None, "https": None}
+        try:
+            response = session.get(self.base_url + _SESSION_CHECK_PATH,
+                                   verify=self.validate_certs, timeout=10)
+        except RequestException:
+            response = None
+        if response is None or response.status_code != 200:
+            session.close()
+            _remove_session_cache(self._session_cache_path)
+            return None
+
+        self.queue_message("vvvv", "reusing cached REST session")
+        return session
+
+    def handle_httperror(self, response):
+        """
+        Logs in again when the session expired
+        :return: True if the request must be retried
+        """
+        if response.status_code == 401:
+            if self._session_cache_path is not None:
+                _remove_session_cache(self._session_cache_path)
+            self._login()
+            return True
+        return False
+
     @ensure_connect
     def get_session(self):
         cookies = dict_from_cookiejar(self.session.cookies)
         return dict(
           success=True, cookies=cookies,
           url=self.base_url, use_proxy=self.use_proxy,
+          proxy_requests=self.proxy_requests,
+          governor=dict(
+            max_inflight=self.get_option("max_inflight"),
+            rate_limit=self.get_option("rate_limit"),
+            retries=self.get_option("retries"),
+            retry_backoff=self.get_option("retry_backoff")),
           credentials=dict(
             username=self.__username,
             password=self.__password)
           )
 
+    @ensure_connect
+    def proxy_request(self, method, url, data=None, headers=None,
+                      timeout=None, verify=True):
+        """
+        Sends a REST request over the keep-alive connections of this
+        connection on behalf of a module, paced by the governor of the
+        connection
+        :param method: HTTP method
+        :param url: absolute URL, or path relative to the REST base URL
+        :param data: request body as text
+        :param headers: dict with the request headers
+        :param timeout: requests timeout, a number or [connect, read]
+        :param verify: whether to validate SSL certificates
+        :return: dict with the status, reason, headers, body and url of
+            the response, encoding is set to base64 for binary bodies and
+            wire_bytes is the size of the body before its decompression
+        """
+        if not url.startswith("http"):
+            url = self.base_url + url.lstrip("/")
+        request_headers = {}
+        for name, value in (headers or {}).items():
+            if name.lower() not in _PROXY_SKIP_HEADERS:
+                request_headers[name] = value
+        if isinstance(timeout, list):
+            timeout = tuple(timeout)
+        if data is not None:
+            data = data.encode("utf-8")
+
+        def send():
+            response = self.session.request(
+                method, url, data=data, headers=request_headers,
+                timeout=timeout, verify=verify)
+            if response.status_code == 401 and \
+                    not url.startswith(self.base_url + "login") and \
+                    self.handle_httperror(response):
+                response = self.session.request(
+                    method, url, data=data, headers=request_headers,
+                    timeout=timeout, verify=verify)
+            return response
+
+        response = self._governor.call(method, send)
+        self._proxied_requests += 1
+
+        result = dict(
+            status=response.status_code,
+            reason=response.reason,
+            headers=dict(response.headers),
+            url=response.url,
+            encoding=None,
+            wire_bytes=_get_wire_bytes(response)
+        )
+        try:
+            result["body"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            result["body"] = base64.b64encode(response.content).decode("ascii")
+            result["encoding"] = "base64"
+        return result
+
+    @ensure_connect
+    def get_pool_stats(self):
+        """
+        Returns the usage of the keep-alive connections to the switch
+        """
+        adapter = self.session.get_adapter(self.base_url)
+        pool = adapter.poolmanager.connection_from_url(self.base_url)
+        opened = pool.num_connections
+        sent = pool.num_requests
+        # The pool queue holds None for the slots without a connection
+        idle = 0
+        if pool.pool is not None:
+            idle = len([conn for conn in list(pool.pool.queue)
+                        if conn is not None])
+        return dict(
+            proxied_requests=self._proxied_requests,
+            requests=sent,
+            connections_opened=opened,
+            connections_reused=max(sent - opened, 0),
+            idle_connections=idle,
+            pool_maxsize=self.get_option("pool_maxsize"),
+            throttle_stats=self._governor.to_dict()
+        )
+
     def close(self):
-        if self.session is not None:
+        if self.session is not None and self._session_cache_path is not None:
+            # Keep the session logged in for the next connections
+            _write_session_cache(self._session_cache_path,
+                                 dict_from_cookiejar(self.session.cookies))
+            self.session.close()
+            self.use_proxy = None
+            self.session = None
+            self.base_url = None
+        elif self.session is not None:
             login_session = dict(
               s=self.session,
               url=self.base_url,
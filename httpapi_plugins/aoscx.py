@@ -29,22 +29,459 @@ options:
     vars:
       - name: ansible_acx_no_proxy
         version_added: '2.8'
+  acx_session_cache:
+    type: bool
+    default: False
+    description:
+      - Specifies whether to keep the REST session open when the connection
+        is closed and store its cookie on disk, so that the following
+        connections to the same device with the same user reuse it instead
+        of logging in again
+    env:
+      - name: ANSIBLE_ACX_SESSION_CACHE
+    vars:
+      - name: ansible_acx_session_cache
+  acx_session_cache_dir:
+    type: path
+    default: ~/.ansible/aoscx_sessions
+    description:
+      - Directory holding the cached sessions, it is created readable only
+        by the current user and isn't used if other users have access to it
+    env:
+      - name: ANSIBLE_ACX_SESSION_CACHE_DIR
+    vars:
+      - name: ansible_acx_session_cache_dir
+  acx_session_cache_ttl:
+    type: int
+    default: 600
+    description:
+      - Time in seconds after its last use during which a cached session is
+        reused, it should be lower than the REST session idle timeout of the
+        device
+    env:
+      - name: ANSIBLE_ACX_SESSION_CACHE_TTL
+    vars:
+      - name: ansible_acx_session_cache_ttl
+  acx_compress_uploads:
+    type: bool
+    default: False
+    description:
+      - Specifies whether to gzip the large request bodies, like the configs
+        written to the device. Only enable it for firmware that accepts
+        compressed requests, it is turned off for the rest of the connection
+        when the device refuses a compressed request
+    env:
+      - name: ANSIBLE_ACX_COMPRESS_UPLOADS
+    vars:
+      - name: ansible_acx_compress_uploads
+  acx_retries:
+    type: int
+    default: 3
+    description:
+      - Number of times a request is sent again when the device throttles
+        it with a 429 or 503 response. GET, PUT and DELETE requests are also
+        sent again after a timeout, a connection error or a 502 or 504
+        response, POST requests aren't since the device may have processed
+        them
+    env:
+      - name: ANSIBLE_ACX_RETRIES
+    vars:
+      - name: ansible_acx_retries
+  acx_retry_backoff:
+    type: float
+    default: 0.5
+    description:
+      - Seconds waited at most before the first retry, doubled at each
+        retry. The wait is picked at random up to that value, and is at
+        least the Retry-After of the device
+    env:
+      - name: ANSIBLE_ACX_RETRY_BACKOFF
+    vars:
+      - name: ansible_acx_retry_backoff
+  acx_rate_limit:
+    type: float
+    default: 0
+    description:
+      - Maximum number of requests sent to the device per second by the
+        persistent connection, 0 for no limit
+    env:
+      - name: ANSIBLE_ACX_RATE_LIMIT
+    vars:
+      - name: ansible_acx_rate_limit
 """
 
+import copy
+import hashlib
 import json
 import os
-from ansible.module_utils._text import to_text
+import random
+import re
+import shutil
+import socket
+import stat
+import time
+import zlib
+from io import BytesIO
+from ansible.errors import AnsibleConnectionFailure
+from ansible.module_utils._text import to_bytes, to_text
 from ansible.module_utils.connection import ConnectionError
 from ansible.module_utils.parsing.convert_bool import boolean
 from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.urls import open_url
 from ansible.plugins.httpapi import HttpApiBase
 
+try:
+    import ijson
+    HAS_IJSON = True
+    _JSON_ERRORS = (ValueError, ijson.JSONError)
+except ImportError:
+    HAS_IJSON = False
+    _JSON_ERRORS = (ValueError,)
+
 # Removed the exception handling as only required pre 2.8 and collection is
 # supported in >= 2.9
 from ansible.utils.display import Display
 
 display = Display()
 
+# Size from which response bodies are parsed incrementally when ijson is
+# installed, instead of being decoded to a string first
+STREAM_DECODE_SIZE = 1024 * 1024
+
+# Size of the reads of a response written to a file
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Compressions accepted for the responses
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# Minimum size of the request bodies compressed when acx_compress_uploads
+# is enabled
+COMPRESS_MIN_SIZE = 16 * 1024
+
+# Status codes of a device refusing a compressed request body
+_COMPRESSION_REFUSED_CODES = (400, 415, 501)
+
+# First bytes of gzip and zlib streams, no JSON document starts with them
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZLIB_MAGIC = b'\x78'
+
+# The retry policy below and RestGovernor copy module_utils/aoscx_governor.py,
+# like connection_plugins/aoscx.py. Connection plugins run in the persistent
+# connection process, which can't import the module_utils of this role, so
+# keep the copies in sync.
+
+# Number of times a request is sent again after being throttled or failing
+MAX_RETRIES = 3
+
+# Seconds waited before the first retry, doubled at each retry
+RETRY_BACKOFF = 0.5
+
+# Longest wait before a retry, in seconds
+MAX_RETRY_BACKOFF = 30
+
+# Responses of a device refusing a request before processing it
+THROTTLE_CODES = (429, 503)
+
+# Responses of a gateway that may or may not have forwarded the request
+GATEWAY_CODES = (502, 504)
+
+# Methods sending the same request twice has the same effect as sending it
+# once. A POST is only sent again when the device refused it.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Number of calls kept by the trace of the persistent connection
+MAX_TRACE_RECORDS = 10000
+
+# The REST API version helpers and _FEATURE_PROBES below are copied in
+# connection_plugins/aoscx.py, plugins can't import each other, so keep both
+# copies in sync.
+
+# Version of the REST API used when the device doesn't list its versions
+DEFAULT_API_VERSION = 'v10.04'
+
+_API_VERSION_RE = re.compile(r'^v\d+(\.\d+)?$')
+
+# Requests checking the query parameters understood by a version of the REST
+# API. Parameters unknown to the device are either refused or ignored, the
+# check of the response tells the latter apart.
+_FEATURE_PROBES = (
+    ('attributes', 'system?attributes=platform_name',
+     lambda data: isinstance(data, dict) and list(data) == ['platform_name']),
+    ('selector', 'system/vrfs?selector=configuration',
+     lambda data: isinstance(data, (dict, list))),
+    ('filter', 'system/vrfs?depth=1&filter=name:default',
+     lambda data: isinstance(data, dict) and list(data) == ['default']),
+)
+
+
+def _api_version_key(version):
+    return tuple(int(part) for part in version[1:].split('.'))
+
+
+def _parse_api_versions(data):
+    '''
+    Returns the versions listed by the /rest resource of a device, oldest
+    first
+    '''
+    if not isinstance(data, dict):
+        return []
+    versions = [key for key in data if _API_VERSION_RE.match(key)]
+    return sorted(versions, key=_api_version_key)
+
+
+def _normalize_api_version(version):
+    return version if version.startswith('v') else 'v' + version
+
+
+def _get_retry_after(value):
+    '''
+    Returns the seconds of a Retry-After header, None unless it holds a
+    number of seconds
+    '''
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_response_header(response, name):
+    '''
+    Returns a header of a response, or None if it isn't present
+    '''
+    try:
+        return response.headers.get(name)
+    except AttributeError:
+        return None
+
+
+def _load_json(response_data):
+    '''
+    Decodes the JSON body held by a BytesIO without copying its buffer
+    '''
+    if not hasattr(response_data, 'getbuffer'):
+        return json.loads(to_text(response_data.getvalue()))
+    if HAS_IJSON and _get_buffer_size(response_data) >= STREAM_DECODE_SIZE:
+        def parse(**kwargs):
+            response_data.seek(0)
+            try:
+                return next(iter(ijson.items(response_data, '', **kwargs)))
+            except StopIteration:
+                raise ValueError("empty response")
+
+        try:
+            return parse(use_float=True)
+        except TypeError:
+            # ijson < 3.1 doesn't know use_float, which it only reports
+            # once the parse started, it returns Decimal instead of float
+            return parse()
+    with response_data.getbuffer() as body:
+        # str() decodes straight from the buffer of the BytesIO
+        return json.loads(str(body, 'utf-8'))
+
+
+def _get_decompressor(response, head):
+    '''
+    Returns a zlib decompressor for a compressed body, or None. The first
+    bytes of the body are checked along with Content-Encoding, the body may
+    have been decompressed already by open_url.
+    '''
+    if head[:2] == _GZIP_MAGIC:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    encoding = _get_response_header(response, 'Content-Encoding') or ''
+    if encoding.lower() == 'deflate' and head[:1] and \
+            head[:1] not in (b'{', b'[', b'"'):
+        if head[:1] == _ZLIB_MAGIC:
+            return zlib.decompressobj()
+        # Some servers send raw deflate data without the zlib header
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+    return None
+
+
+def _copy_decompressed(source, dest, decompressor,
+                       chunk_size=DOWNLOAD_CHUNK_SIZE):
+    '''
+    Decompresses a file-like object into another one chunk by chunk
+    '''
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        dest.write(decompressor.decompress(chunk))
+    dest.write(decompressor.flush())
+
+
+def _get_buffer_size(buffer):
+    if hasattr(buffer, 'getbuffer'):
+        return len(buffer.getbuffer())
+    return len(buffer.getvalue())
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+# The session cache helpers below are copied in connection_plugins/aoscx.py,
+# which stores the cookies of its session instead of auth headers. Plugins
+# can't import each other, so keep both copies in sync.
+
+
+def _get_session_cache_path(cache_dir, host, username):
+    '''
+    Returns the file caching the session of a user on a device, or None if
+    the cache directory can't be used safely
+    '''
+    cache_dir = os.path.expanduser(cache_dir)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        dir_stat = os.stat(cache_dir)
+    except OSError:
+        return None
+    # The cookies give access to the device, don't use a directory other
+    # users can read or write
+    if dir_stat.st_uid != os.getuid() or \
+            stat.S_IMODE(dir_stat.st_mode) & 0o077:
+        return None
+    key = "{0}\n{1}".format(host, username).encode("utf-8")
+    return os.path.join(
+        cache_dir, "httpapi-{0}.json".format(hashlib.sha256(key).hexdigest()))
+
+
+def _read_session_cache(path, ttl):
+    '''
+    Returns the auth headers of a cached session, or None if there is no
+    session used in the last ttl seconds
+    '''
+    try:
+        with open(path) as cache_file:
+            cached = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or \
+            time.time() - cached.get('last_used', 0) > ttl:
+        return None
+    return cached.get('auth')
+
+
+def _write_session_cache(path, auth):
+    '''
+    Stores the auth headers of a session, the file is only readable by the
+    current user
+    '''
+    tmp_path = "{0}.{1}".format(path, os.getpid())
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(dict(auth=auth, last_used=time.time()), cache_file)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        _remove_session_cache(tmp_path)
+
+
+def _remove_session_cache(path):
+    '''
+    Removes a cached session
+    '''
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class RestGovernor(object):
+    '''
+    Paces the requests of the persistent connection, which sends one
+    request at a time, a copy of the RestGovernor of
+    module_utils/aoscx_governor.py without its limit of requests in flight
+
+    At most rate requests are started per second. Throttled requests are
+    sent again after a jittered exponential backoff, and only idempotent
+    requests are sent again after a timeout or a connection error, since
+    the device may have processed them.
+    '''
+
+    def __init__(self, rate=None, retries=MAX_RETRIES, backoff=RETRY_BACKOFF,
+                 max_backoff=MAX_RETRY_BACKOFF):
+        self._interval = 1.0 / rate if rate else 0.0
+        self._next_start = 0.0
+        self._retries = max(retries or 0, 0)
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self.stats = dict(requests=0, retries=0, throttled=0, errors=0,
+                          gave_up=0, rate_waits=0, wait_seconds=0.0,
+                          backoff_seconds=0.0)
+
+    def _wait_turn(self):
+        now = time.time()
+        if now < self._next_start:
+            self.stats['rate_waits'] += 1
+            self.stats['wait_seconds'] += self._next_start - now
+            time.sleep(self._next_start - now)
+            now = self._next_start
+        self._next_start = now + self._interval
+
+    def get_delay(self, attempt, retry_after=None):
+        '''
+        Returns the seconds to wait before a retry, picked at random up to
+        the exponential backoff of the attempt, and at least the Retry-After
+        of the device
+        '''
+        ceiling = min(self._max_backoff, self._backoff * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self._max_backoff))
+        return delay
+
+    def call(self, method, send):
+        '''
+        Sends a request, again while it is throttled or fails and retries
+        are left
+        :param method: HTTP method of the request
+        :param send: callable returning the response and its body
+        :return: the last response and its body, the last exception is
+            raised instead when the request didn't get a response
+        '''
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self._wait_turn()
+            self.stats['requests'] += 1
+            try:
+                response, response_data = send()
+            except (AnsibleConnectionFailure, socket.timeout):
+                self.stats['errors'] += 1
+                if not idempotent or attempt >= self._retries:
+                    if idempotent:
+                        self.stats['gave_up'] += 1
+                    raise
+                retry_after = None
+            else:
+                status = getattr(response, 'code', 200)
+                throttled = status in THROTTLE_CODES
+                if throttled:
+                    self.stats['throttled'] += 1
+                if not throttled and \
+                        not (idempotent and status in GATEWAY_CODES):
+                    return response, response_data
+                if attempt >= self._retries:
+                    self.stats['gave_up'] += 1
+                    return response, response_data
+                retry_after = _get_retry_after(
+                    _get_response_header(response, 'Retry-After'))
+
+            delay = self.get_delay(attempt, retry_after)
+            self.stats['retries'] += 1
+            self.stats['backoff_seconds'] += delay
+            time.sleep(delay)
+            attempt += 1
+
+    def to_dict(self):
+        stats = dict(self.stats)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['backoff_seconds'] = round(stats['backoff_seconds'], 3)
+        return stats
+
 
 class HttpApi(HttpApiBase):
 
@@ -57,8 +494,41 @@ class HttpApi(HttpApiBase):
             os.environ['no_proxy'] = "*"
             display.vvvv("no_proxy set to True")
 
+    def _get_session_cache_path(self):
+        '''
+        Returns the file caching the session of this connection, or None if
+        the session cache is disabled or can't be used
+        '''
+        try:
+            enabled = boolean(self.get_option("acx_session_cache"))
+        except KeyError:
+            enabled = False
+        if not enabled:
+            return None
+        cache_dir = self.get_option("acx_session_cache_dir")
+        path = _get_session_cache_path(
+            cache_dir, self.connection.get_option('host'),
+            self.connection.get_option('remote_user'))
+        if path is None:
+            display.warning("Unable to use the session cache directory {0}, "
+                            "it must be only accessible by the current "
+                            "user".format(cache_dir))
+        return path
+
     def login(self, username, password):
         self.set_no_proxy()
+
+        cache_path = self._get_session_cache_path()
+        if cache_path is not None:
+            auth = _read_session_cache(
+                cache_path, self.get_option("acx_session_cache_ttl"))
+            if auth:
+                # An expired session is answered with 401, which logs in
+                # again through handle_httperror
+                display.vvvv("reusing cached REST session")
+                self.connection._auth = auth
+                return
+
         path = ('/rest/v1/login?username={username}'
                 '&password={password}'.format(username=username,
                                               password=password))
@@ -68,7 +538,16 @@ class HttpApi(HttpApiBase):
         self.send_request(data=None, path=path, method=method,
                           headers=headers)
 
+        if cache_path is not None and self.connection._auth:
+            _write_session_cache(cache_path, self.connection._auth)
+
     def logout(self):
+        cache_path = self._get_session_cache_path()
+        if cache_path is not None and self.connection._auth:
+            # Keep the session logged in for the next connections
+            _write_session_cache(cache_path, self.connection._auth)
+            return
+
         path = '/rest/v1/logout'
         data = None
         method = 'POST'
@@ -79,12 +558,416 @@ class HttpApi(HttpApiBase):
         if 'headers' in message_kwargs.keys():
             headers = message_kwargs['headers']
 
+        if message_kwargs['method'] != 'GET':
+            self.invalidate_cache()
+
+        response, response_data = self._send(
+            data, message_kwargs['path'], message_kwargs['method'], headers)
+        return self.handle_response(response, response_data)
+
+    def get_transfer_stats(self):
+        '''
+        Returns the number of bytes of the requests and responses of this
+        connection, as sent on the wire and once decompressed
+        '''
+        if getattr(self, '_transfer_stats', None) is None:
+            self._transfer_stats = dict(
+                responses=0, compressed_responses=0, response_bytes=0,
+                response_wire_bytes=0, compressed_requests=0,
+                request_bytes=0, request_wire_bytes=0)
+        return self._transfer_stats
+
+    def get_trace(self, offset=None):
+        '''
+        Returns the requests sent by this connection since offset, the
+        values of their query parameters are left out. Requests are only
+        recorded once a module asked for the trace.
+        :param offset: offset returned by a previous call, None to only get
+            the current offset
+        :return: dict with the offset of the next request and the records
+        '''
+        self._tracing = True
+        base, records = getattr(self, '_trace', (0, []))
+        end = base + len(records)
+        if offset is None:
+            return dict(offset=end, records=[])
+        return dict(offset=end, records=records[max(offset - base, 0):])
+
+    def _add_trace(self, record):
+        base, records = getattr(self, '_trace', (0, []))
+        records.append(record)
+        if len(records) > MAX_TRACE_RECORDS:
+            dropped = len(records) - MAX_TRACE_RECORDS
+            del records[:dropped]
+            base += dropped
+        self._trace = (base, records)
+
+    def _traced_send(self, data, headers, path, method):
+        '''
+        Sends a request through the connection and traces it when a module
+        asked for the trace
+        '''
+        if not getattr(self, '_tracing', False):
+            return self.connection.send(data=data, headers=headers,
+                                        path=path, method=method)
+        start = time.time()
+        response = response_data = None
+        try:
+            response, response_data = self.connection.send(
+                data=data, headers=headers, path=path, method=method)
+            return response, response_data
+        finally:
+            query = path.partition('?')[2]
+            if query:
+                path = '{0}?{1}'.format(path.partition('?')[0], '&'.join(
+                    param.partition('=')[0] for param in query.split('&')))
+            self._add_trace(dict(
+                kind='rest', method=method, path=path,
+                status=getattr(response, 'code', None) or
+                getattr(response, 'status', None),
+                bytes_out=len(to_bytes(data)) if data else 0,
+                bytes_in=_get_buffer_size(response_data)
+                if response_data is not None else 0,
+                total=time.time() - start, start=start))
+
+    def _get_governor(self):
+        if getattr(self, '_governor', None) is None:
+            options = dict(rate=None, retries=MAX_RETRIES,
+                           backoff=RETRY_BACKOFF)
+            for option, name in (('acx_rate_limit', 'rate'),
+                                 ('acx_retries', 'retries'),
+                                 ('acx_retry_backoff', 'backoff')):
+                try:
+                    value = self.get_option(option)
+                except KeyError:
+                    continue
+                if value is not None:
+                    options[name] = float(value) if name != 'retries' \
+                        else int(value)
+            self._governor = RestGovernor(**options)
+        return self._governor
+
+    def get_throttle_stats(self):
+        '''
+        Returns the number of requests of this connection that were
+        throttled, sent again or delayed, and the seconds spent waiting
+        '''
+        return self._get_governor().to_dict()
+
+    def _compress_uploads(self):
+        if getattr(self, '_compression_refused', False):
+            return False
+        try:
+            return boolean(self.get_option("acx_compress_uploads"))
+        except KeyError:
+            return False
+
+    def _send(self, data, path, method, headers=None):
+        '''
+        Sends a request with the auth of the session, asking for a compressed
+        response and compressing large bodies when enabled. Throttled and
+        failed requests are sent again by the governor
+        :return: the response and a BytesIO with its decompressed body
+        '''
+        headers = headers if headers is not None else {}
         if self.connection._auth:
             headers.update(self.connection._auth)
-        response, response_data = self.connection.send(
-            data=data, headers=headers, path=message_kwargs['path'],
-            method=message_kwargs['method'])
-        return self.handle_response(response, response_data)
+        headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+
+        stats = self.get_transfer_stats()
+        body = data
+        if data and method in ('PUT', 'POST') and \
+                len(data) >= COMPRESS_MIN_SIZE and self._compress_uploads():
+            body = _gzip(to_bytes(data, errors='surrogate_or_strict'))
+            headers['Content-Encoding'] = 'gzip'
+
+        sent = dict(body=body)
+
+        def send():
+            response, response_data = self._traced_send(
+                sent['body'], headers, path, method)
+            if sent['body'] is not data and \
+                    getattr(response, 'code', None) in \
+                    _COMPRESSION_REFUSED_CODES:
+                # The uncompressed body is sent right away, within the same
+                # governed attempt, and the following requests aren't
+                # compressed whatever the device answers to it
+                display.vvvv("compressed requests refused by the device, "
+                             "sending them uncompressed")
+                self._compression_refused = True
+                headers.pop('Content-Encoding')
+                sent['body'] = data
+                response, response_data = self._traced_send(
+                    data, headers, path, method)
+            return response, response_data
+
+        response, response_data = self._get_governor().call(method, send)
+        body = sent['body']
+
+        if data:
+            stats['request_bytes'] += len(to_bytes(data))
+            stats['request_wire_bytes'] += len(to_bytes(body))
+            if body is not data:
+                stats['compressed_requests'] += 1
+
+        stats['responses'] += 1
+        stats['response_wire_bytes'] += _get_buffer_size(response_data)
+        decompressor = _get_decompressor(response, response_data.read(2))
+        response_data.seek(0)
+        if decompressor is not None:
+            decompressed = BytesIO()
+            _copy_decompressed(response_data, decompressed, decompressor)
+            decompressed.seek(0)
+            response_data = decompressed
+            stats['compressed_responses'] += 1
+        stats['response_bytes'] += _get_buffer_size(response_data)
+        return response, response_data
+
+    def _get_response_cache(self):
+        '''
+        Returns the responses cached by this persistent connection, keyed by
+        host and path
+        '''
+        if getattr(self, '_response_cache', None) is None:
+            self._response_cache = {}
+        return self._response_cache
+
+    def invalidate_cache(self):
+        '''
+        Drops the cached responses that must be revalidated, called whenever
+        the switch is written to
+        '''
+        cache = self._get_response_cache()
+        for key in list(cache.keys()):
+            if cache[key]['revalidate']:
+                cache.pop(key)
+
+    def get_cached(self, path, revalidate=False):
+        '''
+        GET a resource once per persistent connection and host
+
+        Responses fetched with revalidate set are checked on every call with
+        the ETag returned by the switch, and are only downloaded again when
+        the switch reports they changed or when it doesn't return an ETag.
+        '''
+        transaction = getattr(self, '_transaction', None)
+        if transaction is not None and transaction['path'] == path:
+            return transaction['config']
+
+        cache = self._get_response_cache()
+        key = (self.connection.get_option('host'), path)
+        entry = cache.get(key)
+
+        if entry is not None and not revalidate:
+            return entry['data']
+
+        headers = {}
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+
+        response, response_data = self._send(None, path, 'GET', headers)
+
+        if entry is not None and getattr(response, 'code', None) == 304:
+            display.vvvv("{0} not modified, using cached response"
+                         "".format(path))
+            return entry['data']
+
+        data = self.handle_response(response, response_data)
+        cache[key] = dict(data=data, revalidate=revalidate,
+                          etag=_get_response_header(response, 'ETag'))
+        return data
+
+    def get_if_changed(self, path, etag=None):
+        '''
+        GET a resource unless it still has the given ETag, the known ETag
+        is sent along so the resource isn't transferred when it didn't
+        change
+        :param path: path of the resource
+        :param etag: optional ETag of the copy held by the caller
+        :return: dict with the current ETag, None if the switch doesn't
+            return one, and the data of the resource, None when it didn't
+            change
+        '''
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+
+        response, response_data = self._send(None, path, 'GET', headers)
+
+        if etag and getattr(response, 'code', None) == 304:
+            return dict(etag=etag, data=None)
+
+        data = self.handle_response(response, response_data)
+        return dict(etag=_get_response_header(response, 'ETag'), data=data)
+
+    def _get_json(self, path):
+        '''
+        GET a resource, returning None if the device answers with an error
+        or a body that isn't JSON
+        '''
+        response, response_data = self._send(None, path, 'GET')
+        if getattr(response, 'code', 200) >= 400:
+            return None
+        try:
+            return _load_json(response_data)
+        except _JSON_ERRORS:
+            return None
+
+    def get_api_capabilities(self, versions=None):
+        '''
+        Returns the REST API versions listed by the device and the query
+        parameters supported by one of them, discovered once per persistent
+        connection
+        :param versions: versions understood by the caller, in order of
+            preference, defaults to the latest version listed by the device
+        :return: dict with versions, None if the device doesn't list them,
+            the chosen version and its features
+        '''
+        if getattr(self, '_api_capabilities', None) is None:
+            listed = _parse_api_versions(self._get_json('/rest'))
+            self._api_capabilities = dict(versions=listed or None,
+                                          features={})
+            display.vvvv("REST API versions: %s" % (', '.join(listed) or
+                                                   'unknown'))
+        capabilities = self._api_capabilities
+        listed = capabilities['versions']
+
+        if versions:
+            versions = [_normalize_api_version(v) for v in versions]
+            supported = [v for v in versions if listed is None or v in listed]
+            version = supported[0] if supported else versions[0]
+        else:
+            listed_v10 = [v for v in listed or [] if v != 'v1']
+            version = listed_v10[-1] if listed_v10 else DEFAULT_API_VERSION
+
+        if version not in capabilities['features']:
+            features = []
+            for feature, path, check in _FEATURE_PROBES:
+                data = self._get_json('/rest/{0}/{1}'.format(version, path))
+                if data is not None and check(data):
+                    features.append(feature)
+            capabilities['features'][version] = features
+        return dict(versions=listed, version=version,
+                    features=capabilities['features'][version])
+
+    def get_to_file(self, path, dest):
+        '''
+        GET a resource and write its body to a file as it is received,
+        without holding it in memory
+        :param path: URL of the resource
+        :param dest: path of the file, replaced only when the whole body was
+            received
+        :return: dict with the number of bytes written and the ETag
+        '''
+        url_kwargs = dict(
+            method='GET',
+            timeout=self.connection.get_option('persistent_command_timeout'),
+            validate_certs=self.connection.get_option('validate_certs'))
+        try:
+            url_kwargs['use_proxy'] = self.connection.get_option('use_proxy')
+        except KeyError:
+            pass
+
+        for attempt in range(2):
+            headers = {'Accept-Encoding': ACCEPT_ENCODING}
+            if self.connection._auth:
+                headers.update(self.connection._auth)
+            try:
+                response = open_url(self.connection._url + path,
+                                    headers=headers, **url_kwargs)
+                break
+            except HTTPError as exc:
+                if attempt or self.handle_httperror(exc) is not True:
+                    raise ConnectionError(
+                        "Unable to GET {0}: {1}".format(path, to_text(exc)),
+                        code=exc.code)
+
+        tmp_path = '{0}.{1}'.format(dest, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as dest_file:
+                head = response.read(2)
+                decompressor = _get_decompressor(response, head)
+                if decompressor is not None:
+                    dest_file.write(decompressor.decompress(head))
+                    _copy_decompressed(response, dest_file, decompressor)
+                else:
+                    dest_file.write(head)
+                    shutil.copyfileobj(response, dest_file,
+                                       DOWNLOAD_CHUNK_SIZE)
+                size = dest_file.tell()
+            os.rename(tmp_path, dest)
+        except (IOError, OSError) as exc:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise ConnectionError("Unable to write {0}: {1}".format(
+                dest, to_text(exc)))
+        finally:
+            response.close()
+
+        return dict(bytes=size, etag=_get_response_header(response, 'ETag'))
+
+    def begin_transaction(self, path):
+        '''
+        Starts collecting the config changes of the following tasks instead
+        of writing them to the switch
+        :param path: URL of the config the changes are applied to
+        '''
+        if getattr(self, '_transaction', None) is not None:
+            raise ConnectionError('A transaction is already in progress')
+
+        config = self.get_cached(path, revalidate=True)
+        self._transaction = dict(path=path, original=config,
+                                 config=copy.deepcopy(config), changes=0)
+
+    def get_transaction(self, include_configs=False):
+        '''
+        Returns the state of the transaction in progress, or None
+        :param include_configs: whether to include the original config and
+            the config with the staged changes
+        '''
+        transaction = getattr(self, '_transaction', None)
+        if transaction is None:
+            return None
+
+        state = dict(path=transaction['path'], changes=transaction['changes'])
+        if include_configs:
+            state['original'] = transaction['original']
+            state['config'] = transaction['config']
+        return state
+
+    def stage_config_changes(self, changes):
+        '''
+        Applies config changes to the config of the transaction in progress
+        :param changes: list of (table, row, before, after) changes, row is
+            None when the whole table changed, after is None when removed
+        '''
+        transaction = getattr(self, '_transaction', None)
+        if transaction is None:
+            raise ConnectionError('No transaction in progress')
+
+        config = transaction['config']
+        for table, row, before, after in changes:
+            if row is None:
+                if after is None:
+                    config.pop(table, None)
+                else:
+                    config[table] = after
+            elif after is None:
+                config.get(table, {}).pop(row, None)
+            else:
+                config.setdefault(table, {})[row] = after
+            transaction['changes'] += 1
+
+        return transaction['changes']
+
+    def end_transaction(self):
+        '''
+        Discards the transaction in progress and the configs it holds
+        '''
+        self._transaction = None
+        self.invalidate_cache()
 
     def get_connection_details(self):
         connection_details = {}
@@ -100,9 +983,9 @@ class HttpApi(HttpApiBase):
     def handle_response(self, response, response_data):
         response_data_json = ''
         try:
-            response_data_json = \
-                json.loads(to_text(response_data.getvalue().decode()))
-        except ValueError:
+            response_data_json = _load_json(response_data)
+        except _JSON_ERRORS:
+            response_data.seek(0)
             response_data = response_data.read().decode()
 
         if isinstance(response, HTTPError):
@@ -134,6 +1017,9 @@ class HttpApi(HttpApiBase):
             if self.connection._auth:
                 # Stored auth appears to be invalid, clear and retry
                 self.connection._auth = None
+                cache_path = self._get_session_cache_path()
+                if cache_path is not None:
+                    _remove_session_cache(cache_path)
                 self.login(self.connection.get_option('remote_user'),
                            self.connection.get_option('password'))
                 return True
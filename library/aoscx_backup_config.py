@@ -57,6 +57,13 @@ options:
     type: bool
     default: True
     required: false
+  stream_to_file:
+    description: Write the JSON config to output_file as it is received from
+      the switch, without loading it in memory. The file holds the config as
+      returned by the switch, neither indented nor sorted.
+    type: bool
+    default: False
+    required: false
 '''  # NOQA
 
 EXAMPLES = '''
@@ -65,6 +72,12 @@ EXAMPLES = '''
      config_name: 'running-config'
      output_file: '/home/admin/running-config.json'
 
+ - name: Copy a large Running Config to local as JSON without loading it in memory
+   aoscx_backup_config:
+     config_name: 'running-config'
+     output_file: '/home/admin/running-config.json'
+     stream_to_file: True
+
  - name: Copy Startup Config to local as JSON
    aoscx_backup_config:
      config_name: 'startup-config'
@@ -100,6 +113,7 @@ EXAMPLES = '''
 RETURN = r''' # '''
 
 from ansible.module_utils.aoscx import ArubaAnsibleModule, comp_sort  # NOQA
+from ansible.module_utils.aoscx import get_to_file
 import json
 
 def main():
@@ -109,7 +123,8 @@ def main():
         remote_output_file_tftp_path=dict(type='str', default=None),
         config_type=dict(type='str', default='json', choices=['json', 'cli']),
         vrf=dict(type='str'),
-        sort_json=dict(type='bool', default=True)
+        sort_json=dict(type='bool', default=True),
+        stream_to_file=dict(type='bool', default=False)
     )
 
     # Version management
@@ -151,6 +166,15 @@ def main():
         if ansible_module.check_mode:
             ansible_module.exit_json(**result)
 
+        if ansible_module.params['stream_to_file'] and config_file and \
+                tftp_path is None and config_type == 'json':
+            from ansible.module_utils.aoscx_pyaoscx import get_to_file
+            result['bytes'] = get_to_file(
+                ansible_module, 'fullconfigs/{0}'.format(config_name),
+                config_file, session=session)
+            result['changed'] = True
+            ansible_module.exit_json(**result)
+
         # Get session serialized information
         session_info = session.get_session()
         # Create pyaoscx.session object
@@ -201,6 +225,10 @@ def main():
                         "startup-config can be backed-up using TFTP")
             aruba_ansible_module.copy_switch_config_to_remote_location(
                 config_name, config_type, tftp_path_encoded, vrf)
+        elif aruba_ansible_module.module.params['stream_to_file']:
+            get_to_file(aruba_ansible_module.module,
+                        '/rest/v1/fullconfigs/{0}'.format(config_name),
+                        config_file)
         else:
 
             config_json = aruba_ansible_module.get_switch_config(
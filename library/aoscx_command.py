@@ -67,6 +67,16 @@ options:
     required: False
     type: int
 
+  pipeline:
+    description: Send consecutive 'show' commands to the switch at once instead
+      of waiting for the output of each one before sending the next. The output
+      is split back into the response of each command at the prompts that
+      follow them. Commands with prompts to answer, and any other command, are
+      still sent one by one.
+    default: False
+    required: False
+    type: bool
+
   output_file:
     description: Full path of the local system file to which commands' results will be output.
       The directory must exist, but if the file doesn't exist, it will be created.
@@ -166,6 +176,15 @@ EXAMPLES = '''
     retries: 5
     interval: 5
 
+- name: Send several show commands at once
+  aoscx_command:
+    commands:
+      - 'show vlan'
+      - 'show interface brief'
+      - 'show lldp neighbor-info'
+      - 'show ip route'
+    pipeline: True
+
 - name: Show all available commands and output them to a file (as JSON)
   aoscx_command:
     commands: ['list']
@@ -237,6 +256,7 @@ def main():
         match=dict(default='all', choices=['any', 'all']),
         retries=dict(default=10, type='int'),
         interval=dict(default=1, type='int'),
+        pipeline=dict(type='bool', default=False),
         output_file=dict(type='str', default=None),
         output_file_format=dict(type='str', default='json',
                                 choices=['json', 'plain-text'])
@@ -263,7 +283,8 @@ def main():
     match = module.params['match']
 
     while retries >= 0:
-        responses = run_commands(module, commands)
+        responses = run_commands(module, commands,
+                                 pipeline=module.params['pipeline'])
 
         for item in list(conditionals):
             if item(responses):
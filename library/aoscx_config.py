@@ -122,6 +122,24 @@ options:
         type: path
     type: dict
 
+  block_size:
+    description:
+      - Number of config lines written to the switch at once. The output of
+        each block is checked for errors before sending the next one, and a
+        failure reports the offending line. The switch runs every line of a
+        block, so the lines following the failed line in its block were sent
+        too, they are reported as unknown since their outcome can't be
+        known. A line entering a context missing from the running-config,
+        such as a new interface vlan 10, ends its block, so its lines aren't
+        run when it fails. The lines take one round trip to the switch per
+        block instead of one each, the number of round trips is returned in
+        round_trips. Not suitable for commands asking for a confirmation.
+        Connections using libssh instead of paramiko send the lines one by
+        one. 0 sends the lines one by one.
+    required: False
+    type: int
+    default: 0
+
   running_config:
     description:
       - Specifies an alternative running-config to be used as the base config for matching. The 
@@ -280,6 +298,11 @@ EXAMPLES = '''
     parents: interface 1/1/4
     match: strict
 
+- name: Upload a large config from a local file in blocks of 50 lines
+  aoscx_config:
+    src: /users/Home/golden.cfg
+    block_size: 50
+
 - name: Configure a multi-line banner
   aoscx_config:
     lines:
@@ -365,6 +388,7 @@ def main():
 
         backup=dict(type='bool', default=False),
         backup_options=dict(type='dict', options=backup_spec),
+        block_size=dict(type='int', default=0),
 
         save_when=dict(choices=['always', 'never', 'modified', 'changed'],
                        default='never'),
@@ -445,7 +469,25 @@ def main():
             result['updates'] = commands
 
             if not module.check_mode:
-                load_config(module, commands)
+                config_lines = commands
+                contexts = None
+                if module.params['block_size']:
+                    # The indentation tells the batched load which lines
+                    # enter a context
+                    config_lines = list(module.params['before'] or []) + \
+                        [obj.raw for obj in configobjs] + \
+                        list(module.params['after'] or [])
+                    if config is not None:
+                        # Contexts of the running-config can't fail to be
+                        # entered
+                        contexts = [obj.text for obj in config.items
+                                    if obj.has_children and
+                                    not obj.has_parents]
+                batch = load_config(module, config_lines,
+                                    block_size=module.params['block_size'],
+                                    contexts=contexts)
+                if batch is not None:
+                    result['round_trips'] = batch['round_trips']
 
             result['changed'] = True
 
@@ -52,6 +52,64 @@ options:
     required: False
     type: list
 
+  fetch_timeout:
+    description:
+      - Seconds allowed to each REST fetch of the facts. The fetches of the
+        subsets and network resources run concurrently with pyaoscx, and
+        one after another over the httpapi connection. The time taken by
+        each of them is returned in facts_latency.
+    required: False
+    default: 300
+    type: int
+
+  interface_attributes:
+    description:
+      - Only retrieve these attributes of each interface in the interfaces
+        network resource, i.e. ['name', 'admin_state', 'description'].
+    required: False
+    type: list
+    elements: str
+
+  interface_filter:
+    description:
+      - Only retrieve the interfaces whose name matches one of these
+        shell-style patterns in the interfaces network resource,
+        i.e. ['1/3/*', 'lag*'].
+    required: False
+    type: list
+    elements: str
+
+  interface_fetch_limit:
+    description:
+      - Largest number of interfaces matched by interface_filter that are
+        fetched one by one, when they are also at most one in ten
+        interfaces of the switch. The interfaces are otherwise read with a
+        single request of the whole collection, filtered by name once
+        received. The REST API doesn't page the collection, set
+        interface_attributes to keep its response small.
+    required: False
+    default: 20
+    type: int
+
+  facts_cache:
+    description:
+      - Keep the running-config gathered by the config subset in a cache on
+        disk. It is fetched with the ETag of the cached copy, the switch
+        only sends it again when it changed. The other subsets are a few
+        attributes each and the network resources hold runtime state, they
+        are always fetched. Switches that don't return an ETag aren't
+        cached. The cache hits and misses are returned in facts_cache.
+    required: False
+    default: False
+    type: bool
+
+  facts_cache_dir:
+    description:
+      - Directory holding the facts cache, one file per switch.
+    required: False
+    default: ~/.ansible/aoscx_facts
+    type: path
+
   provider:
     description: A dict object containing connection details.
     suboptions:
@@ -95,6 +153,18 @@ EXAMPLES = '''
     gather_subset: ['host_name', 'fans']
     gather_network_resources: ['vrfs']
   register: facts_subset_output
+
+- name: Retrieve the state of the interfaces of line card 3
+  aoscx_facts:
+    gather_network_resources:
+      - interfaces
+    interface_filter:
+      - 1/3/*
+    interface_attributes:
+      - name
+      - admin_state
+      - link_state
+      - description
 '''  # NOQA
 
 RETURN = r'''
@@ -157,11 +227,72 @@ ansible_net_mgmt_intf_status:
   description: A dictionary of management interfaces running on the system
   returned: always
   type: dict
+facts_latency:
+  description: Seconds taken by the fetch of each subset or network resource
+  returned: always
+  type: dict
+facts_cache:
+  description: Subsets served from the facts cache (hits) and fetched from
+    the switch (misses)
+  returned: when facts_cache is enabled and the config subset is gathered
+  type: dict
+transfer_stats:
+  description: Number of responses received from the switch, how many were
+    compressed, and their bytes as received and once decompressed
+  returned: always
+  type: dict
+throttle_stats:
+  description: Number of requests sent to the switch, how many were
+    throttled, failed, sent again or given up on, the waits for the rate
+    and in-flight limits and the seconds spent waiting and backing off.
+    The requests proxied by the aoscx connection are counted in pool_stats
+    instead.
+  returned: always
+  type: dict
+pool_stats:
+  description: Requests proxied by the aoscx connection since it was
+    opened, the keep-alive connections it opened, reused and holds idle,
+    and the throttling counters of the proxied requests
+  returned: when ansible_aoscx_proxy_requests is enabled
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.aoscx import aoscx_http_argument_spec, get_connection
 from ansible.module_utils.facts.facts import Facts
+from ansible.module_utils.facts.planner import FactsPlanner
+from ansible.module_utils.facts.cache import FactsCache, RUNNING_CONFIG_URL
+from ansible.module_utils.facts.interfaces import iter_interfaces
+from ansible.module_utils.aoscx_rest import get_url_builder
+
+
+def get_facts_cache(module, host, get_config):
+    '''
+    Returns the facts cache of a switch validated against the ETag of its
+    running-config, or None if the cache is disabled or the config subset
+    isn't gathered
+    :param module: AnsibleModule object
+    :param host: address of the switch
+    :param get_config: callable sending a conditional GET of the
+        running-config given the cached ETag, returning a dict with the
+        current ETag and the running-config, None when it didn't change
+    '''
+    if not module.params['facts_cache'] or \
+            'config' not in module.params['gather_subset']:
+        return None
+    cache = FactsCache(module.params['facts_cache_dir'], host)
+    try:
+        response = get_config(cache.cached_indicator)
+    except Exception as exc:
+        module.warn("Unable to check the facts cache: {0}".format(exc))
+        cache.load(None)
+        return cache
+    fetched = None
+    if response['data'] is not None:
+        fetched = dict(config=dict(config=response['data']))
+    cache.load(response['etag'], fetched)
+    return cache
+
 
 def main():
     """
@@ -186,13 +317,21 @@ def main():
                                        'resource_utilization', 'domain_name']),
         'gather_network_resources': dict(type='list',
                                          choices=['interfaces', 'vlans',
-                                                  'vrfs'])
+                                                  'vrfs']),
+        'fetch_timeout': dict(type='int', default=300),
+        'interface_attributes': dict(type='list', elements='str'),
+        'interface_filter': dict(type='list', elements='str'),
+        'interface_fetch_limit': dict(type='int', default=20),
+        'facts_cache': dict(type='bool', default=False),
+        'facts_cache_dir': dict(type='path',
+                                default='~/.ansible/aoscx_facts')
     }
 
     # Version Management
     try:
 
-        from ansible.module_utils.aoscx_pyaoscx import Session
+        from ansible.module_utils.aoscx_pyaoscx import Session, \
+            get_pool_stats, run_concurrently
         from pyaoscx.session import Session as Pyaoscx_Session
         from pyaoscx.interface import Interface
         from pyaoscx.vlan import Vlan
@@ -218,9 +357,11 @@ def main():
         # Session info
         session_info = session.get_session()
 
-        # Create pyaoscx session object
-        s = Pyaoscx_Session.from_session(
-            session_info['s'], session_info['url'])
+        def new_pyaoscx_session():
+            # Each fetch runs in a thread of its own, with its own pyaoscx
+            # session and objects
+            return Pyaoscx_Session.from_session(
+                session.get_worker_session(), session_info['url'])
 
         warnings = []
         if ansible_module.params["gather_subset"] == "!config":
@@ -235,20 +376,108 @@ def main():
         network_resource_list = ansible_module.params['gather_network_resources']
         subset_list = ansible_module.params['gather_subset']
 
+        # Set the subsystem attributes allowed to retrieve as facts
+        allowed_subsystem_attributes = [
+            'product_info',
+            'power_supplies',
+            'interfaces',
+            'fans',
+            'resource_utilization'
+        ]
+
+        # The resource, device and subsystem fetches are independent, run
+        # them concurrently, each over its own session
+        planner = FactsPlanner(
+            timeout=ansible_module.params['fetch_timeout'])
+
+        def get_path(path):
+            response = session.get_worker_session().get(
+                session_info['url'] + path, verify=False)
+            response.raise_for_status()
+            return response.json()
+
+        def map_paths(function, paths):
+            results = []
+            for path, data, error in run_concurrently(function, paths):
+                if error is not None:
+                    raise error
+                results.append(data)
+            return results
+
+        def get_interfaces(session):
+            params = ansible_module.params
+            if not params['interface_attributes'] and \
+                    not params['interface_filter']:
+                return Interface.get_facts(session)
+            # Select the interfaces and their attributes instead of reading
+            # all of them with every attribute
+            return dict(iter_interfaces(
+                get_path, attributes=params['interface_attributes'],
+                patterns=params['interface_filter'],
+                fetch_limit=params['interface_fetch_limit'],
+                map_paths=map_paths,
+                url_builder=get_url_builder(ansible_module)))
+
+        resource_getters = dict(
+            interfaces=get_interfaces,
+            vlans=Vlan.get_facts,
+            vrfs=Vrf.get_facts
+        )
+
+        def get_config(etag=None):
+            headers = {'If-None-Match': etag} if etag else {}
+            response = session.get_worker_session().get(
+                session_info['url'] + 'fullconfigs/running-config',
+                headers=headers, verify=False)
+            if etag and response.status_code == 304:
+                return dict(etag=etag, data=None)
+            response.raise_for_status()
+            return dict(etag=response.headers.get('ETag'),
+                        data=response.json())
+
+        # The running-config is validated and, when it changed, fetched by
+        # the same conditional GET
+        cache = get_facts_cache(ansible_module, session_info['url'],
+                                get_config)
+        config = cache.get('config') if cache is not None else None
+        if 'config' in subset_list and config is None:
+            planner.add('config',
+                        lambda: dict(config=get_config()['data']))
+
+        for resource in network_resource_list or []:
+            planner.add(resource, resource_getters[resource],
+                        new_pyaoscx_session())
+
+        switch = Device(new_pyaoscx_session())
+        planner.add('device', switch.get)
+        subsystem_subsets = ['product_info', 'power_supplies',
+                             'physical_interfaces', 'fans',
+                             'resource_utilization']
+        subsystems_switch = Device(new_pyaoscx_session())
+        if set(subset_list) & set(subsystem_subsets):
+            planner.add('subsystems', subsystems_switch.get_subsystems)
+
+        results = planner.run()
+        if planner.errors:
+            ansible_module.fail_json(
+                msg="Unable to gather facts: {0}".format(', '.join(
+                    '{0}: {1}'.format(name, error) for name, error
+                    in sorted(planner.errors.items()))),
+                facts_latency=planner.latency)
+
+        if 'config' in subset_list:
+            if config is None:
+                config = results['config']
+                if cache is not None:
+                    cache.put('config', config)
+            ansible_facts['ansible_net_config'] = config['config']
+        if cache is not None:
+            cache.save()
+
         # Retrieve ansible_network_resources
         ansible_network_resources = {}
-        if network_resource_list is not None:
-            for resource in network_resource_list:
-                if resource == 'interfaces':
-                    ansible_network_resources.update(
-                        {'interfaces': Interface.get_facts(s)})
-                elif resource == 'vlans':
-                    ansible_network_resources.update(
-                        {'vlans': Vlan.get_facts(s)})
-                elif resource == 'vrfs':
-                    ansible_network_resources.update(
-                        {'vrfs': Vrf.get_facts(s)})
-
+        for resource in network_resource_list or []:
+            ansible_network_resources[resource] = results[resource]
         ansible_facts.update(
             {'ansible_network_resources': ansible_network_resources})
 
@@ -259,20 +488,6 @@ def main():
         # Retrieve ansible_net_gather_subset
         ansible_facts.update({'ansible_net_gather_subset': subset_list})
 
-        # Retrieve device facts
-        switch = Device(s)
-        switch.get()
-        switch.get_subsystems()  # subsystem
-
-        # Set the subsystem attributes allowed to retrieve as facts
-        allowed_subsystem_attributes = [
-            'product_info',
-            'power_supplies',
-            'interfaces',
-            'fans',
-            'resource_utilization'
-        ]
-
         # Set the default subsets that are always retreived as facts
         default_subset_list = [
             'management_interface',
@@ -297,6 +512,8 @@ def main():
                 subset = 'interfaces'
             elif subset == 'host_name':
                 subset = 'hostname'
+            elif subset == 'config':
+                continue
 
             str_subset = 'ansible_net_' + subset
 
@@ -308,20 +525,28 @@ def main():
 
             # Check if current subset is inside the allowed subsystem
             # attributes
-            elif subset in allowed_subsystem_attributes:
+            elif subset in allowed_subsystem_attributes and \
+                    'subsystems' in results:
                 ansible_facts.update({str_subset: {}})
 
                 # Iterate through Device subsystems
-                for subsystem, value in switch.subsystems.items():
+                for subsystem, value in \
+                        subsystems_switch.subsystems.items():
 
                     # Get attribute value and update the Ansible facts
                     # dictionary
                     ansible_facts[str_subset].update(
-                        {subsystem: switch.subsystems[subsystem][subset]})
-
-        ansible_module.exit_json(
-            ansible_facts=ansible_facts,
-            warnings=warnings)
+                        {subsystem: value[subset]})
+
+        result = dict(ansible_facts=ansible_facts, warnings=warnings,
+                      facts_latency=planner.latency,
+                      transfer_stats=session.transfer_stats,
+                      throttle_stats=session.governor.to_dict())
+        if cache is not None:
+            result['facts_cache'] = cache.to_dict()
+        if session.proxy_requests:
+            result['pool_stats'] = get_pool_stats(ansible_module)
+        ansible_module.exit_json(**result)
 
     # USE OLD VERSION
     else:
@@ -338,12 +563,36 @@ def main():
                 'default value for `gather_subset` will be changed '
                 'to `min` from `!config` v2.11 onwards')
 
-        result = Facts(module).get_facts()
+        connection = module._connection
+        cache = get_facts_cache(
+            module, connection.get_connection_details()['url'],
+            lambda etag: connection.get_if_changed(RUNNING_CONFIG_URL, etag))
+
+        transfer_before = connection.get_transfer_stats()
+        throttle_before = connection.get_throttle_stats()
+
+        facts = Facts(module)
+        result = facts.get_facts(timeout=module.params['fetch_timeout'],
+                                 cache=cache)
 
         ansible_facts, additional_warnings = result
         warnings.extend(additional_warnings)
 
-        module.exit_json(ansible_facts=ansible_facts, warnings=warnings)
+        # The connection counts since it was opened, keep this run only
+        transfer_stats = connection.get_transfer_stats()
+        for key, value in transfer_before.items():
+            transfer_stats[key] -= value
+        throttle_stats = connection.get_throttle_stats()
+        for key, value in throttle_before.items():
+            throttle_stats[key] = round(throttle_stats[key] - value, 3)
+
+        result = dict(ansible_facts=ansible_facts, warnings=warnings,
+                      facts_latency=facts.latency,
+                      transfer_stats=transfer_stats,
+                      throttle_stats=throttle_stats)
+        if cache is not None:
+            result['facts_cache'] = cache.to_dict()
+        module.exit_json(**result)
 
 
 if __name__ == '__main__':
@@ -31,9 +31,19 @@ options:
       i.e. 1/2/3 , 1/1/32. Please note, if the interface is a Layer3 interface
       in the existing configuration and the user wants to change the interface
       to be Layer2, the user must delete the L3 interface then recreate the
-      interface as a Layer2.
+      interface as a Layer2. Mutually exclusive with interfaces.
     type: str
-    required: true
+    required: false
+  interfaces:
+    description: List of interfaces to apply the same configuration to, items
+      can be interface names or ranges of ports of the same member and slot,
+      i.e. 1/1/1-1/1/24 or 1/1/1-24. With the aoscx connection the interfaces
+      are configured concurrently over a single session, otherwise the
+      running config is written once for all of them. Mutually exclusive
+      with interface.
+    type: list
+    elements: str
+    required: false
   description:
     description: Description of interface.
     type: str
@@ -233,15 +243,30 @@ EXAMPLES = '''
       - 11:22:33:44:55:66
       - aa:bb:cc:dd:ee:ff
 
+- name: Configure Interfaces 1/1/1 to 1/1/24 and 1/1/48 - vlan access 200
+  aoscx_l2_interface:
+    interfaces:
+      - 1/1/1-24
+      - 1/1/48
+    vlan_mode: access
+    vlan_access: '200'
+
 '''  # NOQA
 
-RETURN = r''' # '''
+RETURN = r'''
+interfaces_changed:
+  description: Interfaces that were changed (aoscx connection)
+  returned: when not in check mode, check mode doesn't inspect the
+    interfaces
+  type: list
+'''
 
 
 try:
     from pyaoscx.device import Device
     from ansible.module_utils.basic import AnsibleModule
-    from ansible.module_utils.aoscx_pyaoscx import get_pyaoscx_session
+    from ansible.module_utils.aoscx_pyaoscx import Session, \
+        get_pyaoscx_worker_session, per_thread, run_concurrently
     USE_PYAOSCX_SDK = True
 except ImportError:
     from ansible.module_utils.aoscx_vlan import VLAN
@@ -249,9 +274,216 @@ except ImportError:
     from ansible.module_utils.aoscx import ArubaAnsibleModule
     USE_PYAOSCX_SDK = False
 
+from ansible.module_utils.aoscx_interface import expand_interface_ranges
+
+
+def get_interface_list(module):
+    '''
+    Returns the names of the interfaces to configure, from either the
+    interface or the interfaces parameter
+    '''
+    interface = module.params['interface']
+    interfaces = module.params['interfaces']
+
+    if interface is None and not interfaces:
+        module.fail_json(msg="One of interface or interfaces is required")
+    if interface is not None and interfaces:
+        module.fail_json(msg="Parameters interface and interfaces are "
+                             "mutually exclusive")
+
+    if interface is not None:
+        return [interface]
+
+    try:
+        return expand_interface_ranges(interfaces)
+    except ValueError as exc:
+        module.fail_json(msg=str(exc))
+
+
+def configure_interface(device, interface_name, params):
+    '''
+    Applies the Layer2 configuration to an interface with pyaoscx
+    :param device: pyaoscx Device object
+    :param interface_name: name of the interface
+    :param params: module parameters
+    :return: True if the interface was changed
+    '''
+    # Create Interface Object
+    interface = device.interface(interface_name)
+
+    if params['state'] == 'delete':
+        # Delete it
+        interface.delete()
+        return True
+
+    # Verify if interface was create
+    changed = interface.was_modified()
+
+    # Set VLAN tag
+    vlan_tag = None
+    if params['vlan_access'] is not None:
+        vlan_tag = params['vlan_access']
+    elif params['native_vlan_id'] is not None:
+        vlan_tag = params['native_vlan_id']
+
+    if isinstance(vlan_tag, str):
+        vlan_tag = int(vlan_tag)
+
+    # Configure L2
+    # Verify if object was changed
+    modified_op = interface.configure_l2(
+        description=params['description'],
+        vlan_mode=params['vlan_mode'],
+        vlan_tag=vlan_tag,
+        vlan_ids_list=params['vlan_trunks'],
+        trunk_allowed_all=params['trunk_allowed_all'],
+        native_vlan_tag=params['native_vlan_tag'])
+
+    if params['speeds'] and params['duplex']:
+        modified_op |= interface.speed_duplex_configure(
+            speeds=params['speeds'],
+            duplex=params['duplex']
+        )
+
+    port_security_enable = params['port_security_enable']
+    if port_security_enable is not None:
+        if port_security_enable:
+            modified_op |= interface.port_security_enable(
+                client_limit=params['port_security_client_limit'],
+                sticky_mac_learning=params['port_security_sticky_learning'],
+                allowed_mac_addr=params['port_security_macs'],
+                allowed_sticky_mac_addr=params['port_security_sticky_macs'],
+                violation_action=params['port_security_violation_action'],
+                violation_recovery_time=params['port_security_recovery_time']
+            )
+        else:
+            modified_op |= interface.port_security_disable()
+
+    return changed or bool(modified_op)
+
+
+def configure_interface_config(aruba_ansible_module, interface_name, params):
+    '''
+    Applies the Layer2 configuration of an interface to the running config
+    :param aruba_ansible_module: ArubaAnsibleModule object
+    :param interface_name: name of the interface
+    :param params: module parameters
+    :return: ArubaAnsibleModule object
+    '''
+    state = params['state']
+    admin_state = params.get('admin_state')
+    description = params['description']
+    interface_qos_rate = params['interface_qos_rate']
+    interface_qos_schedule_profile = params['interface_qos_schedule_profile']
+
+    l2_interface = L2_Interface()
+    interface = Interface()
+    vlan = VLAN()
+
+    interface_vlan_dict = {}
+
+    if state == 'create':
+        aruba_ansible_module = l2_interface.create_l2_interface(
+            aruba_ansible_module, interface_name)
+
+        if params['vlan_mode'] == 'access':
+            interface_vlan_dict['vlan_mode'] = 'access'
+
+            if params['vlan_access'] is None:
+                interface_vlan_dict['vlan_tag'] = 1
+
+            elif vlan.check_vlan_exist(aruba_ansible_module,
+                                       params['vlan_access']):
+                interface_vlan_dict['vlan_tag'] = params['vlan_access']
+
+            else:
+                aruba_ansible_module.module.fail_json(
+                    msg="VLAN {0} is not configured".format(
+                        params["vlan_access"]
+                    )
+                )  # NOQA
+
+        elif params['vlan_mode'] == 'trunk':
+
+            if params['native_vlan_id']:
+                if params['native_vlan_id'] == '1':
+                    interface_vlan_dict['vlan_tag'] = '1'
+                    if params['native_vlan_tag']:
+                        interface_vlan_dict['vlan_mode'] = 'native-tagged'
+                    else:
+                        interface_vlan_dict['vlan_mode'] = 'native-untagged'
+                elif vlan.check_vlan_exist(aruba_ansible_module,
+                                           params['native_vlan_id']):
+                    if params['native_vlan_tag']:
+                        interface_vlan_dict['vlan_mode'] = 'native-tagged'
+                    else:
+                        interface_vlan_dict['vlan_mode'] = 'native-untagged'
+                    interface_vlan_dict['vlan_tag'] = params['native_vlan_id']
+                else:
+                    aruba_ansible_module.module.fail_json(
+                        msg="VLAN {id} is not configured".format(
+                            id=params['native_vlan_id']))
+
+            elif params['native_vlan_tag']:
+                interface_vlan_dict['vlan_mode'] = 'native-tagged'
+                interface_vlan_dict['vlan_tag'] = '1'
+
+            else:
+                interface_vlan_dict['vlan_mode'] = 'native-untagged'
+                interface_vlan_dict['vlan_tag'] = '1'
+
+            if not params['trunk_allowed_all'] and params['vlan_trunks']:
+                if 'vlan_mode' not in interface_vlan_dict.keys():
+                    interface_vlan_dict['vlan_mode'] = 'native-untagged'
+                interface_vlan_dict['vlan_trunks'] = []
+                for id in params['vlan_trunks']:
+                    if vlan.check_vlan_exist(aruba_ansible_module, id):
+                        interface_vlan_dict['vlan_trunks'].append(str(id))
+                    else:
+                        aruba_ansible_module.module.fail_json(
+                            msg="VLAN {id} is not configured".format(id=id))
+
+            elif params['trunk_allowed_all']:
+                if 'vlan_mode' not in interface_vlan_dict.keys():
+                    interface_vlan_dict['vlan_mode'] = 'native-untagged'
+
+        else:
+            interface_vlan_dict['vlan_mode'] = 'access'
+            interface_vlan_dict['vlan_tag'] = 1
+
+        aruba_ansible_module = l2_interface.update_interface_vlan_details(
+            aruba_ansible_module, interface_name, interface_vlan_dict)
+
+    if state == 'delete':
+        aruba_ansible_module = l2_interface.delete_l2_interface(
+            aruba_ansible_module, interface_name)
+
+    if (state == 'update') or (state == 'create'):
+
+        if admin_state is not None:
+            aruba_ansible_module = interface.update_interface_admin_state(
+                aruba_ansible_module, interface_name, admin_state)
+
+        if description is not None:
+            aruba_ansible_module = interface.update_interface_description(
+                aruba_ansible_module, interface_name, description)
+
+        if interface_qos_rate is not None:
+            aruba_ansible_module = l2_interface.update_interface_qos_rate(
+                aruba_ansible_module, interface_name, interface_qos_rate)
+
+        if interface_qos_schedule_profile is not None:
+            aruba_ansible_module = l2_interface.update_interface_qos_profile(
+                aruba_ansible_module, interface_name,
+                interface_qos_schedule_profile)
+
+    return aruba_ansible_module
+
+
 def main():
     module_args = dict(
-        interface=dict(type='str', required=True),
+        interface=dict(type='str', default=None),
+        interfaces=dict(type='list', elements='str', default=None),
         description=dict(type='str', default=None),
         vlan_mode=dict(type='str', default=None, choices=['access', 'trunk']),
         vlan_access=dict(type='str', default=None),
@@ -300,29 +532,8 @@ def main():
             supports_check_mode=True
         )
 
-        interface_name = ansible_module.params['interface']
-        description = ansible_module.params['description']
-        vlan_mode = ansible_module.params['vlan_mode']
-        vlan_access = ansible_module.params['vlan_access']
-        vlan_trunks = ansible_module.params['vlan_trunks']
-        trunk_allowed_all = ansible_module.params['trunk_allowed_all']
-        native_vlan_id = ansible_module.params['native_vlan_id']
-        native_vlan_tag = ansible_module.params['native_vlan_tag']
-        state = ansible_module.params['state']
-        speeds = ansible_module.params['speeds']
-        duplex = ansible_module.params['duplex']
-        port_security_enable = ansible_module.params['port_security_enable']
-        port_security_client_limit = ansible_module.params[
-            'port_security_client_limit']
-        port_security_sticky_learning = ansible_module.params[
-            'port_security_sticky_learning']
-        port_security_macs = ansible_module.params['port_security_macs']
-        port_security_sticky_macs = ansible_module.params[
-            'port_security_sticky_macs']
-        port_security_violation_action = ansible_module.params[
-            'port_security_violation_action']
-        port_security_recovery_time = ansible_module.params[
-            'port_security_recovery_time']
+        interface_names = get_interface_list(ansible_module)
+        params = ansible_module.params
 
         # Set result var
         result = dict(
@@ -332,66 +543,27 @@ def main():
         if ansible_module.check_mode:
             ansible_module.exit_json(**result)
 
-        session = get_pyaoscx_session(ansible_module)
-        device = Device(session)
-
-        if state == 'delete':
-            # Create Interface Object
-            interface = device.interface(interface_name)
-            # Delete it
-            interface.delete()
-
-            # Changed
-            result['changed'] = True
-        else:
-            # Set VLAN tag
-            vlan_tag = None
-            if vlan_access is not None:
-                vlan_tag = vlan_access
-            elif native_vlan_id is not None:
-                vlan_tag = native_vlan_id
-
-            if isinstance(vlan_tag, str):
-                vlan_tag = int(vlan_tag)
-
-            # Create Interface Object
-            interface = device.interface(interface_name)
-            # Verify if interface was create
-            if interface.was_modified():
-                # Changed
-                result['changed'] = True
-            # Configure L2
-            # Verify if object was changed
-            modified_op = interface.configure_l2(
-                description=description,
-                vlan_mode=vlan_mode,
-                vlan_tag=vlan_tag,
-                vlan_ids_list=vlan_trunks,
-                trunk_allowed_all=trunk_allowed_all,
-                native_vlan_tag=native_vlan_tag)
-
-            if speeds and duplex:
-                modified_op |= interface.speed_duplex_configure(
-                    speeds=speeds,
-                    duplex=duplex
-                )
-
-            if port_security_enable is not None:
-                if port_security_enable:
-                    modified_op |= interface.port_security_enable(
-                        client_limit=port_security_client_limit,
-                        sticky_mac_learning=port_security_sticky_learning,
-                        allowed_mac_addr=port_security_macs,
-                        allowed_sticky_mac_addr=port_security_sticky_macs,
-                        violation_action=port_security_violation_action,
-                        violation_recovery_time=port_security_recovery_time
-                    )
-                else:
-                    modified_op |= interface.port_security_disable()
-
-            if modified_op:
-                # Changed
-                result['changed'] = True
+        session = Session(ansible_module)
+        # The interfaces are independent from each other, configure them
+        # concurrently. pyaoscx objects can't be shared between threads,
+        # each thread gets its own session and Device over the same
+        # connections to the switch.
+        get_device = per_thread(
+            lambda: Device(get_pyaoscx_worker_session(session)))
+        results = run_concurrently(
+            lambda name: configure_interface(get_device(), name, params),
+            interface_names)
+
+        result['interfaces_changed'] = [
+            name for name, changed, error in results if changed]
+        result['changed'] = bool(result['interfaces_changed'])
+
+        errors = [(name, error) for name, changed, error in results
+                  if error is not None]
+        if errors:
+            result['msg'] = "Unable to configure interface {0}: {1}".format(
+                errors[0][0], errors[0][1])
+            ansible_module.fail_json(**result)
 
         # Exit
         ansible_module.exit_json(**result)
@@ -399,118 +571,17 @@ def main():
 
         aruba_ansible_module = ArubaAnsibleModule(module_args)
 
+        interface_names = get_interface_list(aruba_ansible_module.module)
+
         params = {}
         for param in aruba_ansible_module.module.params.keys():
             params[param] = aruba_ansible_module.module.params[param]
 
-        state = aruba_ansible_module.module.params['state']
-        admin_state = aruba_ansible_module.module.params['admin_state']
-        interface_name = aruba_ansible_module.module.params['interface']
-        description = aruba_ansible_module.module.params['description']
-        interface_qos_rate = aruba_ansible_module.module.params[
-            'interface_qos_rate']
-        interface_qos_schedule_profile = aruba_ansible_module.module.params[
-            'interface_qos_schedule_profile']
-
-        l2_interface = L2_Interface()
-        interface = Interface()
-        vlan = VLAN()
-
-        interface_vlan_dict = {}
-
-        if params['state'] == 'create':
-            aruba_ansible_module = l2_interface.create_l2_interface(
-                aruba_ansible_module, interface_name)
-
-            if params['vlan_mode'] == 'access':
-                interface_vlan_dict['vlan_mode'] = 'access'
-
-                if params['vlan_access'] is None:
-                    interface_vlan_dict['vlan_tag'] = 1
-
-                elif vlan.check_vlan_exist(aruba_ansible_module,
-                                           params['vlan_access']):
-                    interface_vlan_dict['vlan_tag'] = params['vlan_access']
-
-                else:
-                    aruba_ansible_module.module.fail_json(
-                        msg="VLAN {0} is not configured".format(
-                            params["vlan_access"]
-                        )
-                    )  # NOQA
-
-            elif params['vlan_mode'] == 'trunk':
-
-                if params['native_vlan_id']:
-                    if params['native_vlan_id'] == '1':
-                        interface_vlan_dict['vlan_tag'] = '1'
-                        if params['native_vlan_tag']:
-                            interface_vlan_dict['vlan_mode'] = 'native-tagged'
-                        else:
-                            interface_vlan_dict['vlan_mode'] = 'native-untagged'
-                    elif vlan.check_vlan_exist(aruba_ansible_module,
-                                               params['native_vlan_id']):
-                        if params['native_vlan_tag']:
-                            interface_vlan_dict['vlan_mode'] = 'native-tagged'
-                        else:
-                            interface_vlan_dict['vlan_mode'] = 'native-untagged'
-                        interface_vlan_dict['vlan_tag'] = params['native_vlan_id']
-                    else:
-                        aruba_ansible_module.module.fail_json(
-                            msg="VLAN {id} is not configured".format(
-                                id=params['native_vlan_id']))
-
-                elif params['native_vlan_tag']:
-                    interface_vlan_dict['vlan_mode'] = 'native-tagged'
-                    interface_vlan_dict['vlan_tag'] = '1'
-
-                else:
-                    interface_vlan_dict['vlan_mode'] = 'native-untagged'
-                    interface_vlan_dict['vlan_tag'] = '1'
-
-                if not params['trunk_allowed_all'] and params['vlan_trunks']:
-                    if 'vlan_mode' not in interface_vlan_dict.keys():
-                        interface_vlan_dict['vlan_mode'] = 'native-untagged'
-                    interface_vlan_dict['vlan_trunks'] = []
-                    for id in params['vlan_trunks']:
-                        if vlan.check_vlan_exist(aruba_ansible_module, id):
-                            interface_vlan_dict['vlan_trunks'].append(str(id))
-                        else:
-                            aruba_ansible_module.module.fail_json(
-                                msg="VLAN {id} is not configured".format(id=id))
-
-                elif params['trunk_allowed_all']:
-                    if 'vlan_mode' not in interface_vlan_dict.keys():
-                        interface_vlan_dict['vlan_mode'] = 'native-untagged'
-
-            else:
-                interface_vlan_dict['vlan_mode'] = 'access'
-                interface_vlan_dict['vlan_tag'] = 1
-
-            aruba_ansible_module = l2_interface.update_interface_vlan_details(
-                aruba_ansible_module, interface_name, interface_vlan_dict)
-
-        if state == 'delete':
-            aruba_ansible_module = l2_interface.delete_l2_interface(
-                aruba_ansible_module, interface_name)
-
-        if (state == 'update') or (state == 'create'):
-
-            if admin_state is not None:
-                aruba_ansible_module = interface.update_interface_admin_state(
-                    aruba_ansible_module, interface_name, admin_state)
-
-            if description is not None:
-                aruba_ansible_module = interface.update_interface_description(
-                    aruba_ansible_module, interface_name, description)
-
-            if interface_qos_rate is not None:
-                aruba_ansible_module = l2_interface.update_interface_qos_rate(
-                    aruba_ansible_module, interface_name, interface_qos_rate)
-
-            if interface_qos_schedule_profile is not None:
-                aruba_ansible_module = l2_interface.update_interface_qos_profile(
-                    aruba_ansible_module, interface_name, interface_qos_schedule_profile)
+        # All the interfaces are applied to the same running config, which
+        # is written to the switch once
+        for interface_name in interface_names:
+            aruba_ansible_module = configure_interface_config(
+                aruba_ansible_module, interface_name, params)
 
         aruba_ansible_module.update_switch_config()
 
@@ -28,9 +28,20 @@ author: Aruba Networks (@ArubaNetworks)
 options:
   interface:
     description: Interface name, should be in the format chassis/slot/port,
-      i.e. 1/2/3 , 1/1/32.
+      i.e. 1/2/3 , 1/1/32. Mutually exclusive with interfaces.
     type: str
-    required: true
+    required: false
+  interfaces:
+    description: List of interfaces to apply the same configuration to, items
+      can be interface names or ranges of ports of the same member and slot,
+      i.e. 1/1/1-1/1/24 or 1/1/1-24. ipv4 and ipv6 addresses can only be set
+      when a single interface is given. With the aoscx connection the
+      interfaces are configured concurrently over a single session,
+      otherwise the running config is written once for all of them.
+      Mutually exclusive with interface.
+    type: list
+    elements: str
+    required: false
   description:
     description: Description of interface.
     type: str
@@ -133,24 +144,192 @@ EXAMPLES = '''
     interface: 1/1/3
     ip_helper_address: ['172.1.5.44']
     state: update
+
+- name: Creating L3 interfaces 1/1/10 to 1/1/20 on VRF red
+  aoscx_l3_interface:
+    interfaces:
+      - 1/1/10-1/1/20
+    vrf: red
 '''  # NOQA
 
-RETURN = r''' # '''
+RETURN = r'''
+interfaces_changed:
+  description: Interfaces that were changed (aoscx connection)
+  returned: when not in check mode, check mode doesn't inspect the
+    interfaces
+  type: list
+'''
 
 try:
     from pyaoscx.device import Device
     from ansible.module_utils.basic import AnsibleModule
-    from ansible.module_utils.aoscx_pyaoscx import get_pyaoscx_session
+    from ansible.module_utils.aoscx_pyaoscx import Session, \
+        get_pyaoscx_worker_session, per_thread, run_concurrently
     USE_PYAOSCX_SDK = True
 except ImportError:
     from ansible.module_utils.aoscx import ArubaAnsibleModule
     from ansible.module_utils.aoscx_interface import L3_Interface, Interface
     USE_PYAOSCX_SDK = False
 
+from ansible.module_utils.aoscx_interface import expand_interface_ranges
+
+
+def get_interface_list(module):
+    '''
+    Returns the names of the interfaces to configure, from either the
+    interface or the interfaces parameter
+    '''
+    interface = module.params['interface']
+    interfaces = module.params['interfaces']
+
+    if interface is None and not interfaces:
+        module.fail_json(msg="One of interface or interfaces is required")
+    if interface is not None and interfaces:
+        module.fail_json(msg="Parameters interface and interfaces are "
+                             "mutually exclusive")
+
+    if interface is not None:
+        return [interface]
+
+    try:
+        interface_names = expand_interface_ranges(interfaces)
+    except ValueError as exc:
+        module.fail_json(msg=str(exc))
+
+    # The same address can't be assigned to several interfaces
+    if len(interface_names) > 1:
+        for param in ['ipv4', 'ipv6']:
+            if module.params[param] and module.params[param] != ['']:
+                module.fail_json(msg="Parameter {0} can only be set for a "
+                                     "single interface".format(param))
+
+    return interface_names
+
+
+def configure_interface(device, interface_name, params):
+    '''
+    Applies the Layer3 configuration to an interface with pyaoscx
+    :param device: pyaoscx Device object
+    :param interface_name: name of the interface
+    :param params: module parameters
+    :return: True if the interface was changed
+    '''
+    ipv4 = params['ipv4']
+    ipv6 = params['ipv6']
+    vrf = params['vrf']
+    ip_helper_addresses = params['ip_helper_address']
+
+    # Set IP variable as empty arrays
+    if ipv4 == ['']:
+        ipv4 = []
+    if ipv6 == ['']:
+        ipv6 = []
+
+    # Set Variables
+    if vrf is None:
+        vrf = 'default'
+
+    # Create Interface Object
+    interface = device.interface(interface_name)
+
+    if params['state'] == 'delete':
+        # Delete it
+        interface.delete()
+        return True
+
+    # Verify if interface was create
+    changed = interface.was_modified()
+
+    # Configure L3
+    # Verify if object was changed
+    modified_op = interface.configure_l3(
+        ipv4=ipv4,
+        ipv6=ipv6,
+        vrf=vrf,
+        description=params['description']
+    )
+
+    if ip_helper_addresses is not None:
+        # Create DHCP_Relay object
+        dhcp_relay = device.dhcp_relay(
+            vrf=vrf, port=interface_name)
+        # Add helper addresses
+        dhcp_relay.add_ipv4_addresses(ip_helper_addresses)
+
+    return changed or bool(modified_op)
+
+
+def configure_interface_config(aruba_ansible_module, interface_name, params):
+    '''
+    Applies the Layer3 configuration of an interface to the running config
+    :param aruba_ansible_module: ArubaAnsibleModule object
+    :param interface_name: name of the interface
+    :param params: module parameters
+    :return: ArubaAnsibleModule object
+    '''
+    admin_state = params.get('admin_state')
+    description = params['description']
+    ipv4 = params['ipv4']
+    ipv6 = params['ipv6']
+    interface_qos_rate = params['interface_qos_rate']
+    interface_qos_schedule_profile = params['interface_qos_schedule_profile']
+    vrf = params['vrf']
+    ip_helper_address = params['ip_helper_address']
+
+    state = params['state']
+
+    l3_interface = L3_Interface()
+    interface = Interface()
+    if state == 'create':
+        aruba_ansible_module = l3_interface.create_l3_interface(aruba_ansible_module, interface_name)  # NOQA
+        if vrf is None:
+            vrf = "default"
+
+        if vrf is not None:
+            aruba_ansible_module = l3_interface.update_interface_vrf_details_from_l3(aruba_ansible_module, vrf, interface_name)  # NOQA
+
+    if state == 'delete':
+        aruba_ansible_module = l3_interface.delete_l3_interface(
+            aruba_ansible_module, interface_name)
+
+    if (state == 'update') or (state == 'create'):
+
+        if admin_state is not None:
+            aruba_ansible_module = interface.update_interface_admin_state(
+                aruba_ansible_module, interface_name, admin_state)
+
+        if description is not None:
+            aruba_ansible_module = interface.update_interface_description(
+                aruba_ansible_module, interface_name, description)
+
+        if vrf is not None and vrf != "default":
+            aruba_ansible_module = l3_interface.update_interface_vrf_details_from_l3(aruba_ansible_module, vrf, interface_name)  # NOQA
+
+        if interface_qos_rate is not None:
+            aruba_ansible_module = l3_interface.update_interface_qos_rate(
+                aruba_ansible_module, interface_name, interface_qos_rate)
+
+        if interface_qos_schedule_profile is not None:
+            aruba_ansible_module = l3_interface.update_interface_qos_profile(aruba_ansible_module, interface_name, interface_qos_schedule_profile)  # NOQA
+
+        if ipv4 is not None:
+            aruba_ansible_module = l3_interface.update_interface_ipv4_address(aruba_ansible_module, interface_name, ipv4)  # NOQA
+
+        if ipv6 is not None:
+            aruba_ansible_module = l3_interface.update_interface_ipv6_address(aruba_ansible_module, interface_name, ipv6)  # NOQA
+
+        if ip_helper_address is not None:
+            if vrf is not None:
+                vrf = 'default'
+            aruba_ansible_module = l3_interface.update_interface_ip_helper_address(aruba_ansible_module, vrf, interface_name, ip_helper_address)  # NOQA
+
+    return aruba_ansible_module
+
 
 def main():
     module_args = dict(
-        interface=dict(type='str', required=True),
+        interface=dict(type='str', default=None),
+        interfaces=dict(type='list', elements='str', default=None),
         description=dict(type='str', default=None),
         ipv4=dict(type='list', default=None),
         ipv6=dict(type='list', default=None),
@@ -167,23 +346,8 @@ def main():
             supports_check_mode=True
         )
 
-        interface_name = ansible_module.params['interface']
-        description = ansible_module.params['description']
-        ipv4 = ansible_module.params['ipv4']
-        ipv6 = ansible_module.params['ipv6']
-        vrf = ansible_module.params['vrf']
-        ip_helper_addresses = ansible_module.params['ip_helper_address']
-        state = ansible_module.params['state']
-
-        # Set IP variable as empty arrays
-        if ipv4 ==['']:
-            ipv4 = []
-        if ipv6 == ['']:
-            ipv6 = []
-
-        # Set Variables
-        if vrf is None:
-            vrf = 'default'
+        interface_names = get_interface_list(ansible_module)
+        params = ansible_module.params
 
         # Set result var
         result = dict(
@@ -193,42 +357,27 @@ def main():
         if ansible_module.check_mode:
             ansible_module.exit_json(**result)
 
-        session = get_pyaoscx_session(ansible_module)
-        device = Device(session)
-        if state == 'delete':
-            # Create Interface Object
-            interface = device.interface(interface_name)
-            # Delete it
-            interface.delete()
-
-            # Changed
-            result['changed'] = True
-        else:
-            # Create Interface Object
-            interface = device.interface(interface_name)
-            # Verify if interface was create
-            if interface.was_modified():
-                # Changed
-                result['changed'] = True
-            # Configure L4
-            # Verify if object was changed
-            modified_op = interface.configure_l3(
-                ipv4=ipv4,
-                ipv6=ipv6,
-                vrf=vrf,
-                description=description
-            )
-
-            if ip_helper_addresses is not None:
-                # Create DHCP_Relay object
-                dhcp_relay = device.dhcp_relay(
-                    vrf=vrf, port=interface_name)
-                # Add helper addresses
-                dhcp_relay.add_ipv4_addresses(ip_helper_addresses)
-
-            if modified_op:
-                # Changed
-                result['changed'] = True
+        session = Session(ansible_module)
+        # The interfaces are independent from each other, configure them
+        # concurrently. pyaoscx objects can't be shared between threads,
+        # each thread gets its own session and Device over the same
+        # connections to the switch.
+        get_device = per_thread(
+            lambda: Device(get_pyaoscx_worker_session(session)))
+        results = run_concurrently(
+            lambda name: configure_interface(get_device(), name, params),
+            interface_names)
+
+        result['interfaces_changed'] = [
+            name for name, changed, error in results if changed]
+        result['changed'] = bool(result['interfaces_changed'])
+
+        errors = [(name, error) for name, changed, error in results
+                  if error is not None]
+        if errors:
+            result['msg'] = "Unable to configure interface {0}: {1}".format(
+                errors[0][0], errors[0][1])
+            ansible_module.fail_json(**result)
 
         # Exit
         ansible_module.exit_json(**result)
@@ -238,63 +387,14 @@ def main():
 
         aruba_ansible_module = ArubaAnsibleModule(module_args)
 
-        interface_name = aruba_ansible_module.module.params['interface']
-        admin_state = aruba_ansible_module.module.params['admin_state']
-        description = aruba_ansible_module.module.params['description']
-        ipv4 = aruba_ansible_module.module.params['ipv4']
-        ipv6 = aruba_ansible_module.module.params['ipv6']
-        interface_qos_rate = aruba_ansible_module.module.params['interface_qos_rate']  # NOQA
-        interface_qos_schedule_profile = aruba_ansible_module.module.params[
-            'interface_qos_schedule_profile']
-        vrf = aruba_ansible_module.module.params['vrf']
-        ip_helper_address = aruba_ansible_module.module.params['ip_helper_address']
-
-        state = aruba_ansible_module.module.params['state']
-
-        l3_interface = L3_Interface()
-        interface = Interface()
-        if state == 'create':
-            aruba_ansible_module = l3_interface.create_l3_interface(aruba_ansible_module, interface_name)  # NOQA
-            if vrf is None:
-                vrf = "default"
-
-            if vrf is not None:
-                aruba_ansible_module = l3_interface.update_interface_vrf_details_from_l3(aruba_ansible_module, vrf, interface_name)  # NOQA
-
-        if state == 'delete':
-            aruba_ansible_module = l3_interface.delete_l3_interface(
-                aruba_ansible_module, interface_name)
-
-        if (state == 'update') or (state == 'create'):
-
-            if admin_state is not None:
-                aruba_ansible_module = interface.update_interface_admin_state(
-                    aruba_ansible_module, interface_name, admin_state)
-
-            if description is not None:
-                aruba_ansible_module = interface.update_interface_description(
-                    aruba_ansible_module, interface_name, description)
-
-            if vrf is not None and vrf != "default":
-                aruba_ansible_module = l3_interface.update_interface_vrf_details_from_l3(aruba_ansible_module, vrf, interface_name)  # NOQA
-
-            if interface_qos_rate is not None:
-                aruba_ansible_module = l3_interface.update_interface_qos_rate(
-                    aruba_ansible_module, interface_name, interface_qos_rate)
-
-            if interface_qos_schedule_profile is not None:
-                aruba_ansible_module = l3_interface.update_interface_qos_profile(aruba_ansible_module, interface_name, interface_qos_schedule_profile)  # NOQA
-
-            if ipv4 is not None:
-                aruba_ansible_module = l3_interface.update_interface_ipv4_address(aruba_ansible_module, interface_name, ipv4)  # NOQA
-
-            if ipv6 is not None:
-                aruba_ansible_module = l3_interface.update_interface_ipv6_address(aruba_ansible_module, interface_name, ipv6)  # NOQA
+        interface_names = get_interface_list(aruba_ansible_module.module)
+        params = aruba_ansible_module.module.params
 
-            if ip_helper_address is not None:
-                if vrf is not None:
-                    vrf = 'default'
-                aruba_ansible_module = l3_interface.update_interface_ip_helper_address(aruba_ansible_module, vrf, interface_name, ip_helper_address)  # NOQA
+        # All the interfaces are applied to the same running config, which
+        # is written to the switch once
+        for interface_name in interface_names:
+            aruba_ansible_module = configure_interface_config(
+                aruba_ansible_module, interface_name, params)
 
         aruba_ansible_module.update_switch_config()
 
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2019-2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'certified'
+}
+
+DOCUMENTATION = '''
+---
+module: aoscx_transaction
+version_added: "2.8"
+short_description: Groups the config changes of several tasks into a single
+  write to an AOS-CX switch.
+description:
+  - This module begins, commits or aborts a transaction in the persistent
+    connection to an AOS-CX switch. While a transaction is in progress the
+    REST API modules that edit the running-config (aoscx_vlan,
+    aoscx_l2_interface, aoscx_l3_interface, aoscx_acl, aoscx_vrf, ...)
+    apply their changes to a config held by the connection instead of
+    writing to the switch, and report them as changed. Committing the
+    transaction writes all the collected changes at once. When they are
+    written as a whole config, they are applied to the running-config read
+    at commit, so the writes made meanwhile by other modules or by hand
+    are kept.
+  - Only supported with the legacy REST API modules, which use
+    ansible_connection set to httpapi.
+author: Aruba Networks (@ArubaNetworks)
+options:
+  state:
+    description: Begin a transaction, write the changes collected by the
+      transaction in progress to the switch, or discard them.
+    type: str
+    required: False
+    choices: ['begin', 'commit', 'abort']
+    default: 'begin'
+'''
+
+EXAMPLES = '''
+- name: Begin transaction
+  aoscx_transaction:
+    state: begin
+
+- name: Create VLANs
+  aoscx_vlan:
+    vlan_id: "{{ item }}"
+  loop: "{{ range(100, 600) | list }}"
+
+- name: Write all VLANs to the switch
+  aoscx_transaction:
+    state: commit
+'''
+
+RETURN = r'''
+staged_changes:
+  description: Number of config changes collected by the transaction
+  returned: when state is commit or abort
+  type: int
+'''
+
+from ansible.module_utils.aoscx import ArubaAnsibleModule, get_connection
+from ansible.module_utils.aoscx_config_diff import get_config_changes
+from ansible.module_utils.connection import ConnectionError
+from ansible.module_utils._text import to_text
+
+RUNNING_CONFIG_URL = '/rest/v1/fullconfigs/running-config'
+
+
+def main():
+    module_args = dict(
+        state=dict(type='str', default='begin',
+                   choices=['begin', 'commit', 'abort'])
+    )
+
+    aruba_ansible_module = ArubaAnsibleModule(module_args=module_args,
+                                              store_config=False)
+    module = aruba_ansible_module.module
+
+    state = module.params['state']
+    connection = get_connection(module)
+    transaction = connection.get_transaction(
+        include_configs=(state == 'commit'))
+
+    result = dict(changed=False, warnings=aruba_ansible_module.warnings)
+
+    if state == 'begin':
+        if transaction is not None:
+            module.fail_json(msg="A transaction is already in progress with "
+                                 "{0} staged changes"
+                                 "".format(transaction['changes']))
+        connection.begin_transaction(RUNNING_CONFIG_URL)
+        module.exit_json(**result)
+
+    if transaction is None:
+        module.fail_json(msg="No transaction in progress")
+
+    result['staged_changes'] = transaction['changes']
+
+    if state == 'commit':
+        changes = get_config_changes(transaction['original'],
+                                     transaction['config'])
+        try:
+            if changes and not module.check_mode:
+                # The config of the transaction was read at begin, writes
+                # that weren't staged since then are kept by applying the
+                # changes to the current config when it is uploaded whole
+                aruba_ansible_module.write_config_changes(
+                    changes, transaction['config'], rebase=True)
+        except ConnectionError as exc:
+            connection.end_transaction()
+            module.fail_json(msg="Unable to write the transaction changes: "
+                                 "{0}".format(to_text(exc)))
+        result['changed'] = bool(changes)
+
+    connection.end_transaction()
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
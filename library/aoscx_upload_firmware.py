@@ -46,6 +46,28 @@ options:
     description: VRF to be used to contact HTTP server, required if remote_firmware_file_path is provided
     type: str
     required: false
+  force:
+    description: Upload firmware_file_path even if the partition already
+      holds the same firmware version. Without it the version read from the
+      header of the image is compared with the version of the partition, and
+      the upload is skipped when they match. Images whose header and file
+      name hold different versions, or none, are always uploaded.
+    type: bool
+    default: false
+    required: false
+  upload_timeout:
+    description: Seconds the upload of firmware_file_path may go without
+      progress before it fails. Only used with the httpapi connection.
+    type: int
+    default: 300
+    required: false
+  upload_retries:
+    description: Number of times a failed upload of firmware_file_path is
+      started again. The switch can't resume a partial upload, so every
+      retry sends the whole image. Only used with the httpapi connection.
+    type: int
+    default: 2
+    required: false
 '''  # NOQA
 
 EXAMPLES = '''
@@ -61,13 +83,61 @@ EXAMPLES = '''
     firmware_file_path: '/tftpboot/TL_10_04_0030A.swi'
 '''
 
-RETURN = r''' # '''
+RETURN = r'''
+image_version:
+  description: Firmware version read from firmware_file_path, None when
+    it is unknown or ambiguous
+  returned: when firmware_file_path is provided
+  type: str
+partition_version:
+  description: Firmware version of the partition before the upload
+  returned: when firmware_file_path is provided
+  type: str
+upload_stats:
+  description: Number of attempts, bytes sent, duration in seconds and
+    average throughput of the upload of firmware_file_path (httpapi
+    connection)
+  returned: when firmware_file_path is uploaded
+  type: dict
+'''
 
 from ansible.module_utils.aoscx import (
     ArubaAnsibleModule,
+    get,
     put,
     file_upload,
 )
+from ansible.module_utils.aoscx_upload import get_image_info, \
+    normalize_version
+
+
+def check_image(module, firmware, result):
+    '''
+    Compares the version of the local image with the version of the
+    partition it is uploaded to
+    :param module: AnsibleModule object
+    :param firmware: dict with the firmware information of the switch
+    :param result: dict updated with the versions of the image
+    :return: True if the image must be uploaded
+    '''
+    firmware_file_path = module.params['firmware_file_path']
+    partition_name = module.params['partition_name']
+
+    try:
+        image = get_image_info(firmware_file_path)
+    except (IOError, OSError) as exc:
+        module.fail_json(msg="Unable to read {0}: {1}".format(
+            firmware_file_path, exc))
+
+    partition_version = normalize_version(
+        (firmware or {}).get('{0}_version'.format(partition_name)))
+    result['image_version'] = image['version']
+    result['partition_version'] = partition_version
+
+    if module.params['force'] or image['version'] is None:
+        return True
+    return image['version'] != partition_version
+
 
 def main():
     module_args = dict(
@@ -75,7 +145,10 @@ def main():
                             choices=['primary', 'secondary']),
         firmware_file_path=dict(type='str', default=None),
         remote_firmware_file_path=dict(type='str', default=None),
-        vrf=dict(type='str', default=None)
+        vrf=dict(type='str', default=None),
+        force=dict(type='bool', default=False),
+        upload_timeout=dict(type='int', default=300),
+        upload_retries=dict(type='int', default=2)
     )
 
     # Version management
@@ -113,12 +186,21 @@ def main():
             changed=False
         )
 
-        if ansible_module.check_mode:
-            ansible_module.exit_json(**result)
-
         # Get session serialized information
         session_info = session.get_session()
 
+        if firmware_file_path is not None:
+            response = session_info['s'].get(
+                session_info['url'] + 'firmware', verify=False)
+            firmware = response.json() if response.status_code == 200 \
+                else None
+            if not check_image(ansible_module, firmware, result):
+                ansible_module.exit_json(**result)
+
+        if ansible_module.check_mode:
+            result['changed'] = True
+            ansible_module.exit_json(**result)
+
         # Create pyaoscx.session object
         # Use username and password from session_info
         s = Pyaoscx_Session.from_session(
@@ -149,6 +231,9 @@ def main():
         partition_name = aruba_ansible_module.module.params['partition_name']
         firmware_file_path = \
             aruba_ansible_module.module.params['firmware_file_path']
+        upload_stats = None
+        result = dict(changed=False,
+                      warnings=aruba_ansible_module.warnings)
 
         unsupported_versions = [
             "10.00",
@@ -179,11 +264,22 @@ def main():
                         vrf=vrf)
             put(aruba_ansible_module.module, url)
         else:
+            firmware = get(aruba_ansible_module.module, '/rest/v1/firmware')
+            if not check_image(aruba_ansible_module.module, firmware,
+                               result):
+                aruba_ansible_module.module.exit_json(**result)
+
             url = '/rest/v1/firmware?image={part}'.format(part=partition_name)
-            file_upload(aruba_ansible_module, url, firmware_file_path)
-        result = dict(changed=aruba_ansible_module.changed,
-                      warnings=aruba_ansible_module.warnings)
+            upload_stats = {}
+            file_upload(aruba_ansible_module.module, url, firmware_file_path,
+                        timeout=aruba_ansible_module.module.params[
+                            'upload_timeout'],
+                        retries=aruba_ansible_module.module.params[
+                            'upload_retries'],
+                        stats=upload_stats)
         result["changed"] = True
+        if upload_stats is not None:
+            result["upload_stats"] = upload_stats
         aruba_ansible_module.module.exit_json(**result)
 
 
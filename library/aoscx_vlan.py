@@ -27,9 +27,36 @@ author: Aruba Networks (@ArubaNetworks)
 options:
   vlan_id:
     description: The ID of this VLAN. Non-internal VLANs must have an 'id'
-                 between 1 and 4094 to be effectively instantiated.
-    required: true
+                 between 1 and 4094 to be effectively instantiated. Either
+                 vlan_id or vlans is required.
+    required: false
     type: int
+  vlans:
+    description: List of VLANs to create, update or delete at once, all of
+                 them with the given state. The existing VLANs are read once
+                 and only the VLANs that differ are written.
+    required: false
+    type: list
+    elements: dict
+    suboptions:
+      vlan_id:
+        description: VLAN ID, or comma separated VLAN IDs and ranges such as
+                     '100-199,300'. The other options apply to all of them.
+        required: true
+        type: str
+      name:
+        description: VLAN name
+        required: false
+        type: str
+      description:
+        description: VLAN description
+        required: false
+        type: str
+      admin_state:
+        description: The Admin State of the VLAN, options are 'up' and 'down'.
+        required: false
+        choices: ['up', 'down']
+        type: str
   name:
     description: VLAN name
     required: false
@@ -67,17 +94,212 @@ EXAMPLES = '''
   aoscx_vlan:
     vlan_id: 300
     state: delete
+
+- name: Create VLANs 100 to 199 and VLAN 300 with its own name
+  aoscx_vlan:
+    vlans:
+      - vlan_id: 100-199
+        description: Access VLANs
+      - vlan_id: 300
+        name: UPLINK_VLAN
+        admin_state: up
+
+- name: Delete VLANs 100 to 199
+  aoscx_vlan:
+    vlans:
+      - vlan_id: 100-199
+    state: delete
 '''
 
-RETURN = r''' # '''
+RETURN = r'''
+vlans_created:
+  description: IDs of the VLANs created, when vlans is used
+  returned: when vlans is used
+  type: list
+vlans_updated:
+  description: IDs of the VLANs updated, when vlans is used
+  returned: when vlans is used
+  type: list
+vlans_deleted:
+  description: IDs of the VLANs deleted, when vlans is used
+  returned: when vlans is used
+  type: list
+'''
+
+from collections import OrderedDict
 
-from ansible.module_utils.aoscx_vlan import VLAN
+from ansible.module_utils.aoscx_vlan import VLAN, expand_vlan_ids
 from ansible.module_utils.aoscx import ArubaAnsibleModule
 
 
+def get_vlan_list(module):
+    '''
+    Returns the VLANs to configure as an OrderedDict of VLAN ID to fields
+    '''
+    params = module.params
+    if params['vlans'] is None and params['vlan_id'] is None:
+        module.fail_json(msg="One of vlan_id or vlans is required")
+    if params['vlans'] is not None and params['vlan_id'] is not None:
+        module.fail_json(msg="vlan_id and vlans are mutually exclusive")
+
+    if params['vlans'] is None:
+        entries = [dict(vlan_id=params['vlan_id'], name=params['name'],
+                        description=params['description'],
+                        admin_state=params['admin_state'])]
+    else:
+        entries = params['vlans']
+
+    vlans = OrderedDict()
+    for entry in entries:
+        try:
+            vlan_ids = expand_vlan_ids(entry['vlan_id'])
+        except ValueError as exc:
+            module.fail_json(msg=str(exc))
+        for vlan_id in vlan_ids:
+            vlans[vlan_id] = dict(name=entry.get('name'),
+                                  description=entry.get('description'),
+                                  admin_state=entry.get('admin_state'))
+    return vlans
+
+
+def configure_vlans(module, session_info, vlans, state, result):
+    '''
+    Creates, updates or deletes a list of VLANs with the pyaoscx session
+    reading the existing VLANs once and writing only the VLANs that differ.
+    A VLAN is read again before it is updated, to PUT it back with only the
+    given fields changed.
+    '''
+    s = session_info['s']
+    vlans_url = session_info['url'] + 'system/vlans'
+
+    def request(method, url, body=None):
+        response = s.request(method, url, json=body, verify=False)
+        if response.status_code not in (200, 201, 204):
+            module.fail_json(msg="{0} {1} failed: {2}".format(
+                method, url, response.text), status=response.status_code)
+
+    def get_writable(url, depth):
+        response = s.get(url, params={'depth': depth, 'selector': 'writable'},
+                         verify=False)
+        if response.status_code != 200:
+            module.fail_json(msg="Unable to retrieve {0}: {1}".format(
+                url, response.text), status=response.status_code)
+        return response.json()
+
+    # The VLANs of the collection are only compared, at depth 2 their
+    # references are expanded objects that can't be written back
+    existing = get_writable(vlans_url, 2)
+
+    result['vlans_created'] = []
+    result['vlans_updated'] = []
+    result['vlans_deleted'] = []
+
+    for vlan_id, fields in vlans.items():
+        vlan_url = '{0}/{1}'.format(vlans_url, vlan_id)
+        current = existing.get(str(vlan_id))
+
+        if state == 'delete':
+            if current is not None:
+                result['vlans_deleted'].append(vlan_id)
+                if not module.check_mode:
+                    request('DELETE', vlan_url)
+            continue
+
+        desired = {}
+        if fields['name'] is not None:
+            desired['name'] = fields['name']
+        if fields['description'] is not None:
+            desired['description'] = fields['description']
+        if fields['admin_state'] is not None:
+            desired['admin'] = fields['admin_state']
+
+        if current is None:
+            if state == 'update':
+                result['warnings'].append(
+                    "VLAN ID {0} is not configured".format(vlan_id))
+                continue
+            body = dict(id=vlan_id, type='static',
+                        name="VLAN{0}".format(vlan_id))
+            body.update(desired)
+            result['vlans_created'].append(vlan_id)
+            if not module.check_mode:
+                request('POST', vlans_url, body)
+            continue
+
+        changes = dict((key, value) for key, value in desired.items()
+                       if current.get(key) != value)
+        if changes:
+            result['vlans_updated'].append(vlan_id)
+            if not module.check_mode:
+                # The PUT body is the VLAN read at depth 1, whose references
+                # are URIs
+                body = get_writable(vlan_url, 1)
+                body.update(changes)
+                request('PUT', vlan_url, body)
+
+    result['changed'] = bool(result['vlans_created'] or
+                             result['vlans_updated'] or
+                             result['vlans_deleted'])
+    return result
+
+
+def configure_vlan(aruba_ansible_module, vlan, vlan_id, vlan_name,
+                   description, admin_state, state):
+    '''
+    Applies the given state to a VLAN in the legacy running config
+    '''
+    if state == 'delete':
+        aruba_ansible_module = vlan.delete_vlan(
+            aruba_ansible_module, vlan_id)
+
+    if state == 'create':
+        aruba_ansible_module = vlan.create_vlan(
+            aruba_ansible_module, vlan_id)
+
+        if vlan_name is not None:
+            name = vlan_name
+        else:
+            name = "VLAN " + str(vlan_id)
+
+        if admin_state is None:
+            admin_state = 'up'
+
+        vlan_fields = {
+            "name": name,
+            "admin": admin_state,
+            "type": "static"
+        }
+        if description is not None:
+            vlan_fields["description"] = description
+        aruba_ansible_module = vlan.update_vlan_fields(
+            aruba_ansible_module, vlan_id, vlan_fields, update_type='insert')
+
+    if state == 'update':
+        vlan_fields = {}
+        if admin_state is not None:
+            vlan_fields['admin'] = admin_state
+
+        if description is not None:
+            vlan_fields['description'] = description
+
+        if state is not None:
+            vlan_fields['state'] = state
+
+        aruba_ansible_module = vlan.update_vlan_fields(
+            aruba_ansible_module, vlan_id, vlan_fields, update_type='update')
+
+    return aruba_ansible_module
+
+
 def main():
     module_args = dict(
-        vlan_id=dict(type='int', required=True),
+        vlan_id=dict(type='int', required=False, default=None),
+        vlans=dict(type='list', elements='dict', default=None, options=dict(
+            vlan_id=dict(type='str', required=True),
+            name=dict(type='str', default=None),
+            description=dict(type='str', default=None),
+            admin_state=dict(type='str', default=None, choices=['up', 'down'])
+        )),
         name=dict(type='str', default=None),
         description=dict(type='str', default=None),
         admin_state=dict(type='str', default=None, choices=['up', 'down']),
@@ -109,6 +331,8 @@ def main():
         # Session
         session = Session(ansible_module)
 
+        vlans = get_vlan_list(ansible_module)
+
         # Set Variables
         vlan_id = ansible_module.params['vlan_id']
         vlan_name = ansible_module.params['name']
@@ -119,14 +343,21 @@ def main():
         state = ansible_module.params['state']
 
         result = dict(
-            changed=False
+            changed=False,
+            warnings=[]
         )
 
+        # Get session serialized information
+        session_info = session.get_session()
+
+        if ansible_module.params['vlans'] is not None:
+            configure_vlans(ansible_module, session_info, vlans, state,
+                            result)
+            ansible_module.exit_json(**result)
+
         if ansible_module.check_mode:
             ansible_module.exit_json(**result)
 
-        # Get session serialized information
-        session_info = session.get_session()
         # Create pyaoscx.session object
         s = Pyaoscx_Session.from_session(
             session_info['s'], session_info['url'])
@@ -160,53 +391,17 @@ def main():
 
         aruba_ansible_module = ArubaAnsibleModule(module_args=module_args)
 
-        vlan_id = aruba_ansible_module.module.params['vlan_id']
-        vlan_name = aruba_ansible_module.module.params['name']
-        description = aruba_ansible_module.module.params['description']
-        admin_state = aruba_ansible_module.module.params['admin_state']
+        vlans = get_vlan_list(aruba_ansible_module.module)
         state = aruba_ansible_module.module.params['state']
 
         vlan = VLAN()
 
-        if state == 'delete':
-            aruba_ansible_module = vlan.delete_vlan(
-                aruba_ansible_module, vlan_id)
-
-        if state == 'create':
-            aruba_ansible_module = vlan.create_vlan(
-                aruba_ansible_module, vlan_id)
-
-            if vlan_name is not None:
-                name = vlan_name
-            else:
-                name = "VLAN " + str(vlan_id)
-
-            if admin_state is None:
-                admin_state = 'up'
-
-            vlan_fields = {
-                "name": name,
-                "admin": admin_state,
-                "type": "static"
-            }
-            if description is not None:
-                vlan_fields["description"] = description
-            aruba_ansible_module = vlan.update_vlan_fields(
-                aruba_ansible_module, vlan_id, vlan_fields, update_type='insert')
-
-        if state == 'update':
-            vlan_fields = {}
-            if admin_state is not None:
-                vlan_fields['admin'] = admin_state
-
-            if description is not None:
-                vlan_fields['description'] = description
-
-            if state is not None:
-                vlan_fields['state'] = state
-
-            aruba_ansible_module = vlan.update_vlan_fields(
-                aruba_ansible_module, vlan_id, vlan_fields, update_type='update')
+        # All the VLANs are applied to the same running config, which is
+        # written once by update_switch_config
+        for vlan_id, fields in vlans.items():
+            aruba_ansible_module = configure_vlan(
+                aruba_ansible_module, vlan, vlan_id, fields['name'],
+                fields['description'], fields['admin_state'], state)
 
         aruba_ansible_module.update_switch_config()
 
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'certified'
+}
+
+DOCUMENTATION = '''
+---
+module: aoscx_ztp_bootstrap
+version_added: "2.9"
+short_description: Sets the admin password of many zeroized AOS-CX switches
+  at once.
+description:
+  - This module logs in over SSH to a list of zeroized AOS-CX switches with
+    their out-of-the-box credentials, the given user and a blank password,
+    and sets their password. The switches are set up at the same time, each
+    within its own timeout. Switches whose authentication is already
+    configured are reported as provisioned and left untouched.
+  - The module runs on the Ansible controller, run it once for all the
+    switches, for example delegated to localhost with run_once.
+  - Requires the paramiko Python package.
+author: Aruba Networks (@ArubaNetworks)
+options:
+  hosts:
+    description: Addresses of the switches to set up.
+    type: list
+    elements: str
+    required: True
+  port:
+    description: SSH port of the switches.
+    type: int
+    required: False
+    default: 22
+  username:
+    description: User of the zeroized switches.
+    type: str
+    required: False
+    default: 'admin'
+  password:
+    description: Password to set on the switches.
+    type: str
+    required: True
+  max_workers:
+    description: Maximum number of switches set up at the same time.
+    type: int
+    required: False
+    default: 16
+  timeout:
+    description: Seconds allowed to set up each switch.
+    type: int
+    required: False
+    default: 60
+'''
+
+EXAMPLES = '''
+- name: Set the admin password of the new switches of the rack
+  aoscx_ztp_bootstrap:
+    hosts: "{{ groups['rack1'] | map('extract', hostvars, 'ansible_host') | list }}"
+    password: "{{ admin_password }}"
+  delegate_to: localhost
+  run_once: True
+'''
+
+RETURN = r'''
+results:
+  description: Result of each switch, in the order of hosts, with its host,
+    port, status (configured, provisioned or failed), error and the seconds
+    it took
+  returned: always
+  type: list
+summary:
+  description: Number of switches by status, total number of switches and
+    seconds taken by the whole bootstrap
+  returned: always
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.basic import missing_required_lib
+from ansible.module_utils.aoscx_ztp import bootstrap_ztp_devices, \
+    HAS_PARAMIKO_LIB, PARAMIKO_IMP_ERR, MAX_BOOTSTRAP_WORKERS, \
+    BOOTSTRAP_TIMEOUT, ZTP_CONFIGURED, ZTP_FAILED
+
+
+def main():
+    module_args = dict(
+        hosts=dict(type='list', elements='str', required=True),
+        port=dict(type='int', default=22),
+        username=dict(type='str', default='admin'),
+        password=dict(type='str', required=True, no_log=True),
+        max_workers=dict(type='int', default=MAX_BOOTSTRAP_WORKERS),
+        timeout=dict(type='int', default=BOOTSTRAP_TIMEOUT)
+    )
+
+    module = AnsibleModule(argument_spec=module_args,
+                           supports_check_mode=False)
+
+    if not HAS_PARAMIKO_LIB:
+        module.fail_json(msg=missing_required_lib("paramiko"),
+                         exception=PARAMIKO_IMP_ERR)
+
+    params = module.params
+    bootstrap = bootstrap_ztp_devices(params['hosts'], params['username'],
+                                      params['password'],
+                                      port=params['port'],
+                                      max_workers=params['max_workers'],
+                                      timeout=params['timeout'])
+
+    result = dict(changed=bootstrap['summary'][ZTP_CONFIGURED] > 0,
+                  **bootstrap)
+
+    failed = bootstrap['summary'][ZTP_FAILED]
+    if failed:
+        module.fail_json(msg="Unable to set up {0} of {1} switches".format(
+            failed, bootstrap['summary']['total']), **result)
+
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
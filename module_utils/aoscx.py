@@ -10,9 +10,9 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 
-import copy
 import json
 import re
+import time
 import traceback
 from collections import OrderedDict
 from ansible.module_utils._text import to_text
@@ -24,7 +24,14 @@ try:
 except ImportError:
     from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import to_list, ComplexList
 from ansible.module_utils.connection import exec_command, Connection, ConnectionError
-from ansible.module_utils.aoscx_ztp import connect_ztp_device
+from ansible.module_utils.aoscx_ztp import connect_ztp_device, \
+    is_ztp_cache_enabled, read_ztp_cache, write_ztp_cache
+from ansible.module_utils.aoscx_config_diff import get_config_changes, \
+    apply_config_changes, plan_config_writes
+from ansible.module_utils.aoscx_tracked_config import TrackedConfig
+from ansible.module_utils.aoscx_trace import get_trace
+from ansible.module_utils.aoscx_upload import MultipartFileEncoder, \
+    UploadProgress
 
 REQUESTS_IMP_ERR = None
 try:
@@ -38,6 +45,13 @@ _DEVICE_CONNECTION = None
 _DEVICE_CONFIGS = {}
 _DEVICE_ZTP = False
 
+# Above this number of targeted REST writes a single upload of the whole
+# config is cheaper
+MAX_TARGETED_WRITES = 50
+
+# Seconds to wait for the switch to accept a connection during uploads
+UPLOAD_CONNECT_TIMEOUT = 10
+
 aoscx_provider_spec = {
     'host': dict(),
     'port': dict(type='int'),
@@ -101,10 +115,33 @@ def get_config(module, flags=None):
         return cfg
 
 
-def load_config(module, commands):
+def load_config(module, commands, block_size=None, contexts=None):
     '''
     Loads the configuration onto the switch
-    '''
+    :param block_size: optional number of lines written to the switch at
+        once, by default each line waits for the prompt before the next one.
+        The lines of a context are indented under the line entering it, so
+        that this line isn't written in the same block as its children.
+    :param contexts: optional top-level lines entering a context the switch
+        already has, entering them can't fail so they don't end their block
+    :return: dict with the number of lines applied and of round trips to the
+        switch when block_size is set
+    '''
+    if block_size:
+        conn = create_ssh_connection(module)
+        try:
+            result = conn.edit_config_batched(to_list(commands), block_size,
+                                              list(contexts or []))
+        except ConnectionError as exc:
+            module.fail_json(msg=to_text(exc, errors='surrogate_then_replace'))
+        error = result['error']
+        if error is not None:
+            module.fail_json(msg=error['msg'], command=error['command'],
+                             line=error['line'], applied=result['applied'],
+                             unknown=result.get('unknown', []))
+        return dict(applied=result['applied'],
+                    round_trips=result.get('round_trips'))
+
     rc, out, err = exec_command(module, 'configure terminal')
     if rc != 0:
         module.fail_json(msg='unable to enter configuration mode',
@@ -126,13 +163,21 @@ def exec_command(module, command):
     Execute command on the switch
     '''
     conn = create_ssh_connection(module)
+    trace = get_trace(module)
+    start = time.time()
     try:
         out = conn.exec_command(command)
     except ConnectionError as exc:
         code = getattr(exc, 'code', 1)
         msg = getattr(exc, 'err', exc)
+        if trace is not None:
+            trace.add('cli', 'CLI', command, 1, len(command), 0,
+                      time.time() - start)
         return code, '', to_text(msg, errors='surrogate_then_replace')
 
+    if trace is not None:
+        trace.add('cli', 'CLI', command, 0, len(command), len(out or ''),
+                  time.time() - start)
     return 0, out, ''
 
 
@@ -208,6 +253,65 @@ class HttpApi:
         res = self._connection.send_request(data=data, method='GET', path=url)
         return res
 
+    def get_cached(self, url, revalidate=False):
+        '''
+        GET REST call cached by the persistent connection
+        '''
+        return self._connection.get_cached(url, revalidate=revalidate)
+
+    def get_if_changed(self, url, etag=None):
+        '''
+        GET REST call skipped by the switch when the resource still has the
+        given ETag
+        '''
+        return self._connection.get_if_changed(url, etag)
+
+    def get_transfer_stats(self):
+        '''
+        Get the bytes sent and received by the persistent connection, on the
+        wire and once decompressed
+        '''
+        return self._connection.get_transfer_stats()
+
+    def get_throttle_stats(self):
+        '''
+        Get the requests of the persistent connection that were throttled,
+        sent again or delayed
+        '''
+        return self._connection.get_throttle_stats()
+
+    def get_to_file(self, url, dest):
+        '''
+        GET REST call written to a file by the persistent connection as the
+        response is received
+        '''
+        return self._connection.get_to_file(url, dest)
+
+    def begin_transaction(self, url):
+        '''
+        Start collecting config changes in the persistent connection
+        '''
+        return self._connection.begin_transaction(url)
+
+    def get_transaction(self, include_configs=False):
+        '''
+        Get the transaction in progress in the persistent connection
+        '''
+        return self._connection.get_transaction(
+            include_configs=include_configs)
+
+    def stage_config_changes(self, changes):
+        '''
+        Apply config changes to the transaction in progress
+        '''
+        return self._connection.stage_config_changes(changes)
+
+    def end_transaction(self):
+        '''
+        End the transaction in progress
+        '''
+        return self._connection.end_transaction()
+
     def put(self, url, data=None, headers=None):
         '''
         PUT REST call
@@ -227,70 +331,108 @@ class HttpApi:
                                              path=url,
                                              headers=headers)
 
-    def file_upload(self, url, files, headers=None):
+    def delete(self, url, data=None, headers=None):
+        '''
+        DELETE REST call
+        '''
+        if headers is None:
+            headers = {}
+        return self._connection.send_request(data=data, method='DELETE',
+                                             path=url,
+                                             headers=headers)
+
+    def file_upload(self, url, files, headers=None, timeout=None,
+                    retries=0, stats=None):
         """
         Workaround with requests library for lack of support in httpapi for
         multipart POST
         See:
         ansible/blob/devel/lib/ansible/plugins/connection/httpapi.py
         ansible/blob/devel/lib/ansible/module_utils/urls.py
+
+        The file is streamed in chunks with the session of the persistent
+        connection. The switch can't resume a partial upload, so a failed
+        transfer is retried from the start up to retries times.
+        :param timeout: seconds without progress before the upload fails
+        :param stats: optional dict updated with the attempts, bytes, seconds
+            and bytes_per_second of the upload
         """
 
         if not HAS_REQUESTS_LIB:
             self._module.fail_json(msg=missing_required_lib(
                 "requests"), exception=REQUESTS_IMP_ERR)
         connection_details = self._connection.get_connection_details()
-        full_url = connection_details['url'] + url
-        with open(files, 'rb') as file:
-            file_param = {'fileupload': file}
-
+        base_url = connection_details['url']
+        full_url = base_url + url
+
+        # Workaround for setting no_proxy based off acx_no_proxy flag
+        proxies = None
+        if connection_details['no_proxy']:
+            proxies = {'http': None, 'https': None}
+
+        session = requests.Session()
+        request_headers = dict(headers or {})
+
+        # Reuse the session of the persistent connection, and only log in
+        # when it isn't valid
+        logged_in = False
+        auth = connection_details.get('auth') or {}
+        response = None
+        if auth:
+            response = session.get(base_url + '/rest/v1/firmware',
+                                   headers=auth, verify=False,
+                                   proxies=proxies,
+                                   timeout=UPLOAD_CONNECT_TIMEOUT)
+        if response is None or response.status_code == 401:
             # Get Credentials
             user = connection_details['remote_user']
             password = connection_details['password']
+            session.post(
+                base_url + "/rest/v1/login?username={0}&password={1}".format(
+                    user, password),
+                verify=False, timeout=UPLOAD_CONNECT_TIMEOUT,
+                proxies=proxies)
+            logged_in = True
+        else:
+            request_headers.update(auth)
 
-            # Workaround for setting no_proxy based off acx_no_proxy flag
-            if connection_details['no_proxy']:
-                proxies = {'http': None, 'https': None}
-                # Using proxies
-                # Perform Login
-                response_login = requests.post(
-                    connection_details['url'] + \
-                    "/rest/v1/login?username={}&password={}".format(
-                        user, password
-                    ),
-                    verify=False, timeout=5, proxies=proxies)
-                # Perform File Upload
-                res = requests.post(
-                    url=full_url, files=file_param, verify=False,
-                    proxies=proxies,
-                    cookies=response_login.cookies
-                )
-                # Perform Logout 
-                response_logout = requests.post(
-                    connection_details['url'] + "/rest/v1/logout",
-                    verify=False,proxies=proxies,
-                    cookies=response_login.cookies)
+        progress = UploadProgress(log=self._module.log)
+        attempt = 0
+        try:
+            with MultipartFileEncoder('fileupload', files,
+                                      callback=progress.update) as body:
+                request_headers['Content-Type'] = body.content_type
+                while True:
+                    attempt += 1
+                    body.reset()
+                    progress.start()
+                    try:
+                        res = session.post(
+                            url=full_url, data=body, headers=request_headers,
+                            verify=False, proxies=proxies,
+                            timeout=(UPLOAD_CONNECT_TIMEOUT, timeout))
+                        break
+                    except (requests.exceptions.ConnectionError,
+                            requests.exceptions.Timeout) as exc:
+                        if attempt > retries:
+                            raise ConnectionError(
+                                "Error while uploading firmware: "
+                                "{0}".format(to_text(exc)))
+                        self._module.log(
+                            "Upload attempt {0} failed, retrying: {1}".format(
+                                attempt, to_text(exc)))
+                        time.sleep(min(2 ** attempt, 30))
+        finally:
+            if stats is not None:
+                stats.update(progress.to_dict())
+                stats['attempts'] = attempt
+            if logged_in:
+                # Perform Logout
+                session.post(base_url + "/rest/v1/logout", verify=False,
+                             proxies=proxies,
+                             timeout=UPLOAD_CONNECT_TIMEOUT)
+            session.close()
 
-            else:
-                # No proxies
-                # Perform Login
-                response_login = requests.post(
-                    connection_details['url'] + \
-                    "/rest/v1/login?username={}&password={}".format(
-                        user, password
-                    ),
-                    verify=False, timeout=5)
-                # Perform File Upload
-                res = requests.post(
-                    url=full_url, files=file_param, verify=False,
-                    cookies=response_login.cookies
-                )
-                # Perform Logout 
-                response_logout = requests.post(
-                    connection_details['url'] + "/rest/v1/logout",
-                    verify=False,
-                    cookies=response_login.cookies)
-    
         if res.status_code != 200:
             error_text = "Error while uploading firmware"
             raise ConnectionError(error_text, code=res.status_code)
@@ -299,18 +441,50 @@ class HttpApi:
 
 def create_ssh_connection(module):
     connection = Connection(module._socket_path)
+    get_trace(module)
 
     global _DEVICE_ZTP
     if not _DEVICE_ZTP:
+        probe_ztp_device(module, connection)
+        _DEVICE_ZTP = True
+
+    return connection
+
+
+def probe_ztp_device(module, connection):
+    '''
+    Configures the authentication of zeroized switches. The result of the
+    probe is kept by the persistent connection, and on disk when enabled, so
+    that the switch is only probed once.
+    '''
+    try:
+        status = connection.get_ztp_status()
+    except ConnectionError:
+        status = None
+    if status is not None:
+        return status
+
+    host = connection.get_option('host')
+    use_cache = is_ztp_cache_enabled()
+    if use_cache:
+        status = read_ztp_cache(host)
+
+    if status is None:
         # For zeroize devices, configure authentication
-        connect_ztp_device(
+        status = connect_ztp_device(
             module,
-            connection.get_option('host'),
+            host,
             connection.get_option('remote_user'),
             connection.get_option('password'))
-        _DEVICE_ZTP = True
+        if status is not None and use_cache:
+            write_ztp_cache(host, status)
 
-    return connection
+    if status is not None:
+        try:
+            connection.set_ztp_status(status)
+        except ConnectionError:
+            pass
+    return status
 
 
 def get_connection(module, is_cli=False):
@@ -318,6 +492,7 @@ def get_connection(module, is_cli=False):
     Returns the connection plugin
     '''
     global _DEVICE_CONNECTION
+    get_trace(module)
     if not _DEVICE_CONNECTION:
         if is_cli:
             if not hasattr(module, '_aoscx_connection'):
@@ -339,6 +514,26 @@ def get(module, url, data=None):
     return res
 
 
+def get_cached(module, url, revalidate=False):
+    '''
+    Perform GET REST call, reusing the response cached by the persistent
+    connection for the host
+    '''
+    conn = get_connection(module)
+    res = conn.get_cached(url, revalidate)
+    return res
+
+
+def get_to_file(module, url, dest):
+    '''
+    Perform GET REST call writing the response to a file without loading it
+    in memory
+    '''
+    conn = get_connection(module)
+    res = conn.get_to_file(url, dest)
+    return res
+
+
 def put(module, url, data=None, headers=None):
     '''
     Perform PUT REST call
@@ -361,14 +556,27 @@ def post(module, url, data=None, headers=None):
     return res
 
 
-def file_upload(module, url, files, headers=None):
+def delete(module, url, data=None, headers=None):
+    '''
+    Perform DELETE REST call
+    '''
+    if headers is None:
+        headers = {}
+    conn = get_connection(module)
+    res = conn.delete(url, data, headers)
+    return res
+
+
+def file_upload(module, url, files, headers=None, timeout=None, retries=0,
+                stats=None):
     '''
     Upload File through REST
     '''
     if headers is None:
         headers = {}
     conn = get_connection(module)
-    res = conn.file_upload(url, files, headers)
+    res = conn.file_upload(url, files, headers, timeout=timeout,
+                           retries=retries, stats=stats)
     return res
 
 
@@ -388,12 +596,17 @@ def to_command(module, commands):
     return transform(to_list(commands))
 
 
-def run_commands(module, commands, check_rc=False):
+def run_commands(module, commands, check_rc=False, pipeline=False):
     '''
     Execute command on the switch
+    :param pipeline: send the read-only commands without waiting for the
+        prompt after each of them
     '''
     conn = get_connection(module, True)
     try:
+        if pipeline:
+            return conn.run_commands(commands=commands, check_rc=check_rc,
+                                     pipeline=True)
         return conn.run_commands(commands=commands, check_rc=check_rc)
     except ConnectionError as exc:
         module.fail_json(msg=to_text(exc))
@@ -441,7 +654,7 @@ class ArubaAnsibleModule:
         Returns the switch platform
         '''
         platform_url = '/rest/v1/system?attributes=platform_name'
-        platform = get(self.module, platform_url)
+        platform = get_cached(self.module, platform_url)
         self.switch_platform = platform["platform_name"]
 
     def get_switch_firmware_version(self):
@@ -449,7 +662,10 @@ class ArubaAnsibleModule:
         Returns the switch firmware
         '''
         firmware_url = '/rest/v1/firmware'
-        firmware_versions = get(self.module, firmware_url)
+        # Firmware uploads and reboots change the versions, revalidate the
+        # cached response with its ETag
+        firmware_versions = get_cached(self.module, firmware_url,
+                                       revalidate=True)
         self.switch_current_firmware = firmware_versions["current_version"]
 
     def get_firmware_upgrade_status(self):
@@ -467,11 +683,17 @@ class ArubaAnsibleModule:
         '''
         config_url = '/rest/v1/fullconfigs/{cfg}'.format(cfg=config_name)
 
-        running_config = get(self.module, config_url)
+        if config_name == 'running-config':
+            running_config = get_cached(self.module, config_url,
+                                        revalidate=True)
+        else:
+            running_config = get(self.module, config_url)
 
         if store_config:
-            self.running_config = copy.deepcopy(running_config)
-            self.original_config = copy.deepcopy(running_config)
+            # The fetched config is kept as original_config and only the
+            # parts accessed through running_config are copied
+            self.original_config = running_config
+            self.running_config = TrackedConfig(running_config)
 
         return running_config
 
@@ -513,23 +735,95 @@ class ArubaAnsibleModule:
         put(self.module, config_url, config_json)
         return
 
+    def send_config_writes(self, writes):
+        '''
+        Send targeted REST writes for the rows that changed in the config
+        '''
+        for method, url, body in writes:
+            data = None
+            if body is not None:
+                data = json.dumps(body)
+            if method == 'POST':
+                post(self.module, url, data)
+            elif method == 'PUT':
+                put(self.module, url, data)
+            elif method == 'DELETE':
+                delete(self.module, url)
+        return
+
+    def write_config_changes(self, changes, config, rebase=False):
+        '''
+        Write config changes to the switch
+        :param config: config with the changes applied, uploaded whole when
+            the changes can't be written row by row
+        :param rebase: whether the switch may have been written to since
+            config was read, the changes are then applied to its current
+            running-config before uploading it, so that the other writes
+            aren't reverted
+        '''
+        def upload():
+            if rebase:
+                current = get(self.module,
+                              '/rest/v1/fullconfigs/running-config')
+                self.upload_switch_config(
+                    apply_config_changes(current, changes))
+            else:
+                self.upload_switch_config(config)
+
+        # Only the changed rows are written when all of them have their own
+        # REST resource and they are few, otherwise the whole config is
+        # uploaded in a single write
+        writes = plan_config_writes(changes)
+        if writes is None or len(writes) > MAX_TARGETED_WRITES:
+            upload()
+        else:
+            try:
+                self.send_config_writes(writes)
+            except ConnectionError as exc:
+                self.module.log("Targeted config writes failed, uploading "
+                                "full config: {0}".format(to_text(exc)))
+                upload()
+        return
+
     def update_switch_config(self):
         '''
         Update switch config
         '''
         self.result = dict(changed=self.changed, warnings=self.warnings)
 
-        if self.original_config != self.running_config:
-            self.upload_switch_config(self.running_config)
-            self.result["changed"] = True
+        running_config = self.running_config
+        if isinstance(running_config, TrackedConfig):
+            changes = running_config.get_changes()
+            running_config = running_config.to_dict()
         else:
+            changes = get_config_changes(self.original_config,
+                                         running_config)
+
+        if not changes:
             self.result["changed"] = False
             self.module.log("============================ No Change ======="
                             "===========================")
             self.module.exit_json(**self.result)
 
-        with open('/tmp/debugging_running_config.json', 'w') as to_file:
-            json.dump(self.running_config, to_file, indent=4)
-            to_file.write("\n")
+        if self.module._diff:
+            before = {}
+            after = {}
+            for table, row, row_before, row_after in changes:
+                path = table if row is None else '{0}/{1}'.format(table, row)
+                if row_before is not None:
+                    before[path] = row_before
+                if row_after is not None:
+                    after[path] = row_after
+            self.result["diff"] = dict(before=before, after=after)
+
+        # Inside a transaction the changes are applied to the config held by
+        # the persistent connection and written by aoscx_transaction
+        connection = get_connection(self.module)
+        if connection.get_transaction() is not None:
+            connection.stage_config_changes(changes)
+            self.result["staged"] = True
+        else:
+            self.write_config_changes(changes, running_config)
 
+        self.result["changed"] = True
         self.module.exit_json(**self.result)
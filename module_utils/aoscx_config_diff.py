@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2019-2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+import re
+from collections import OrderedDict
+
+# Tables of the fullconfig document that can be written row by row through
+# their own REST resource. The order of the entries is the order in which
+# rows are created and updated, deletions happen in the reverse order so
+# that referencing rows are removed before the rows they reference.
+GRANULAR_TABLES = OrderedDict([
+    ('VLAN', dict(
+        uri='/rest/v1/system/vlans',
+        immutable=['id'],
+        references={}
+    )),
+    ('Interface', dict(
+        uri='/rest/v1/system/interfaces',
+        immutable=['name', 'type'],
+        references={}
+    )),
+    ('Port', dict(
+        uri='/rest/v1/system/ports',
+        immutable=['name'],
+        references={
+            'interfaces': '/rest/v1/system/interfaces',
+            'vlan_tag': '/rest/v1/system/vlans',
+            'vlan_trunks': '/rest/v1/system/vlans',
+            'vrf': '/rest/v1/system/vrfs'
+        }
+    )),
+])
+
+# Reference columns whose fullconfig keys can not be translated into REST
+# URIs, rows holding any of them are left to the full config upload
+_UNSUPPORTED_COLUMN_RE = re.compile(
+    r'^(acl(v4|v6|mac)_(in|out|routed_in|routed_out)_cfg(_version)?|qos|'
+    r'q_profile|lag)$')
+
+
+def get_config_changes(original_config, running_config, tables=None):
+    '''
+    Compares two fullconfig documents and returns the changes between them
+    :param original_config: dict with the config fetched from the switch
+    :param running_config: dict with the config to be written to the switch
+    :param tables: optional iterable with the only tables to compare
+    :return: list of (table, row, before, after) tuples, row is None when
+        the whole table changed, before/after are None when missing
+    '''
+    changes = []
+
+    if tables is None:
+        tables = set(original_config.keys()) | set(running_config.keys())
+
+    for table in sorted(tables):
+        before = original_config.get(table)
+        after = running_config.get(table)
+
+        if before is after or before == after:
+            continue
+
+        if table in GRANULAR_TABLES and \
+                isinstance(before, (dict, type(None))) and \
+                isinstance(after, (dict, type(None))):
+            before = before or {}
+            after = after or {}
+            rows = set(before.keys()) | set(after.keys())
+            for row in sorted(rows, key=str):
+                if before.get(row) is after.get(row):
+                    continue
+                if before.get(row) != after.get(row):
+                    changes.append((table, row, before.get(row),
+                                    after.get(row)))
+        else:
+            changes.append((table, None, before, after))
+
+    return changes
+
+
+def apply_config_changes(config, changes):
+    '''
+    Applies changes returned by get_config_changes to another fullconfig
+    document, such as a config read again from the switch
+    :param config: dict with the config, changed in place
+    :param changes: list of (table, row, before, after) tuples
+    :return: the config
+    '''
+    for table, row, before, after in changes:
+        if row is None:
+            if after is None:
+                config.pop(table, None)
+            else:
+                config[table] = after
+        elif after is None:
+            config.get(table, {}).pop(row, None)
+        else:
+            config.setdefault(table, {})[row] = after
+    return config
+
+
+def _is_granular_row(row):
+    '''
+    Checks that every column of a fullconfig row can be written through REST
+    '''
+    for column, value in row.items():
+        if _UNSUPPORTED_COLUMN_RE.match(column):
+            return False
+        # Dictionaries of dictionaries are child tables, which have their own
+        # resources and can't be written inline with the row
+        if isinstance(value, dict) and value and \
+                all(isinstance(item, dict) for item in value.values()):
+            return False
+    return True
+
+
+def _to_reference(collection_uri, value):
+    '''
+    Translates a fullconfig row key into its REST resource URI
+    '''
+    if isinstance(value, list):
+        return [_to_reference(collection_uri, item) for item in value]
+    return '{uri}/{key}'.format(uri=collection_uri, key=value)
+
+
+def _to_rest_row(table, row, strip_immutable=False):
+    '''
+    Translates a fullconfig row into the body of a REST write
+    '''
+    table_spec = GRANULAR_TABLES[table]
+    body = {}
+    for column, value in row.items():
+        if strip_immutable and column in table_spec['immutable']:
+            continue
+        if column in table_spec['references']:
+            value = _to_reference(table_spec['references'][column], value)
+        body[column] = value
+    return body
+
+
+def plan_config_writes(changes):
+    '''
+    Translates config changes into targeted REST writes
+    :param changes: list of changes as returned by get_config_changes
+    :return: list of (method, url, body) tuples in the order in which they
+        must be sent, or None if a change has no granular endpoint
+    '''
+    creates = []
+    updates = []
+    deletes = []
+
+    table_order = list(GRANULAR_TABLES.keys())
+
+    for table, row, before, after in changes:
+        if row is None or table not in GRANULAR_TABLES:
+            return None
+
+        for values in (before, after):
+            if values is not None and not _is_granular_row(values):
+                return None
+
+        collection_uri = GRANULAR_TABLES[table]['uri']
+        row_uri = '{uri}/{row}'.format(uri=collection_uri, row=row)
+        order = table_order.index(table)
+
+        if before is None:
+            creates.append((order, 'POST', collection_uri,
+                            _to_rest_row(table, after)))
+        elif after is None:
+            deletes.append((order, 'DELETE', row_uri, None))
+        else:
+            updates.append((order, 'PUT', row_uri,
+                            _to_rest_row(table, after, strip_immutable=True)))
+
+    creates.sort(key=lambda write: write[0])
+    updates.sort(key=lambda write: write[0])
+    deletes.sort(key=lambda write: write[0], reverse=True)
+
+    return [write[1:] for write in creates + updates + deletes]
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import random
+import threading
+import time
+
+# httpapi_plugins/aoscx.py and connection_plugins/aoscx.py hold copies of the
+# retry policy and of RestGovernor, since connection plugins can't import the
+# module_utils of this role. Keep the copies in sync.
+
+# Number of times a request is sent again after being throttled or failing
+MAX_RETRIES = 3
+
+# Seconds waited before the first retry, doubled at each retry
+RETRY_BACKOFF = 0.5
+
+# Longest wait before a retry, in seconds
+MAX_RETRY_BACKOFF = 30
+
+# Responses of a switch refusing a request before processing it
+THROTTLE_CODES = (429, 503)
+
+# Responses of a gateway that may or may not have forwarded the request
+GATEWAY_CODES = (502, 504)
+
+# Methods sending the same request twice has the same effect as sending it
+# once. A POST is only sent again when the switch refused it.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Successful responses in a row after which one more request may be in
+# flight again
+_INFLIGHT_RECOVERY = 10
+
+
+def get_retry_after(value):
+    '''
+    Returns the seconds of a Retry-After header, None unless it holds a
+    number of seconds
+    '''
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RestGovernor(object):
+    '''
+    Paces the REST requests sent to a switch
+
+    At most max_inflight requests are in flight at once, and at most rate
+    requests are started per second, with bursts of up to burst requests.
+    Throttled requests are sent again after a jittered exponential backoff,
+    and every throttled response halves the number of requests allowed in
+    flight until enough requests succeed. Only idempotent requests are sent
+    again after a timeout or a connection error, since the switch may have
+    processed them.
+    '''
+
+    def __init__(self, max_inflight=None, rate=None, burst=None,
+                 retries=MAX_RETRIES, backoff=RETRY_BACKOFF,
+                 max_backoff=MAX_RETRY_BACKOFF):
+        '''
+        :param max_inflight: optional maximum number of requests in flight
+        :param rate: optional maximum number of requests started per second
+        :param burst: number of requests that may be started at once without
+            waiting, defaults to one second worth of requests
+        :param retries: number of times a request is sent again
+        :param backoff: seconds waited before the first retry
+        :param max_backoff: longest wait before a retry
+        '''
+        self._max_inflight = max_inflight or None
+        self._limit = self._max_inflight
+        self._inflight = 0
+        self._successes = 0
+        self._rate = rate or None
+        self._burst = float(burst or max(rate or 1, 1))
+        self._tokens = self._burst
+        self._refilled = time.time()
+        self._retries = max(retries or 0, 0)
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._condition = threading.Condition()
+        self.stats = dict(requests=0, retries=0, throttled=0, errors=0,
+                          gave_up=0, inflight_waits=0, inflight_limit=None,
+                          max_inflight=0, rate_waits=0, wait_seconds=0.0,
+                          backoff_seconds=0.0)
+
+    def _acquire(self):
+        '''
+        Waits for a request slot and a token of the bucket
+        '''
+        waited = 0.0
+        with self._condition:
+            if self._limit is not None and self._inflight >= self._limit:
+                self.stats['inflight_waits'] += 1
+                start = time.time()
+                while self._inflight >= self._limit:
+                    self._condition.wait()
+                waited += time.time() - start
+            self._inflight += 1
+            self.stats['max_inflight'] = max(self.stats['max_inflight'],
+                                             self._inflight)
+
+            delay = 0.0
+            if self._rate is not None:
+                now = time.time()
+                self._tokens = min(
+                    self._burst,
+                    self._tokens + (now - self._refilled) * self._rate)
+                self._refilled = now
+                # The token is taken now, the request waits for it to be
+                # refilled outside of the lock
+                self._tokens -= 1
+                if self._tokens < 0:
+                    delay = -self._tokens / self._rate
+                    self.stats['rate_waits'] += 1
+        if delay:
+            time.sleep(delay)
+            waited += delay
+        if waited:
+            with self._condition:
+                self.stats['wait_seconds'] += waited
+
+    def _release(self, congested):
+        with self._condition:
+            self._inflight -= 1
+            if self._limit is not None:
+                if congested:
+                    self._limit = max(self._limit // 2, 1)
+                    self._successes = 0
+                elif self._limit < self._max_inflight:
+                    self._successes += 1
+                    if self._successes >= _INFLIGHT_RECOVERY:
+                        self._limit += 1
+                        self._successes = 0
+            self._condition.notify_all()
+
+    def get_delay(self, attempt, retry_after=None):
+        '''
+        Returns the seconds to wait before a retry, picked at random up to
+        the exponential backoff of the attempt, and at least the Retry-After
+        of the switch
+        :param attempt: number of the retry, starting at 0
+        :param retry_after: optional seconds asked by the switch
+        '''
+        ceiling = min(self._max_backoff, self._backoff * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self._max_backoff))
+        return delay
+
+    def call(self, method, send, get_status, get_retry_after=None,
+             errors=()):
+        '''
+        Sends a request, again while it is throttled or fails and retries
+        are left
+        :param method: HTTP method of the request
+        :param send: callable sending the request and returning the response
+        :param get_status: callable returning the status code of a response
+        :param get_retry_after: optional callable returning the seconds of
+            the Retry-After header of a response, or None
+        :param errors: exceptions raised by send on timeouts and connection
+            errors
+        :return: the last response, the last exception is raised instead
+            when the request didn't get a response
+        '''
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self._acquire()
+            # Timeouts and throttled responses both mean the management
+            # plane is overloaded
+            congested = False
+            try:
+                with self._condition:
+                    self.stats['requests'] += 1
+                try:
+                    response = send()
+                except errors:
+                    congested = True
+                    with self._condition:
+                        self.stats['errors'] += 1
+                        if idempotent and attempt >= self._retries:
+                            self.stats['gave_up'] += 1
+                    if not idempotent or attempt >= self._retries:
+                        raise
+                    retry_after = None
+                else:
+                    status = get_status(response)
+                    congested = status in THROTTLE_CODES
+                    retry = congested or \
+                        (idempotent and status in GATEWAY_CODES)
+                    if congested:
+                        with self._condition:
+                            self.stats['throttled'] += 1
+                    if not retry:
+                        return response
+                    if attempt >= self._retries:
+                        with self._condition:
+                            self.stats['gave_up'] += 1
+                        return response
+                    retry_after = get_retry_after(response) \
+                        if get_retry_after is not None else None
+            finally:
+                self._release(congested)
+
+            delay = self.get_delay(attempt, retry_after)
+            with self._condition:
+                self.stats['retries'] += 1
+                self.stats['backoff_seconds'] += delay
+            time.sleep(delay)
+            attempt += 1
+
+    def to_dict(self):
+        with self._condition:
+            stats = dict(self.stats)
+            stats['inflight_limit'] = self._limit
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['backoff_seconds'] = round(stats['backoff_seconds'], 3)
+        return stats
@@ -15,6 +15,37 @@ from ansible.module_utils.vrfs.aoscx_vrf import VRF
 from random import randint
 
 
+def expand_interface_ranges(interface_names):
+    '''
+    Expands interface ranges into a list of interface names
+    :param interface_names: list of interface names and ranges of ports of
+        the same member and slot, such as '1/1/1-1/1/48' or '1/1/1-48'
+    :return: list of interface names, in the given order and without
+        duplicates
+    '''
+    result = []
+    seen = set()
+    for item in interface_names:
+        item = str(item).strip()
+        names = [item]
+        if '-' in item and '/' in item:
+            start, end = item.split('-', 1)
+            prefix, first_port = start.rsplit('/', 1)
+            end_prefix, last_port = end.rsplit('/', 1) if '/' in end \
+                else (prefix, end)
+            if end_prefix != prefix or not first_port.isdigit() or \
+                    not last_port.isdigit() or \
+                    int(first_port) > int(last_port):
+                raise ValueError("Invalid interface range {0}".format(item))
+            names = ['{0}/{1}'.format(prefix, port)
+                     for port in range(int(first_port), int(last_port) + 1)]
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                result.append(name)
+    return result
+
+
 def number_unit(s):
     for i, c in enumerate(s):
         if not c.isdigit():
@@ -9,18 +9,46 @@ from __future__ import (absolute_import, division, print_function)
 
 __metaclass__ = type
 
-from ansible.module_utils.connection import Connection
+import base64
+import os
+import shutil
+import threading
+import time
+
+from ansible.module_utils.connection import Connection, ConnectionError
+from ansible.module_utils._text import to_text
+from ansible.module_utils.aoscx_governor import RestGovernor, \
+    get_retry_after, MAX_RETRIES, RETRY_BACKOFF
+from ansible.module_utils.aoscx_trace import get_trace
 
 try:
     from requests import Session as RequestsSession
-    from requests.utils import add_dict_to_cookiejar
+    from requests import Response
+    from requests.adapters import BaseAdapter, HTTPAdapter
+    from requests.exceptions import ConnectionError as RequestsConnectionError
+    from requests.exceptions import Timeout
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import add_dict_to_cookiejar, get_encoding_from_headers
     HAS_REQUESTS = True
 except ImportError:
+    BaseAdapter = object
     HAS_REQUESTS = False
 
 import urllib3
 urllib3.disable_warnings()
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    HAS_THREAD_POOL = True
+except ImportError:
+    HAS_THREAD_POOL = False
+
+# Maximum number of REST requests sent at the same time over a session
+MAX_CONCURRENT_REQUESTS = 8
+
+# Size of the reads of a response written to a file
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 # guard against pyaoscx published v0.2.0 which does not have a firmware module yet
 try:
     from pyaoscx import firmware
@@ -30,6 +58,113 @@ except ImportError:
     HAS_PYAOSCX_FIRMWARE = False
 
 
+class ConnectionAdapter(BaseAdapter):
+    """
+    requests transport adapter sending the requests through the persistent
+    connection, which keeps its connections to the switch alive between
+    modules. Bodies that can't be sent as text, like streamed or binary
+    uploads, are sent by the fallback adapter.
+    """
+
+    def __init__(self, connection, fallback):
+        super(ConnectionAdapter, self).__init__()
+        self._connection = connection
+        self._fallback = fallback
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        if stream:
+            # The persistent connection returns whole bodies
+            return self._fallback.send(
+                request, stream=stream, timeout=timeout, verify=verify,
+                cert=cert, proxies=proxies)
+        body = request.body
+        if isinstance(body, bytes):
+            try:
+                body = body.decode("utf-8")
+            except UnicodeDecodeError:
+                body = False
+        if body is False or not isinstance(body, (type(None), str)):
+            return self._fallback.send(
+                request, stream=stream, timeout=timeout, verify=verify,
+                cert=cert, proxies=proxies)
+
+        try:
+            data = self._connection.proxy_request(
+                request.method, request.url, body, dict(request.headers),
+                timeout, verify)
+        except ConnectionError as exc:
+            raise RequestsConnectionError(to_text(exc), request=request)
+
+        response = Response()
+        response.status_code = data["status"]
+        response.reason = data["reason"]
+        response.headers = CaseInsensitiveDict(data["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = data["url"]
+        response.request = request
+        response.wire_bytes = data.get("wire_bytes")
+        response.connection = self
+        if data["encoding"] == "base64":
+            response._content = base64.b64decode(data["body"])
+        else:
+            response._content = data["body"].encode("utf-8")
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        self._fallback.close()
+
+
+def _get_wire_bytes(response, content):
+    """
+    Returns the size of the body of a response as received, before its
+    decompression
+    """
+    wire_bytes = getattr(response, "wire_bytes", None)
+    if wire_bytes is None:
+        try:
+            wire_bytes = response.raw.tell()
+        except AttributeError:
+            wire_bytes = len(content)
+    return wire_bytes
+
+
+class GovernedAdapter(BaseAdapter):
+    """
+    requests transport adapter pacing the requests sent by another adapter
+    with a RestGovernor, which limits the requests in flight and per second
+    and sends throttled requests again
+    """
+
+    def __init__(self, adapter, governor):
+        super(GovernedAdapter, self).__init__()
+        self._adapter = adapter
+        self.governor = governor
+
+    def send(self, request, **kwargs):
+        def send_request():
+            if hasattr(request.body, "seek"):
+                request.body.seek(0)
+            return self._adapter.send(request, **kwargs)
+
+        def close_retried(response):
+            retry_after = get_retry_after(
+                response.headers.get("Retry-After"))
+            # The connection goes back to the pool before the retry
+            response.close()
+            return retry_after
+
+        return self.governor.call(
+            request.method, send_request,
+            lambda response: response.status_code,
+            get_retry_after=close_retried,
+            errors=(RequestsConnectionError, Timeout))
+
+    def close(self):
+        self._adapter.close()
+
+
 class Session(object):
     def __init__(self, ansible_module):
         if not HAS_REQUESTS:
@@ -43,8 +178,32 @@ class Session(object):
             ansible_module.fail_json(msg="Connection Failed")
 
         add_dict_to_cookiejar(s.cookies, session_data["cookies"])
+        # requests asks for gzip or deflate responses and decompresses them
+        # as they are read, only their sizes are counted here
+        self.transfer_stats = dict(responses=0, compressed_responses=0,
+                                   response_bytes=0, response_wire_bytes=0)
+        self._stats_lock = threading.Lock()
+        s.headers["Accept-Encoding"] = "gzip, deflate"
+        self._trace = get_trace(ansible_module)
+        if self._trace is not None:
+            s.hooks["response"].append(self._trace_response)
+        s.hooks["response"].append(self._count_transfer)
         if session_data["use_proxy"] is False:
             s.proxies = {"http": None, "https": None}
+        governor = session_data.get("governor") or {}
+        self.governor = RestGovernor(
+            max_inflight=governor.get("max_inflight"),
+            rate=governor.get("rate_limit"),
+            retries=governor.get("retries", MAX_RETRIES),
+            backoff=governor.get("retry_backoff", RETRY_BACKOFF))
+        adapter = GovernedAdapter(HTTPAdapter(), self.governor)
+        self.proxy_requests = bool(session_data.get("proxy_requests"))
+        if self.proxy_requests:
+            # The persistent connection paces the requests it proxies for
+            # every module of the host, only the requests it can't proxy
+            # are paced here
+            adapter = ConnectionAdapter(connection, adapter)
+        s.mount("https://", adapter)
         self._session = dict(
             s=s,
             url=session_data["url"],
@@ -54,6 +213,61 @@ class Session(object):
     def get_session(self):
         return self._session
 
+    def get_worker_session(self):
+        """
+        Returns a new requests session logged in like the one of
+        get_session(), for a thread of its own. requests sessions and the
+        pyaoscx objects built on them aren't meant to be shared between
+        threads, the worker sessions only share the transport, with its
+        pool of connections and governor, and the hooks.
+        """
+        s = self._session["s"]
+        worker = RequestsSession()
+        worker.cookies.update(s.cookies)
+        worker.headers.update(s.headers)
+        worker.proxies = dict(s.proxies)
+        worker.hooks["response"] = list(s.hooks["response"])
+        worker.mount("https://", s.get_adapter("https://"))
+        return worker
+
+    def _trace_response(self, response, **kwargs):
+        """
+        requests hook adding each request to the trace of the module. The
+        time to the first byte is the time until the headers of the response
+        were received, the body of streamed responses isn't counted.
+        """
+        ttfb = response.elapsed.total_seconds()
+        total = ttfb
+        bytes_in = 0
+        if not kwargs.get("stream"):
+            start = time.time()
+            bytes_in = _get_wire_bytes(response, response.content or b"")
+            total += time.time() - start
+        body = response.request.body
+        bytes_out = len(body) if isinstance(body, (bytes, str)) else 0
+        self._trace.add("rest", response.request.method, response.request.url,
+                        response.status_code, bytes_out, bytes_in, total,
+                        ttfb=ttfb)
+
+    def _count_transfer(self, response, **kwargs):
+        """
+        requests hook counting the bytes of each response, as received and
+        once decompressed. Streamed responses aren't read here, they are
+        left out.
+        """
+        if kwargs.get("stream"):
+            return
+        content = response.content or b""
+        wire_bytes = _get_wire_bytes(response, content)
+        encoding = response.headers.get("Content-Encoding", "").lower()
+        with self._stats_lock:
+            stats = self.transfer_stats
+            stats["responses"] += 1
+            stats["response_bytes"] += len(content)
+            stats["response_wire_bytes"] += wire_bytes
+            if encoding in ("gzip", "deflate"):
+                stats["compressed_responses"] += 1
+
     def check_supported_firmware(self, ansible_module):
         if HAS_PYAOSCX_FIRMWARE:
             version = firmware.get_firmware_version(**self._session)
@@ -64,6 +278,17 @@ class Session(object):
                 ansible_module.fail_json(msg="Minimum supported "
                                          "firmware version is 10.03")
 
+
+def get_pool_stats(ansible_module):
+    """
+    Returns the usage of the keep-alive connections of the persistent
+    connection to the switch since it was opened, and the throttling
+    counters of the requests it proxied
+    """
+    connection = Connection(ansible_module._socket_path)
+    return connection.get_pool_stats()
+
+
 def get_pyaoscx_session(ansible_module):
     # Get session's serialized information
     ansible_module_session = Session(ansible_module)
@@ -72,3 +297,92 @@ def get_pyaoscx_session(ansible_module):
     requests_session = ansible_module_session_info["s"]
     base_url = ansible_module_session_info["url"]
     return PyaoscxSession.from_session(requests_session, base_url)
+
+
+def get_pyaoscx_worker_session(session):
+    """
+    Returns a pyaoscx session of its own for a thread, sharing the transport
+    of a module Session
+    :param session: Session of the module
+    """
+    return PyaoscxSession.from_session(session.get_worker_session(),
+                                       session.get_session()["url"])
+
+
+def per_thread(factory):
+    """
+    Returns a callable returning the object built by factory for the calling
+    thread, built on its first call in each thread
+    """
+    local = threading.local()
+
+    def get():
+        if not hasattr(local, "value"):
+            local.value = factory()
+        return local.value
+    return get
+
+
+def get_to_file(ansible_module, path, dest, session=None):
+    """
+    GETs a resource and writes its body to a file as it is received, without
+    holding it in memory
+    :param path: URL of the resource, relative to the REST API version
+    :param dest: path of the file, replaced only when the whole body was
+        received
+    :param session: Session of the module, so the request is paced and
+        traced with the others, a new one is opened when None
+    :return: number of bytes written
+    """
+    if session is None:
+        session = Session(ansible_module)
+    session_info = session.get_session()
+    response = session_info["s"].get(session_info["url"] + path,
+                                     verify=False, stream=True)
+    try:
+        if response.status_code != 200:
+            ansible_module.fail_json(
+                msg="Unable to GET {0}: {1} {2}".format(
+                    path, response.status_code, response.reason))
+        tmp_path = "{0}.{1}".format(dest, os.getpid())
+        try:
+            with open(tmp_path, "wb") as dest_file:
+                # decode_content undoes the Content-Encoding while reading
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, dest_file,
+                                   DOWNLOAD_CHUNK_SIZE)
+                size = dest_file.tell()
+            os.rename(tmp_path, dest)
+        except (IOError, OSError) as exc:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            ansible_module.fail_json(msg="Unable to write {0}: {1}".format(
+                dest, to_text(exc)))
+    finally:
+        response.close()
+    return size
+
+
+def run_concurrently(function, items, max_workers=MAX_CONCURRENT_REQUESTS):
+    """
+    Calls function for each item on a bounded pool of threads
+    :param function: callable taking one item
+    :param items: list of items
+    :param max_workers: maximum number of calls running at the same time
+    :return: list of (item, result, exception) tuples in the order of items,
+        exception is None when the call succeeded
+    """
+    def call(item):
+        try:
+            return item, function(item), None
+        except Exception as exc:
+            return item, None, exc
+
+    if not HAS_THREAD_POOL or len(items) < 2 or max_workers < 2:
+        return [call(item) for item in items]
+
+    workers = min(max_workers, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(call, items))
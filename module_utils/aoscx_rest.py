@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.connection import Connection, ConnectionError
+from ansible.module_utils.six.moves.urllib.parse import quote
+
+# Version of the REST API used when the switch can't be asked for its
+# versions
+DEFAULT_API_VERSION = 'v10.04'
+
+# Query parameters assumed to be supported by the default version when the
+# switch can't be asked for its capabilities
+DEFAULT_FEATURES = ('attributes',)
+
+
+class RestUrlBuilder(object):
+    '''
+    Builds the URLs of the REST API version negotiated with a switch
+
+    Query parameters the switch doesn't support are left out of the URLs,
+    select() and filter_items() then apply them to the response instead.
+    '''
+
+    def __init__(self, capabilities=None):
+        '''
+        :param capabilities: dict with the version and the supported
+            features, as returned by the get_api_capabilities method of the
+            connection
+        '''
+        capabilities = capabilities or {}
+        self.version = capabilities.get('version') or DEFAULT_API_VERSION
+        self.versions = capabilities.get('versions')
+        features = capabilities.get('features')
+        self.features = frozenset(DEFAULT_FEATURES if features is None
+                                  else features)
+        self.prefix = '/rest/{0}/'.format(self.version)
+
+    def supports(self, feature):
+        '''
+        Whether the switch supports a query parameter, one of attributes,
+        selector or filter
+        '''
+        return feature in self.features
+
+    def path(self, resource, attributes=None, depth=None, selector=None,
+             filters=None):
+        '''
+        Returns the path of a resource relative to the REST API version
+        :param resource: path of the resource, such as system/vlans
+        :param attributes: optional list of the only attributes to fetch,
+            preferred over the selector when both are supported
+        :param depth: optional depth of the response
+        :param selector: optional category of the attributes, such as
+            configuration
+        :param filters: optional dict of attribute values the items of a
+            collection must match
+        :return: path with the supported query parameters
+        '''
+        query = []
+        if attributes and self.supports('attributes'):
+            query.append('attributes={0}'.format(
+                ','.join(quote(attribute, safe='')
+                         for attribute in attributes)))
+        elif selector and self.supports('selector'):
+            query.append('selector={0}'.format(quote(selector, safe='')))
+        if depth is not None:
+            query.append('depth={0}'.format(depth))
+        if filters and self.supports('filter'):
+            query.append('filter={0}'.format(','.join(
+                '{0}:{1}'.format(quote(key, safe=''),
+                                 quote(str(value), safe=''))
+                for key, value in sorted(filters.items()))))
+        if not query:
+            return resource
+        return '{0}?{1}'.format(resource, '&'.join(query))
+
+    def url(self, resource, **kwargs):
+        '''
+        Returns the absolute path of a resource, see path() for the
+        arguments
+        '''
+        return self.prefix + self.path(resource, **kwargs)
+
+    def select(self, data, attributes):
+        '''
+        Keeps the given attributes of a response when the switch doesn't
+        support the attributes parameter
+        '''
+        if not attributes or self.supports('attributes') or \
+                not isinstance(data, dict):
+            return data
+        return dict((key, value) for key, value in data.items()
+                    if key in attributes)
+
+    def filter_items(self, data, filters):
+        '''
+        Keeps the items of a collection matching the filters when the switch
+        doesn't support the filter parameter
+        '''
+        if not filters or self.supports('filter') or \
+                not isinstance(data, dict):
+            return data
+        return dict((key, item) for key, item in data.items()
+                    if isinstance(item, dict) and
+                    all(str(item.get(name)) == str(value)
+                        for name, value in filters.items()))
+
+
+def get_url_builder(module, versions=None):
+    '''
+    Returns the URL builder of the REST API version the switch and the
+    caller have in common. The capabilities of the switch are discovered
+    once per persistent connection, and the builder is kept for the module
+    run.
+    :param module: AnsibleModule object
+    :param versions: optional versions understood by the caller, in order of
+        preference, defaults to the version of the connection
+    :return: RestUrlBuilder object
+    '''
+    key = tuple(versions or ())
+    builders = getattr(module, '_aoscx_url_builders', None)
+    if builders is None:
+        builders = module._aoscx_url_builders = {}
+    if key not in builders:
+        capabilities = None
+        try:
+            capabilities = Connection(
+                module._socket_path).get_api_capabilities(
+                    list(versions) if versions else None)
+        except ConnectionError:
+            # Older connections can't be asked, keep the default version
+            # unless the caller needs another one
+            if versions:
+                capabilities = dict(version=versions[0], features=None)
+        builders[key] = RestUrlBuilder(capabilities)
+    return builders[key]
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import re
+import time
+
+from ansible.module_utils.connection import Connection, ConnectionError
+from ansible.module_utils.parsing.convert_bool import boolean
+
+# Environment variable enabling the trace of the REST and CLI calls of each
+# module, returned in its results as aoscx_trace
+TRACE_ENV = 'ANSIBLE_AOSCX_TRACE'
+
+# Environment variable holding the path of a JSON lines file the traces are
+# appended to, it enables the trace
+TRACE_FILE_ENV = 'ANSIBLE_AOSCX_TRACE_FILE'
+
+# Upper bounds in seconds of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Percentiles of the latency of each endpoint
+PERCENTILES = (50, 90, 99)
+
+# Numeric keys of the items of collections, such as VLAN IDs
+_NUMBER_RE = re.compile(r'^\d+$')
+
+# Words of a CLI command followed by a secret
+_CLI_SECRET_RE = re.compile(r'^(password|secret|key|community|ciphertext|'
+                            r'plaintext)$', re.I)
+
+
+def is_trace_enabled():
+    '''
+    Checks whether the REST and CLI calls of the modules are traced
+    '''
+    if os.environ.get(TRACE_FILE_ENV):
+        return True
+    try:
+        return boolean(os.environ.get(TRACE_ENV, False))
+    except TypeError:
+        return False
+
+
+def template_path(path):
+    '''
+    Returns the endpoint of a REST path, the keys of the items of the
+    collections and the values of the query parameters are replaced, i.e.
+    /rest/v10.04/system/vlans/10?depth=2 is /rest/v10.04/system/vlans/{id}?
+    depth
+    '''
+    path, dummy, query = path.partition('?')
+    if '://' in path:
+        path = '/' + path.split('://', 1)[1].partition('/')[2]
+    segments = path.split('/')
+    for index in range(1, len(segments)):
+        previous = segments[index - 1]
+        segment = segments[index]
+        # The items of a collection, such as system/vlans or fullconfigs,
+        # follow its plural name
+        if segment and (_NUMBER_RE.match(segment) or '%' in segment or
+                        (previous.endswith('s') and previous != 'rest')):
+            segments[index] = '{id}'
+    path = '/'.join(segments)
+    if query:
+        names = [param.partition('=')[0] for param in query.split('&')]
+        path = '{0}?{1}'.format(path, '&'.join(names))
+    return path
+
+
+def template_command(command):
+    '''
+    Returns the keywords of a CLI command, its arguments and anything
+    following a secret are replaced, i.e. show interface 1/1/1 is show
+    interface {arg}
+    '''
+    words = []
+    for word in command.split():
+        if any(char.isdigit() for char in word) or \
+                not word.replace('-', '').replace('_', '').isalpha():
+            word = '{arg}'
+        words.append(word)
+        if _CLI_SECRET_RE.match(word):
+            words.append('...')
+            break
+    return ' '.join(words)
+
+
+def _percentile(values, percent):
+    '''
+    Returns the percentile of sorted values, by the nearest rank
+    '''
+    rank = max(int(round(percent / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class RequestTrace(object):
+    '''
+    Trace of the REST and CLI calls of a module run
+
+    The records hold the kind of call, rest or cli, its method, endpoint,
+    status, bytes sent and received, the seconds until the response started
+    when the transport tells them apart, and the total seconds. Calls made
+    by the persistent connection on behalf of the module are collected from
+    it when the module exits.
+    '''
+
+    def __init__(self, module):
+        '''
+        :param module: AnsibleModule object
+        '''
+        self._module = module
+        self._connection = None
+        self._offset = None
+        self.records = []
+        socket_path = getattr(module, '_socket_path', None)
+        if socket_path:
+            self._connection = Connection(socket_path)
+            try:
+                self._offset = self._connection.get_trace()['offset']
+            except (ConnectionError, KeyError, TypeError):
+                # The connection doesn't trace its calls
+                self._connection = None
+
+    def add(self, kind, method, path, status, bytes_out, bytes_in, total,
+            ttfb=None, start=None):
+        '''
+        Records a call
+        :param kind: rest or cli
+        :param method: HTTP method, or CLI for commands
+        :param path: path of the request or CLI command, stored as its
+            endpoint
+        :param status: HTTP status, or 0 for successful commands and 1 for
+            failed ones
+        :param bytes_out: number of bytes sent
+        :param bytes_in: number of bytes received
+        :param total: seconds taken by the call
+        :param ttfb: optional seconds until the response started
+        :param start: optional time the call started, defaults to total
+            seconds ago
+        '''
+        endpoint = template_path(path) if kind == 'rest' else \
+            template_command(path)
+        self.records.append(dict(
+            kind=kind, method=method, path=endpoint, status=status,
+            bytes_out=bytes_out or 0, bytes_in=bytes_in or 0,
+            ttfb=None if ttfb is None else round(ttfb, 6),
+            total=round(total, 6),
+            time=round(time.time() - total if start is None else start, 6)))
+
+    def collect(self):
+        '''
+        Adds the calls made by the persistent connection since the trace
+        started
+        '''
+        if self._connection is None:
+            return
+        try:
+            trace = self._connection.get_trace(self._offset)
+        except ConnectionError:
+            return
+        self._offset = trace['offset']
+        for record in trace['records']:
+            self.add(**record)
+        self.records.sort(key=lambda record: record['time'])
+
+    def summary(self):
+        '''
+        Returns the number of calls, errors, bytes, latency percentiles and
+        histogram of each endpoint, keyed by method and endpoint
+        '''
+        endpoints = {}
+        for record in self.records:
+            key = '{0} {1}'.format(record['method'], record['path'])
+            endpoints.setdefault(key, []).append(record)
+
+        summary = {}
+        for key, records in endpoints.items():
+            latencies = sorted(record['total'] for record in records)
+            histogram = dict(('le_{0}'.format(bound), 0)
+                             for bound in LATENCY_BUCKETS)
+            histogram['le_inf'] = 0
+            for latency in latencies:
+                bucket = 'le_inf'
+                for bound in LATENCY_BUCKETS:
+                    if latency <= bound:
+                        bucket = 'le_{0}'.format(bound)
+                        break
+                histogram[bucket] += 1
+            entry = dict(
+                count=len(records),
+                errors=len([record for record in records
+                            if record['status'] is None or
+                            record['status'] >= 400 or
+                            (record['kind'] == 'cli' and record['status'])]),
+                bytes_out=sum(record['bytes_out'] for record in records),
+                bytes_in=sum(record['bytes_in'] for record in records),
+                total_seconds=round(sum(latencies), 6),
+                max=latencies[-1],
+                histogram=histogram)
+            for percent in PERCENTILES:
+                entry['p{0}'.format(percent)] = _percentile(latencies,
+                                                            percent)
+            summary[key] = entry
+        return summary
+
+    def to_dict(self):
+        return dict(records=self.records, summary=self.summary())
+
+    def export(self, path, result):
+        '''
+        Appends the records and the summary of each endpoint to a JSON lines
+        file, tagged with the module and the switch
+        '''
+        module = getattr(self._module, '_name', None)
+        host = None
+        if self._connection is not None:
+            try:
+                host = self._connection.get_option('host')
+            except ConnectionError:
+                pass
+        lines = []
+        for record in result['records']:
+            line = dict(type='call', module=module, host=host)
+            line.update(record)
+            lines.append(json.dumps(line))
+        for endpoint, entry in sorted(result['summary'].items()):
+            line = dict(type='summary', module=module, host=host,
+                        endpoint=endpoint)
+            line.update(entry)
+            lines.append(json.dumps(line))
+        try:
+            with open(os.path.expanduser(path), 'a') as trace_file:
+                trace_file.write(''.join(line + '\n' for line in lines))
+        except (IOError, OSError):
+            self._module.warn('Unable to write the trace to {0}'.format(path))
+
+
+def get_trace(module):
+    '''
+    Returns the trace of the module run, None when tracing is disabled. The
+    trace is added to the results of the module as aoscx_trace when it
+    exits, and appended to the trace file when one is set.
+    :param module: AnsibleModule object
+    '''
+    trace = getattr(module, '_aoscx_trace', False)
+    if trace is not False:
+        return trace
+
+    trace = RequestTrace(module) if is_trace_enabled() else None
+    module._aoscx_trace = trace
+    if trace is None:
+        return None
+
+    def wrap(exit_function):
+        def traced_exit(*args, **kwargs):
+            trace.collect()
+            result = trace.to_dict()
+            trace_path = os.environ.get(TRACE_FILE_ENV)
+            if trace_path:
+                trace.export(trace_path, result)
+            kwargs['aoscx_trace'] = result
+            return exit_function(*args, **kwargs)
+        return traced_exit
+
+    module.exit_json = wrap(module.exit_json)
+    module.fail_json = wrap(module.fail_json)
+    return trace
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2019-2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+import copy
+
+from ansible.module_utils.aoscx_config_diff import get_config_changes
+
+# Tables of the fullconfig document holding a single row instead of a
+# dictionary of rows
+SINGLETON_TABLES = frozenset(['System'])
+
+_MISSING = object()
+
+
+def _is_row_table(table, value):
+    '''
+    Checks if a fullconfig table is a dictionary of rows
+    '''
+    if table in SINGLETON_TABLES or not isinstance(value, dict):
+        return False
+    return all(isinstance(row, dict) for row in value.values())
+
+
+class TrackedTable(dict):
+    '''
+    Copy-on-write view of a fullconfig table
+
+    Rows are copied from the fetched config the first time they are
+    accessed, so the fetched config is never modified and only the rows
+    handed out to the module are duplicated.
+    '''
+
+    def __init__(self, tracked_config, table, rows):
+        super(TrackedTable, self).__init__(rows)
+        self._tracked_config = tracked_config
+        self._table = table
+        self._copied_rows = set()
+
+    def __getitem__(self, row):
+        value = dict.__getitem__(self, row)
+        if row not in self._copied_rows:
+            value = copy.deepcopy(value)
+            dict.__setitem__(self, row, value)
+            self._copied_rows.add(row)
+            self._tracked_config.touch(self._table, row)
+        return value
+
+    def __setitem__(self, row, value):
+        dict.__setitem__(self, row, value)
+        self._copied_rows.add(row)
+        self._tracked_config.touch(self._table, row)
+
+    def __delitem__(self, row):
+        dict.__delitem__(self, row)
+        self._copied_rows.discard(row)
+        self._tracked_config.touch(self._table, row)
+
+    def __iter__(self):
+        # Overridden so that dict() and ** unpacking go through __getitem__
+        return dict.__iter__(self)
+
+    def get(self, row, default=None):
+        if row in self:
+            return self[row]
+        return default
+
+    def setdefault(self, row, default=None):
+        if row in self:
+            return self[row]
+        self[row] = default
+        return default
+
+    def pop(self, row, *default):
+        if row not in self:
+            if default:
+                return default[0]
+            raise KeyError(row)
+        value = self[row]
+        del self[row]
+        return value
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): table is empty')
+        row = next(iter(self))
+        return row, self.pop(row)
+
+    def clear(self):
+        for row in list(self.keys()):
+            del self[row]
+
+    def update(self, *args, **kwargs):
+        for row, value in dict(*args, **kwargs).items():
+            self[row] = value
+
+    def items(self):
+        return [(row, self[row]) for row in self.keys()]
+
+    def values(self):
+        return [self[row] for row in self.keys()]
+
+    def copy(self):
+        return dict(self.items())
+
+
+class TrackedConfig(dict):
+    '''
+    Copy-on-write view of a fullconfig document
+
+    Keeps a single copy of the fetched config and records which tables and
+    rows were handed out or modified, so checking for changes and computing
+    them only looks at the touched paths.
+    '''
+
+    def __init__(self, config):
+        super(TrackedConfig, self).__init__(config)
+        self._original = config
+        self._loaded_tables = set()
+        self._touched = set()
+
+    def touch(self, table, row=None):
+        '''
+        Record that a table, or one of its rows, may have been modified
+        '''
+        self._touched.add((table, row))
+
+    def _load_table(self, table):
+        value = dict.__getitem__(self, table)
+        if _is_row_table(table, value):
+            value = TrackedTable(self, table, value)
+        else:
+            value = copy.deepcopy(value)
+            self.touch(table)
+        dict.__setitem__(self, table, value)
+        self._loaded_tables.add(table)
+        return value
+
+    def __getitem__(self, table):
+        if table not in self._loaded_tables:
+            return self._load_table(table)
+        return dict.__getitem__(self, table)
+
+    def __setitem__(self, table, value):
+        dict.__setitem__(self, table, value)
+        self._loaded_tables.add(table)
+        self.touch(table)
+
+    def __delitem__(self, table):
+        dict.__delitem__(self, table)
+        self._loaded_tables.discard(table)
+        self.touch(table)
+
+    def __iter__(self):
+        # Overridden so that dict() and ** unpacking go through __getitem__
+        return dict.__iter__(self)
+
+    def get(self, table, default=None):
+        if table in self:
+            return self[table]
+        return default
+
+    def setdefault(self, table, default=None):
+        if table in self:
+            return self[table]
+        self[table] = default
+        return default
+
+    def pop(self, table, *default):
+        if table not in self:
+            if default:
+                return default[0]
+            raise KeyError(table)
+        value = self[table]
+        del self[table]
+        return value
+
+    def update(self, *args, **kwargs):
+        for table, value in dict(*args, **kwargs).items():
+            self[table] = value
+
+    def items(self):
+        return [(table, self[table]) for table in self.keys()]
+
+    def values(self):
+        return [self[table] for table in self.keys()]
+
+    def to_dict(self):
+        '''
+        Returns the config as plain dictionaries, without copying rows
+        '''
+        config = {}
+        for table, value in dict.items(self):
+            if isinstance(value, TrackedTable):
+                value = dict(dict.items(value))
+            config[table] = value
+        return config
+
+    def touched_tables(self):
+        '''
+        Returns the tables that were handed out or modified
+        '''
+        return set(table for table, row in self._touched)
+
+    def is_changed(self):
+        '''
+        Checks if any of the touched paths differs from the fetched config
+        '''
+        for table, row in self._touched:
+            before = self._original.get(table, _MISSING)
+            after = dict.get(self, table, _MISSING)
+            if row is not None:
+                if before is not _MISSING:
+                    before = before.get(row, _MISSING)
+                if after is not _MISSING:
+                    after = dict.get(after, row, _MISSING)
+            if before is not after and before != after:
+                return True
+        return False
+
+    def get_changes(self):
+        '''
+        Returns the changes on the touched tables, see get_config_changes
+        '''
+        if not self.is_changed():
+            return []
+        return get_config_changes(self._original, self.to_dict(),
+                                  tables=self.touched_tables())
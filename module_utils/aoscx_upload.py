@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2019-2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+import os
+import re
+import time
+import uuid
+
+# Size of the reads from the uploaded file
+CHUNK_SIZE = 1024 * 1024
+
+# Number of bytes at the start of a .swi image searched for its version
+IMAGE_HEADER_SIZE = 64 * 1024
+
+# Firmware versions, such as TL.10.04.0030 in the image header or
+# TL_10_04_0030A.swi in its file name
+_VERSION_RE = re.compile(
+    r'([A-Z]{2})[._](\d{2})[._](\d{2})[._](\d{4})')
+
+
+class MultipartFileEncoder(object):
+    '''
+    File-like multipart/form-data body holding a single file
+
+    The file is read in chunks of at most chunk_size bytes while the body is
+    sent, so the memory used doesn't depend on the size of the file. The
+    length of the body is known in advance, so it is sent with a
+    Content-Length header instead of chunked encoding.
+    '''
+
+    def __init__(self, field_name, file_path, chunk_size=CHUNK_SIZE,
+                 callback=None):
+        '''
+        :param field_name: name of the form field holding the file
+        :param file_path: path of the file to send
+        :param chunk_size: maximum number of bytes read from the file at once
+        :param callback: optional callable receiving the number of bytes
+            sent so far and the total length of the body
+        '''
+        boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={0}'.format(
+            boundary)
+        self._head = (
+            '--{boundary}\r\n'
+            'Content-Disposition: form-data; name="{field}"; '
+            'filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.format(
+                boundary=boundary, field=field_name,
+                filename=os.path.basename(file_path))).encode('utf-8')
+        self._tail = '\r\n--{boundary}--\r\n'.format(
+            boundary=boundary).encode('utf-8')
+        self._file = open(file_path, 'rb')
+        self._file_size = os.fstat(self._file.fileno()).st_size
+        self._chunk_size = chunk_size
+        self._callback = callback
+        self.len = len(self._head) + self._file_size + len(self._tail)
+        self.bytes_read = 0
+
+    def __len__(self):
+        return self.len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def reset(self):
+        '''
+        Rewinds the body to send it again
+        '''
+        self._file.seek(0)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.len - self.bytes_read
+
+        data = []
+        while size > 0 and self.bytes_read < self.len:
+            offset = self.bytes_read
+            if offset < len(self._head):
+                chunk = self._head[offset:offset + size]
+            elif offset < len(self._head) + self._file_size:
+                chunk = self._file.read(min(size, self._chunk_size))
+                if not chunk:
+                    raise IOError("{0} was truncated while being "
+                                  "uploaded".format(self._file.name))
+            else:
+                offset -= len(self._head) + self._file_size
+                chunk = self._tail[offset:offset + size]
+            data.append(chunk)
+            size -= len(chunk)
+            self.bytes_read += len(chunk)
+
+        if self._callback is not None and data:
+            self._callback(self.bytes_read, self.len)
+        return b''.join(data)
+
+    def close(self):
+        self._file.close()
+
+
+class UploadProgress(object):
+    '''
+    Tracks the progress and throughput of an upload, logging every step
+    percent of the transfer
+    '''
+
+    def __init__(self, log=None, step=10):
+        '''
+        :param log: optional callable receiving the progress messages
+        :param step: percentage of the transfer between two messages
+        '''
+        self._log = log
+        self._step = step
+        self._next_report = step
+        self.start_time = None
+        self.bytes_sent = 0
+        self.total = 0
+
+    def start(self):
+        self.start_time = time.time()
+        self.bytes_sent = 0
+        self._next_report = self._step
+
+    def update(self, bytes_sent, total):
+        self.bytes_sent = bytes_sent
+        self.total = total
+        if self._log is None or not total:
+            return
+        percent = bytes_sent * 100 // total
+        if percent >= self._next_report:
+            self._log("Uploaded {0}% ({1:.1f} MB at {2:.1f} MB/s)".format(
+                percent, bytes_sent / 1048576.0,
+                self.throughput() / 1048576.0))
+            self._next_report = (percent // self._step + 1) * self._step
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return time.time() - self.start_time
+
+    def throughput(self):
+        '''
+        Returns the average number of bytes sent per second
+        '''
+        elapsed = self.elapsed()
+        if not elapsed:
+            return 0.0
+        return self.bytes_sent / elapsed
+
+    def to_dict(self):
+        return dict(
+            bytes=self.bytes_sent,
+            seconds=round(self.elapsed(), 3),
+            bytes_per_second=int(self.throughput())
+        )
+
+
+def normalize_version(version):
+    '''
+    Returns a firmware version in the XX.NN.NN.NNNN format used by the
+    switch, or None if it isn't a firmware version
+    '''
+    if not version:
+        return None
+    match = _VERSION_RE.search(version)
+    if match is None:
+        return None
+    return '.'.join(match.groups())
+
+
+def _read_image_version(file_path):
+    '''
+    Reads the firmware version of a .swi image from its header and its file
+    name. The layout of the header isn't parsed, the version is searched in
+    it, so it is only trusted when every version found agrees.
+    :return: the version, None if there is none or more than one
+    '''
+    with open(file_path, 'rb') as image:
+        header = image.read(IMAGE_HEADER_SIZE)
+    versions = set('.'.join(groups) for groups in
+                   _VERSION_RE.findall(header.decode('latin-1')))
+    name_version = normalize_version(os.path.basename(file_path))
+    if name_version is not None:
+        versions.add(name_version)
+    if len(versions) != 1:
+        return None
+    return versions.pop()
+
+
+def get_image_info(file_path):
+    '''
+    Returns the firmware version of a .swi image
+    :param file_path: path of the image
+    :return: dict with version, None if unknown or ambiguous
+    '''
+    return dict(version=_read_image_version(file_path))
@@ -15,6 +15,38 @@ from ansible.module_utils.aoscx_port import Port
 from ansible.module_utils.aoscx_interface import Interface
 
 
+def expand_vlan_ids(vlan_ids):
+    '''
+    Expands a VLAN range expression into a list of VLAN IDs
+    :param vlan_ids: int, or str with comma separated IDs and ranges, for
+        example '10,20-25'
+    :return: list of int VLAN IDs, in the given order and without duplicates
+    '''
+    result = []
+    seen = set()
+    for item in str(vlan_ids).split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '-' in item:
+            start, end = item.split('-', 1)
+            start = int(start)
+            end = int(end)
+            if start > end:
+                raise ValueError("Invalid VLAN range {0}".format(item))
+            ids = range(start, end + 1)
+        else:
+            ids = [int(item)]
+        for vlan_id in ids:
+            if vlan_id < 1 or vlan_id > 4094:
+                raise ValueError("VLAN ID {0} is not between 1 and 4094"
+                                 "".format(vlan_id))
+            if vlan_id not in seen:
+                seen.add(vlan_id)
+                result.append(vlan_id)
+    return result
+
+
 class VLAN:
 
     def create_vlan(self, aruba_ansible_module, vlan_id):
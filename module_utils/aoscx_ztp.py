@@ -12,6 +12,12 @@ __metaclass__ = type
 from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import missing_required_lib
 from contextlib import closing
+import codecs
+import hashlib
+import json
+import os
+import select
+import socket
 import time
 import traceback
 
@@ -23,15 +29,40 @@ except ImportError:
     HAS_PARAMIKO_LIB = False
     PARAMIKO_IMP_ERR = traceback.format_exc()
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    HAS_THREAD_POOL = True
+except ImportError:
+    HAS_THREAD_POOL = False
+
 CHANNEL_TIMEOUT = 8
 READ_TIMEOUT = 10
-READ_WAIT_TIME = 2
 BUFFER_SIZE = 4096
+# Maximum number of characters kept from the channel while waiting for a
+# message
+MAX_BUFFER_SIZE = 65536
 BLANK_PASSWORD = ""
 ENTER_PASSWORD_MSG = 'Enter new password:'
 CONFIRM_PASSWORD_MSG = 'Confirm new password:'
 SHELL_PROMPT = '#'
 
+# Results of the probe of a switch for zero-touch provisioning
+ZTP_PROVISIONED = 'provisioned'
+ZTP_CONFIGURED = 'configured'
+ZTP_FAILED = 'failed'
+
+# Maximum number of switches bootstrapped at the same time
+MAX_BOOTSTRAP_WORKERS = 16
+# Seconds allowed to bootstrap one switch
+BOOTSTRAP_TIMEOUT = 60
+
+# Environment variables enabling and locating the results kept on disk
+ZTP_CACHE_ENV = 'ANSIBLE_AOSCX_ZTP_CACHE'
+ZTP_CACHE_DIR_ENV = 'ANSIBLE_AOSCX_ZTP_CACHE_DIR'
+ZTP_CACHE_DIR = '~/.ansible/aoscx_ztp'
+# Seconds during which a probe result kept on disk is trusted
+ZTP_CACHE_TTL = 86400
+
 
 def connect_ztp_device(module, hostname, username, password):
     """Connects to a ZTP device using SSH and configures authentication.
@@ -50,54 +81,313 @@ def connect_ztp_device(module, hostname, username, password):
     :param hostname: The Switch to connect to.
     :param username: The username to authenticate as.
     :param password: A password to use for authentication.
+    :return: `ZTP_CONFIGURED` if the password was set, `ZTP_PROVISIONED` if
+        the Switch authentication is already configured, `None` otherwise.
     """
 
     if not HAS_PARAMIKO_LIB:
         module.fail_json(msg=missing_required_lib(
             "paramiko"), exception=PARAMIKO_IMP_ERR)
 
+    try:
+        status = configure_ztp_device(hostname, username, password)
+        if status == ZTP_FAILED:
+            module.log("No CLI prompt after setting the password")
+            return None
+        return status
+
+    except paramiko.ssh_exception.AuthenticationException as e:
+        module.log("Unable to authenticate: {0}".format(to_text(e)))
+        return ZTP_PROVISIONED
+
+    except Exception as e:
+        module.log(to_text(e))
+        return None
+
+
+def configure_ztp_device(hostname, username, password, port=22,
+                         timeout=None):
+    """Sets the password of a zeroized Switch.
+
+    :param hostname: The Switch to connect to.
+    :param username: The username to authenticate as.
+    :param password: The new password.
+    :param port: The SSH port of the Switch.
+    :param timeout: Optional seconds allowed for the whole setup.
+    :return: `ZTP_CONFIGURED` if the password was set, `None` if the Switch
+        didn't ask for a new password in time, `ZTP_FAILED` if it didn't
+        show its CLI prompt after the new password.
+    :raises paramiko.ssh_exception.AuthenticationException: when the Switch
+        authentication is already configured.
+    """
+    deadline = None if timeout is None else time.time() + timeout
+
+    def read_timeout():
+        if deadline is None:
+            return READ_TIMEOUT
+        return max(0, min(READ_TIMEOUT, deadline - time.time()))
+
     with closing(paramiko.SSHClient()) as ssh_client:
 
         # Define SSH parameters
         paramiko_ssh_connection_args = {'hostname': hostname,
+                                        'port': port,
                                         'username': username,
                                         'password': BLANK_PASSWORD,
                                         'look_for_keys': False,
                                         'allow_agent': False}
+        if timeout is not None:
+            paramiko_ssh_connection_args.update(timeout=timeout,
+                                                banner_timeout=timeout,
+                                                auth_timeout=timeout)
 
         # Default AutoAdd as Policy
         ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-        try:
-            # Connect to switch via SSH
-            ssh_client.connect(**paramiko_ssh_connection_args)
+        # Connect to switch via SSH
+        ssh_client.connect(**paramiko_ssh_connection_args)
 
-            # Get shell
-            shell_channel = ssh_client.invoke_shell()
+        # Get shell
+        shell_channel = ssh_client.invoke_shell()
 
-            # Set channel response timeout
-            shell_channel.settimeout(CHANNEL_TIMEOUT)
+        # Set channel response timeout
+        shell_channel.settimeout(CHANNEL_TIMEOUT)
+        reader = ChannelReader(shell_channel)
 
-            # Wait for message and enter new password
-            if wait_for_channel_msg(shell_channel, ENTER_PASSWORD_MSG):
-                write_to_channel(shell_channel, password)
-            else:
-                return
+        # Wait for message and enter new password
+        if reader.read_until(ENTER_PASSWORD_MSG, read_timeout()):
+            write_to_channel(shell_channel, password)
+        else:
+            return None
 
-            # Wait for message and confirm new password
-            if wait_for_channel_msg(shell_channel, CONFIRM_PASSWORD_MSG):
-                write_to_channel(shell_channel, password)
-            else:
-                return
+        # Wait for message and confirm new password
+        if reader.read_until(CONFIRM_PASSWORD_MSG, read_timeout()):
+            write_to_channel(shell_channel, password)
+        else:
+            return None
 
-            # Wait for CLI prompt
-            wait_for_channel_msg(shell_channel, SHELL_PROMPT)
+        # Wait for CLI prompt, without it the password may not be set
+        if not reader.read_until(SHELL_PROMPT, read_timeout()):
+            return ZTP_FAILED
+        return ZTP_CONFIGURED
 
-        except paramiko.ssh_exception.AuthenticationException as e:
-            module.log("Unable to authenticate: {0}".format(to_text(e)))
 
-        except Exception as e:
-            module.log(to_text(e))
+def _bootstrap_device(host, username, password, port, timeout):
+    """Sets the password of one Switch of a bootstrap.
+
+    :return: dict with the host, its status and the error, if any.
+    """
+    result = dict(host=host, port=port, status=None, error=None)
+    start = time.time()
+    try:
+        result['status'] = configure_ztp_device(host, username, password,
+                                                port=port, timeout=timeout)
+        if result['status'] is None:
+            result['status'] = ZTP_FAILED
+            result['error'] = "No password prompt from the switch"
+        elif result['status'] == ZTP_FAILED:
+            result['error'] = "No CLI prompt after setting the password"
+    except paramiko.ssh_exception.AuthenticationException:
+        result['status'] = ZTP_PROVISIONED
+    except Exception as e:
+        result['status'] = ZTP_FAILED
+        result['error'] = to_text(e) or type(e).__name__
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def bootstrap_ztp_devices(hosts, username, password, port=22,
+                          max_workers=MAX_BOOTSTRAP_WORKERS,
+                          timeout=BOOTSTRAP_TIMEOUT):
+    """Sets the password of many zeroized Switches at the same time.
+
+    Switches whose authentication is already configured are reported as
+    provisioned and left untouched.
+
+    :param hosts: The Switches to connect to, as a list of addresses or of
+        dicts with `host` and an optional `port`.
+    :param username: The username to authenticate as.
+    :param password: The new password.
+    :param port: The SSH port of the Switches without their own.
+    :param max_workers: Maximum number of Switches set up at once.
+    :param timeout: Seconds allowed for the setup of each Switch.
+    :return: dict with the result of each Switch, in the order of hosts,
+        and the number of Switches by status.
+    """
+    targets = []
+    for host in hosts:
+        if isinstance(host, dict):
+            targets.append((host['host'], host.get('port') or port))
+        else:
+            targets.append((host, port))
+
+    def bootstrap(target):
+        return _bootstrap_device(target[0], username, password, target[1],
+                                 timeout)
+
+    start = time.time()
+    if not HAS_THREAD_POOL or len(targets) < 2 or max_workers < 2:
+        results = [bootstrap(target) for target in targets]
+    else:
+        workers = min(max_workers, len(targets))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(bootstrap, targets))
+
+    summary = dict(total=len(results),
+                   seconds=round(time.time() - start, 3))
+    for status in (ZTP_CONFIGURED, ZTP_PROVISIONED, ZTP_FAILED):
+        summary[status] = len([result for result in results
+                               if result['status'] == status])
+    return dict(results=results, summary=summary)
+
+
+def is_ztp_cache_enabled():
+    """Checks whether the probe results are kept on disk.
+
+    :return: `True` if the `ANSIBLE_AOSCX_ZTP_CACHE` environment variable is
+        set to a true value.
+    """
+    value = os.environ.get(ZTP_CACHE_ENV, '')
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _get_ztp_cache_path(hostname):
+    cache_dir = os.path.expanduser(
+        os.environ.get(ZTP_CACHE_DIR_ENV) or ZTP_CACHE_DIR)
+    key = hashlib.sha256(to_text(hostname).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{0}.json'.format(key))
+
+
+def read_ztp_cache(hostname):
+    """Reads the probe result of a Switch kept on disk.
+
+    :param hostname: The Switch the probe connected to.
+    :return: The probe result, `None` if unknown or expired.
+    """
+    try:
+        with open(_get_ztp_cache_path(hostname)) as cache_file:
+            cached = json.load(cache_file)
+        if time.time() - cached['time'] < ZTP_CACHE_TTL:
+            return cached['status']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def write_ztp_cache(hostname, status):
+    """Keeps the probe result of a Switch on disk, readable only by the
+    current user.
+
+    :param hostname: The Switch the probe connected to.
+    :param status: The probe result.
+    """
+    path = _get_ztp_cache_path(hostname)
+    tmp_path = '{0}.{1}'.format(path, os.getpid())
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(dict(status=status, time=time.time()), cache_file)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+class ChannelReader(object):
+    """Reads a channel into a buffer as soon as data arrives.
+
+    The received text accumulates until the expected message is found, so a
+    message split between two reads is still matched. Each search resumes
+    where the previous one stopped, and the text up to a match is consumed,
+    the rest is kept for the next message.
+    """
+
+    def __init__(self, shell_channel, max_size=MAX_BUFFER_SIZE):
+        """
+        :param shell_channel: The channel to read from.
+        :param max_size: Maximum number of characters kept in the buffer.
+        """
+        self._channel = shell_channel
+        self._max_size = max_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        self._buffer = ''
+        self._searched = 0
+        self.closed = False
+
+    def _wait_readable(self, timeout):
+        """Waits until the channel has data to read.
+
+        :return: `True` if there is data, `False` on timeout.
+        """
+        if self._channel.recv_ready():
+            return True
+        try:
+            fileno = self._channel.fileno()
+        except (AttributeError, NotImplementedError):
+            fileno = None
+        if fileno is None:
+            # Let a blocking recv with a timeout do the waiting
+            self._channel.settimeout(timeout)
+            return True
+        readable = select.select([fileno], [], [], timeout)[0]
+        return bool(readable)
+
+    def _read(self, timeout):
+        """Reads the available data into the buffer.
+
+        :return: `False` if nothing arrived before the timeout.
+        """
+        if not self._wait_readable(timeout):
+            return False
+        try:
+            data = self._channel.recv(BUFFER_SIZE)
+        except socket.timeout:
+            return False
+        if not data:
+            self.closed = True
+            return False
+        self._buffer += self._decoder.decode(data)
+        if len(self._buffer) > self._max_size:
+            dropped = len(self._buffer) - self._max_size
+            self._buffer = self._buffer[dropped:]
+            self._searched = max(0, self._searched - dropped)
+        return True
+
+    def read_until(self, msg, timeout=READ_TIMEOUT):
+        """Waits until the message is read from the channel.
+
+        :param msg: The message itself.
+        :param timeout: Seconds to wait for the message.
+        :return: `True` if successful, `False` otherwise.
+        """
+        deadline = time.time() + timeout
+        while True:
+            # A match may start in the text already searched
+            start = max(0, self._searched - len(msg) + 1)
+            index = self._buffer.find(msg, start)
+            if index >= 0:
+                self._buffer = self._buffer[index + len(msg):]
+                self._searched = 0
+                return True
+            self._searched = len(self._buffer)
+
+            remaining = deadline - time.time()
+            if remaining <= 0 or self.closed:
+                return False
+            self._read(remaining)
+
+    def read_available(self):
+        """Returns and consumes the text received so far.
+        """
+        while self._channel.recv_ready() and self._read(0):
+            pass
+        text, self._buffer, self._searched = self._buffer, '', 0
+        return text
 
 
 def wait_for_channel_msg(shell_channel, msg):
@@ -107,15 +397,7 @@ def wait_for_channel_msg(shell_channel, msg):
     :param msg: The message itself.
     :return: `True` if successful, `False` otherwise.
     """
-    retry = 0
-    while retry < READ_TIMEOUT:
-        read_buffer = read_from_channel(shell_channel)
-        if msg in read_buffer:
-            return True
-        time.sleep(READ_WAIT_TIME)
-        retry += READ_WAIT_TIME
-
-    return False
+    return ChannelReader(shell_channel).read_until(msg)
 
 
 def read_from_channel(shell_channel):
@@ -124,14 +406,7 @@ def read_from_channel(shell_channel):
     :param shell_channel: The channel to read from.
     :return: The read lines.
     """
-    recv = ""
-    # Loop while channel is able to recv data
-    while shell_channel.recv_ready():
-        recv = shell_channel.recv(BUFFER_SIZE)
-        if not recv:
-            break
-        recv = recv.decode('utf-8', 'ignore')
-    return recv
+    return ChannelReader(shell_channel).read_available()
 
 
 def write_to_channel(shell_channel, cmd):
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+
+# Subsets cached between runs. The running-config is the only subset whose
+# download is worth skipping, it is validated by the same conditional GET
+# that fetches it when it changed. The other subsets are a few attributes of
+# the system and subsystems, and the network resources hold runtime state
+# like the oper_state of the VLANs, they are always fetched.
+CONFIG_SUBSETS = frozenset(['config'])
+
+RUNNING_CONFIG_URL = '/rest/v1/fullconfigs/running-config'
+
+
+class FactsCache(object):
+    '''
+    Facts of a switch kept on disk between runs
+
+    The cached facts are tied to a change indicator of the switch, such as
+    the ETag of its running-config, and are discarded as soon as the
+    indicator differs.
+    '''
+
+    def __init__(self, cache_dir, host):
+        '''
+        :param cache_dir: directory holding the cached facts
+        :param host: address of the switch
+        '''
+        cache_dir = os.path.expanduser(cache_dir)
+        key = hashlib.sha256(host.encode('utf-8')).hexdigest()
+        self._path = os.path.join(cache_dir, '{0}.json'.format(key))
+        self._indicator = None
+        self._subsets = {}
+        self._fetched = {}
+        self.hits = []
+        self.misses = []
+
+        self._cached = {}
+        try:
+            with open(self._path) as cache_file:
+                cached = json.load(cache_file)
+            if isinstance(cached, dict):
+                self._cached = cached
+        except (IOError, OSError, ValueError):
+            pass
+
+    @property
+    def cached_indicator(self):
+        '''
+        Change indicator the cached facts were stored with
+        '''
+        return self._cached.get('indicator')
+
+    def load(self, indicator, fetched=None):
+        '''
+        Uses the cached facts if they were stored with the same indicator
+        :param indicator: current change indicator, None disables the cache
+        :param fetched: optional dict of the facts of the subsets fetched
+            along with the indicator, they replace the cached ones
+        '''
+        self._indicator = indicator
+        self._subsets = {}
+        if indicator is not None and self.cached_indicator == indicator:
+            self._subsets = dict(
+                (subset, facts) for subset, facts
+                in (self._cached.get('subsets') or {}).items()
+                if subset in CONFIG_SUBSETS)
+        self._fetched = dict(fetched or {})
+        self._subsets.update(self._fetched)
+
+    def get(self, subset):
+        '''
+        Returns the facts of a subset that are cached or were fetched along
+        with the indicator, or None when the subset must be fetched
+        '''
+        if subset not in CONFIG_SUBSETS:
+            return None
+        if subset in self._fetched:
+            self.misses.append(subset)
+            return self._fetched[subset]
+        if subset in self._subsets:
+            self.hits.append(subset)
+            return self._subsets[subset]
+        self.misses.append(subset)
+        return None
+
+    def put(self, subset, facts):
+        '''
+        Stores the facts of a subset fetched in this run
+        '''
+        if subset in CONFIG_SUBSETS:
+            self._subsets[subset] = facts
+
+    def save(self):
+        '''
+        Writes the cached facts, readable only by the current user
+        '''
+        if self._indicator is None:
+            return
+        tmp_path = '{0}.{1}'.format(self._path, os.getpid())
+        try:
+            directory = os.path.dirname(self._path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(dict(indicator=self._indicator,
+                               subsets=self._subsets), cache_file)
+            os.rename(tmp_path, self._path)
+        except (IOError, OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def to_dict(self):
+        return dict(hits=sorted(self.hits), misses=sorted(self.misses))
@@ -11,10 +11,11 @@ __metaclass__ = type
 
 from ansible.module_utils.aoscx import get
 from ansible.module_utils.facts.interfaces import InterfacesFacts
+from ansible.module_utils.facts.planner import FactsPlanner
 from ansible.module_utils.facts.legacy import Default, SoftwareInfo, \
     SoftwareImages, HostName, PlatformName, ManagementInterface, \
     SoftwareVersion, Config, ProductInfo, PowerSupplies, PhysicalInterfaces, \
-    Fans, ResourceUtilization, DomainName
+    Fans, ResourceUtilization, DomainName, plan_facts
 from ansible.module_utils.facts.vlans import VlansFacts
 from ansible.module_utils.facts.vrfs import VrfsFacts
 from ansible.module_utils.network.common.facts.facts import FactsBase
@@ -52,20 +53,76 @@ class Facts(FactsBase):
     VALID_RESOURCE_SUBSETS = frozenset(FACT_RESOURCE_SUBSETS.keys())
 
     def get_facts(self, legacy_facts_type=None, resource_facts_type=None,
-                  data=None):
+                  data=None, timeout=None, cache=None):
         '''
-        Returns the facts for aoscx
+        Returns the facts for aoscx, the fetches of the resource and legacy
+        subsets run one after another, each within the timeout
+        :param timeout: optional seconds allowed to each fetch
+        :param cache: optional FactsCache serving the unchanged running-config
         '''
+        # The persistent connection serves one JSON-RPC call at a time,
+        # concurrent fetches would only wait for each other
+        planner = FactsPlanner(max_workers=1, timeout=timeout)
 
-        if data is None:
-            data = get_switch_running_config(self._module)
-        if self.VALID_RESOURCE_SUBSETS:
-            self.get_network_resources_facts(FACT_RESOURCE_SUBSETS,
-                                             resource_facts_type, data)
+        # The resource facts fetch their own data, the running-config is
+        # only passed through when the caller already has it
+        resources = resource_facts_type or self._gather_network_resources
+        if self.VALID_RESOURCE_SUBSETS and resources:
+            resources = self.gen_runable(resources,
+                                         self.VALID_RESOURCE_SUBSETS,
+                                         resource_facts=True)
+            self.ansible_facts['ansible_net_gather_network_resources'] = \
+                list(resources)
+            for key in resources:
+                instance = FACT_RESOURCE_SUBSETS[key](self._module)
+                planner.add(key, instance.populate_facts, self._connection,
+                            self.ansible_facts, data)
 
+        legacy_instances = {}
+        facts = dict()
         if self.VALID_LEGACY_GATHER_SUBSETS:
-            self.get_network_legacy_facts(FACT_LEGACY_SUBSETS,
-                                          legacy_facts_type)
+            subsets = self.gen_runable(
+                legacy_facts_type or self._gather_subset,
+                self.VALID_LEGACY_GATHER_SUBSETS)
+            if subsets:
+                # default subset should always returned be with legacy facts
+                subsets = set(subsets) | set(['default'])
+                self.ansible_facts['ansible_net_gather_subset'] = \
+                    list(subsets)
+                fetched = set()
+                for key in sorted(subsets):
+                    cached = cache.get(key) if cache is not None else None
+                    if cached is not None:
+                        facts.update(cached)
+                        continue
+                    instance = FACT_LEGACY_SUBSETS[key](self._module)
+                    legacy_instances[key] = instance
+                    planner.add(key, instance.populate)
+                    fetched.add(key)
+                # Plan the subsets first so that the system and subsystem
+                # attributes they need are each fetched in a single request
+                plan_facts(self._module, fetched)
+
+        planner.run()
+        self.latency = planner.latency
+
+        if planner.errors:
+            self._module.fail_json(
+                msg="Unable to gather facts: {0}".format(', '.join(
+                    '{0}: {1}'.format(name, error) for name, error
+                    in sorted(planner.errors.items()))),
+                facts_latency=self.latency)
+
+        for key, instance in sorted(legacy_instances.items()):
+            facts.update(instance.facts)
+            self._warnings.extend(instance.warnings)
+            if cache is not None:
+                cache.put(key, instance.facts)
+        for key, value in facts.items():
+            self.ansible_facts['ansible_net_%s' % key] = value
+
+        if cache is not None:
+            cache.save()
 
         return self.ansible_facts, self._warnings
 
@@ -9,7 +9,74 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import fnmatch
+
 from ansible.module_utils.aoscx import get
+from ansible.module_utils.aoscx_rest import RestUrlBuilder
+from ansible.module_utils.facts.legacy import get_facts_url_builder
+from ansible.module_utils.six.moves.urllib.parse import quote
+
+# Largest number of interfaces matching the name patterns that are fetched
+# one by one, the whole collection is fetched in one request otherwise
+INTERFACES_FETCH_LIMIT = 20
+
+# The interfaces matching the name patterns are only fetched one by one when
+# they are at most one in INTERFACES_FILTER_RATIO interfaces of the switch
+INTERFACES_FILTER_RATIO = 10
+
+
+def iter_interfaces(get_path, attributes=None, patterns=None,
+                    fetch_limit=INTERFACES_FETCH_LIMIT, map_paths=None,
+                    url_builder=None):
+    '''
+    Yields the interfaces matching the name patterns, with only the given
+    attributes. They are read with a single request of the collection,
+    unless the patterns match at most fetch_limit interfaces and rule out
+    most of them, then only the matching ones are fetched, one request
+    each. The REST API doesn't page collections, the attributes are what
+    keeps the response of the collection small.
+    :param get_path: callable taking a path relative to the REST API
+        version, such as system/interfaces, and returning the decoded JSON
+    :param attributes: optional list of the only attributes to fetch
+    :param patterns: optional list of shell-style name patterns, i.e. 1/3/*
+    :param fetch_limit: largest number of matching interfaces fetched one
+        by one
+    :param map_paths: optional callable taking a function and a list of
+        paths and returning the list of results, used to fetch the matching
+        interfaces concurrently
+    :param url_builder: optional RestUrlBuilder object of the REST API
+        version get_path reads from, defaults to the attributes support of
+        10.04
+    :return: generator of (name, data) tuples
+    '''
+    if url_builder is None:
+        url_builder = RestUrlBuilder()
+
+    def matches(name):
+        return not patterns or any(fnmatch.fnmatchcase(name, pattern)
+                                   for pattern in patterns)
+
+    if patterns:
+        all_names = get_path('system/interfaces').keys()
+        names = sorted(name for name in all_names if matches(name))
+        if len(names) <= fetch_limit and \
+                len(names) * INTERFACES_FILTER_RATIO <= len(all_names):
+            if map_paths is None:
+                def map_paths(function, items):
+                    return [function(item) for item in items]
+
+            paths = [url_builder.path(
+                'system/interfaces/{0}'.format(quote(name, safe='')),
+                attributes=attributes, depth=2) for name in names]
+            for name, data in zip(names, map_paths(get_path, paths)):
+                yield name, url_builder.select(data, attributes)
+            return
+
+    interfaces = get_path(url_builder.path(
+        'system/interfaces', attributes=attributes, depth=2))
+    for name in sorted(interfaces):
+        if matches(name):
+            yield name, url_builder.select(interfaces[name], attributes)
 
 
 class InterfacesFacts(object):
@@ -27,8 +94,21 @@ class InterfacesFacts(object):
         '''
         Obtain and return interfaces facts
         '''
-        interfaces_url = '/rest/v10.04/system/interfaces?depth=2'
-        data = get(self._module, interfaces_url)
+        params = self._module.params
+        attributes = params.get('interface_attributes')
+        patterns = params.get('interface_filter')
+        url_builder = get_facts_url_builder(self._module)
+        if attributes or patterns:
+            data = {}
+            for name, interface in iter_interfaces(
+                    lambda path: get(self._module, url_builder.prefix + path),
+                    attributes=attributes, patterns=patterns,
+                    fetch_limit=params.get('interface_fetch_limit') or
+                    INTERFACES_FETCH_LIMIT, url_builder=url_builder):
+                data[name] = interface
+        else:
+            interfaces_url = url_builder.url('system/interfaces', depth=2)
+            data = get(self._module, interfaces_url)
         facts = {
             'interfaces': data
         }
@@ -9,7 +9,113 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import threading
+
 from ansible.module_utils.aoscx import get
+from ansible.module_utils.aoscx_rest import get_url_builder
+
+# System attributes read by the legacy facts subsets
+SYSTEM_ATTRIBUTES = dict(
+    default=['mgmt_intf_status', 'software_version'],
+    software_info=['software_info'],
+    software_images=['software_images'],
+    host_name=['hostname'],
+    platform_name=['platform_name'],
+    management_interface=['mgmt_intf_status'],
+    software_version=['software_version'],
+    domain_name=['domain_name'],
+)
+
+# Subsystem attributes read by the legacy facts subsets
+SUBSYSTEM_ATTRIBUTES = dict(
+    product_info=['product_info'],
+    power_supplies=['power_supplies'],
+    physical_interfaces=['interfaces'],
+    fans=['fans'],
+    resource_utilization=['resource_utilization'],
+)
+
+# Versions of the REST API whose schema the facts are read with, in order of
+# preference
+FACTS_API_VERSIONS = ('v10.04',)
+
+# Path and depth of the resources read by the legacy facts subsets
+RESOURCES = dict(
+    system=('system', None),
+    subsystems=('system/subsystems', 4),
+)
+
+# Subsets populated concurrently wait for the fetch of a resource started
+# by another subset instead of fetching it again
+_FETCH_LOCKS = dict(system=threading.Lock(), subsystems=threading.Lock())
+
+
+def plan_facts(module, subsets):
+    '''
+    Records the system and subsystem attributes needed by the legacy facts
+    subsets about to be populated, so that each resource is fetched once
+    with all of them
+    :param module: AnsibleModule object
+    :param subsets: names of the legacy facts subsets
+    '''
+    plan = dict(system=set(), subsystems=set())
+    for subset in subsets:
+        plan['system'].update(SYSTEM_ATTRIBUTES.get(subset, []))
+        plan['subsystems'].update(SUBSYSTEM_ATTRIBUTES.get(subset, []))
+    module._aoscx_facts_plan = plan
+
+
+def get_facts_url_builder(module):
+    '''
+    Returns the URL builder of the REST API version used by the facts
+    '''
+    return get_url_builder(module, FACTS_API_VERSIONS)
+
+
+def _get_planned(module, resource, attributes):
+    '''
+    GET a resource once per module run, with the planned attributes and the
+    ones needed by the caller
+    :param module: AnsibleModule object
+    :param resource: name of the resource in the plan
+    :param attributes: attributes needed by the caller
+    :return: data of the response holding the attributes
+    '''
+    with _FETCH_LOCKS[resource]:
+        if getattr(module, '_aoscx_facts_memo', None) is None:
+            module._aoscx_facts_memo = dict(system=[], subsystems=[])
+        fetched = module._aoscx_facts_memo[resource]
+
+        for fetched_attributes, data in fetched:
+            if set(attributes) <= fetched_attributes:
+                return data
+
+        plan = getattr(module, '_aoscx_facts_plan', None) or {}
+        selection = set(plan.get(resource, set()))
+        for fetched_attributes, data in fetched:
+            selection -= fetched_attributes
+        selection.update(attributes)
+
+        path, depth = RESOURCES[resource]
+        data = get(module, get_facts_url_builder(module).url(
+            path, attributes=sorted(selection), depth=depth))
+        fetched.append((selection, data))
+        return data
+
+
+def get_system_attributes(module, attributes):
+    '''
+    GET attributes of the system, the planned ones are fetched together
+    '''
+    return _get_planned(module, 'system', attributes)
+
+
+def get_subsystems(module, attribute):
+    '''
+    GET an attribute of every subsystem, the planned ones are fetched
+    together
+    '''
+    return _get_planned(module, 'subsystems', [attribute])
 
 
 class FactsBase(object):
@@ -40,7 +146,22 @@ class FactsBase(object):
             self.facts[self._fact_name] = self.data[self._fact_name]
 
 
-class SoftwareInfo(FactsBase):
+class SystemFactsBase(FactsBase):
+    '''
+    System attribute Base facts class
+    '''
+
+    def populate(self):
+        '''
+        Obtain and populate the facts
+        '''
+        self.data = get_system_attributes(self._module, [self._fact_name])
+
+        if self._fact_name in self.data.keys():
+            self.facts[self._fact_name] = self.data[self._fact_name]
+
+
+class SoftwareInfo(SystemFactsBase):
     '''
     Software Info facts class
     '''
@@ -50,11 +171,10 @@ class SoftwareInfo(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'software_info'
-        self._url = '/rest/v10.04/system?attributes=software_info'
         super(SoftwareInfo, self).populate()
 
 
-class SoftwareImages(FactsBase):
+class SoftwareImages(SystemFactsBase):
     '''
     Software Images facts class
     '''
@@ -64,11 +184,10 @@ class SoftwareImages(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'software_images'
-        self._url = '/rest/v10.04/system?attributes=software_images'
         super(SoftwareImages, self).populate()
 
 
-class HostName(FactsBase):
+class HostName(SystemFactsBase):
     '''
     Host Name facts class
     '''
@@ -78,11 +197,10 @@ class HostName(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'hostname'
-        self._url = '/rest/v10.04/system?attributes=hostname'
         super(HostName, self).populate()
 
 
-class PlatformName(FactsBase):
+class PlatformName(SystemFactsBase):
     '''
     Platform Name facts class
     '''
@@ -92,11 +210,10 @@ class PlatformName(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'platform_name'
-        self._url = '/rest/v10.04/system?attributes=platform_name'
         super(PlatformName, self).populate()
 
 
-class ManagementInterface(FactsBase):
+class ManagementInterface(SystemFactsBase):
     '''
     Management Interface facts class
     '''
@@ -106,11 +223,10 @@ class ManagementInterface(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'mgmt_intf_status'
-        self._url = '/rest/v10.04/system?attributes=mgmt_intf_status'
         super(ManagementInterface, self).populate()
 
 
-class SoftwareVersion(FactsBase):
+class SoftwareVersion(SystemFactsBase):
     '''
     Software Version facts class
     '''
@@ -120,7 +236,6 @@ class SoftwareVersion(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'software_version'
-        self._url = '/rest/v10.04/system?attributes=software_version'
         super(SoftwareVersion, self).populate()
 
 
@@ -137,7 +252,7 @@ class Config(FactsBase):
         super(Config, self).populate()
 
 
-class Default(FactsBase):
+class Default(SystemFactsBase):
     '''
     Default facts class
     '''
@@ -147,15 +262,13 @@ class Default(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'mgmt_intf_status'
-        self._url = '/rest/v10.04/system?attributes=mgmt_intf_status'
         super(Default, self).populate()
 
         self._fact_name = 'software_version'
-        self._url = '/rest/v10.04/system?attributes=software_version'
         super(Default, self).populate()
 
 
-class DomainName(FactsBase):
+class DomainName(SystemFactsBase):
     '''
     Domain Name facts class
     '''
@@ -165,7 +278,6 @@ class DomainName(FactsBase):
         Obtain and populate the facts
         '''
         self._fact_name = 'domain_name'
-        self._url = '/rest/v10.04/system?attributes=domain_name'
         super(DomainName, self).populate()
 
 
@@ -178,8 +290,7 @@ class SubSystemFactsBase(FactsBase):
         '''
         Obtain and populate the facts
         '''
-        self._url = '/rest/v10.04/system/subsystems?depth=4'
-        self.data = get(self._module, self._url)
+        self.data = get_subsystems(self._module, self._fact_name)
         output_data = {}
 
         for sub_system in self.data.keys():
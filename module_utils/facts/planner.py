@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# (C) Copyright 2020 Hewlett Packard Enterprise Development LP.
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import time
+
+from ansible.module_utils.six.moves import queue
+
+# Maximum number of facts fetches running at the same time
+MAX_WORKERS = 8
+
+
+class FetchTimeout(Exception):
+    '''
+    Raised for a fetch that didn't finish in time
+    '''
+
+
+class FactsPlanner(object):
+    '''
+    Runs independent facts fetches concurrently on a bounded pool of threads
+
+    Each fetch has its own timeout, counted from the moment it starts. A
+    fetch that times out is reported as failed and its thread is replaced,
+    so it doesn't hold back the remaining fetches. A fetch exiting the
+    module, such as with fail_json, exits it from the calling thread as soon
+    as it happens.
+    '''
+
+    def __init__(self, max_workers=MAX_WORKERS, timeout=None):
+        '''
+        :param max_workers: maximum number of fetches running at once
+        :param timeout: optional seconds allowed to each fetch
+        '''
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._fetches = []
+        self._exit = None
+        self.results = {}
+        self.errors = {}
+        self.latency = {}
+
+    def add(self, name, function, *args):
+        '''
+        Adds a fetch, its result is stored under name
+        '''
+        self._fetches.append((name, function, args))
+
+    def _worker(self, pending, state, lock, finished):
+        while True:
+            try:
+                name, function, args = pending.get_nowait()
+            except queue.Empty:
+                return
+            with lock:
+                state[name] = time.time()
+            try:
+                result, error = function(*args), None
+            except Exception as exc:
+                result, error = None, exc
+            except BaseException as exc:
+                # SystemExit and KeyboardInterrupt only stop this thread,
+                # they are raised again by run()
+                with lock:
+                    self._exit = exc
+                    finished.set()
+                return
+            with lock:
+                if name in state:
+                    self.latency[name] = round(time.time() - state.pop(name),
+                                               3)
+                    if error is None:
+                        self.results[name] = result
+                    else:
+                        self.errors[name] = error
+                    finished.set()
+                else:
+                    # Timed out, another thread took over the queue
+                    return
+
+    def _start_worker(self, pending, state, lock, finished):
+        thread = threading.Thread(target=self._worker,
+                                  args=(pending, state, lock, finished))
+        # A timed out fetch must not keep the module from exiting
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        '''
+        Runs the fetches and waits for all of them to finish or time out
+        :return: dict with the result of each successful fetch
+        '''
+        pending = queue.Queue()
+        for fetch in self._fetches:
+            pending.put(fetch)
+
+        state = {}
+        lock = threading.Lock()
+        finished = threading.Event()
+        total = len(self._fetches)
+
+        for dummy in range(min(self._max_workers, total)):
+            self._start_worker(pending, state, lock, finished)
+
+        while True:
+            with lock:
+                if self._exit is not None:
+                    raise self._exit
+                done = len(self.results) + len(self.errors)
+                if done >= total:
+                    break
+                expired = []
+                if self._timeout is not None:
+                    now = time.time()
+                    expired = [name for name, start in state.items()
+                               if now - start > self._timeout]
+                for name in expired:
+                    self.latency[name] = round(now - state.pop(name), 3)
+                    self.errors[name] = FetchTimeout(
+                        "{0} didn't finish in {1} seconds".format(
+                            name, self._timeout))
+                finished.clear()
+            for dummy in expired:
+                if not pending.empty():
+                    self._start_worker(pending, state, lock, finished)
+            finished.wait(0.5 if self._timeout is not None else None)
+
+        return self.results
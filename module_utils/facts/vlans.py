@@ -10,6 +10,7 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 from ansible.module_utils.aoscx import get
+from ansible.module_utils.facts.legacy import get_facts_url_builder
 
 
 class VlansFacts(object):
@@ -27,7 +28,8 @@ class VlansFacts(object):
         '''
         Obtain and return VLAN facts
         '''
-        vlans_url = '/rest/v10.04/system/vlans?depth=2'
+        vlans_url = get_facts_url_builder(self._module).url(
+            'system/vlans', depth=2)
         data = get(self._module, vlans_url)
 
         internal_vlan_list = []
@@ -10,6 +10,7 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 from ansible.module_utils.aoscx import get
+from ansible.module_utils.facts.legacy import get_facts_url_builder
 
 
 class VrfsFacts(object):
@@ -27,7 +28,8 @@ class VrfsFacts(object):
         '''
         Obtain and return VRFs Facts
         '''
-        vrfs_url = '/rest/v10.04/system/vrfs?depth=2'
+        vrfs_url = get_facts_url_builder(self._module).url(
+            'system/vrfs', depth=2)
         data = get(self._module, vrfs_url)
         facts = {
             'vrfs': data